@@ -0,0 +1,47 @@
+"""
+Работа с SQLite при нескольких процессах-писателях (веб и Telegram-бот): повтор записи при блокировке базы.
+Сами PRAGMA (WAL, synchronous, mmap_size, cache_size) задаются в DATABASES['default']['OPTIONS'].
+"""
+import functools
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connection
+
+logger = logging.getLogger(__name__)
+
+LOCK_ERRORS = ('database is locked', 'database table is locked', 'database is busy')
+
+
+def is_lock_error(error):
+    return isinstance(error, OperationalError) and any(message in str(error) for message in LOCK_ERRORS)
+
+
+def retry_on_lock(func=None, *, attempts=None, delay=None):
+    """
+    Повторяет запись, если SQLite вернул «database is locked» после истечения busy timeout.
+    Паузы растут экспоненциально со случайным разбросом, чтобы процессы не просыпались одновременно.
+    Внутри внешней транзакции ошибка пробрасывается сразу: повторять можно только транзакцию целиком.
+    Оборачиваемая функция должна сама открывать транзакцию, если пишет больше одного раза.
+    """
+    if func is None:
+        return functools.partial(retry_on_lock, attempts=attempts, delay=delay)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        max_attempts = attempts or settings.SQLITE_LOCK_RETRIES
+        base_delay = delay or settings.SQLITE_LOCK_RETRY_DELAY
+        for attempt in range(1, max_attempts + 1):
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as e:
+                if not is_lock_error(e) or connection.in_atomic_block or attempt == max_attempts:
+                    raise
+                pause = base_delay * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+                logger.warning(f"База заблокирована ({func.__qualname__}), попытка {attempt}/{max_attempts}, "
+                               f"повтор через {pause:.2f} с")
+                time.sleep(pause)
+
+    return wrapper
@@ -0,0 +1,260 @@
+"""
+Метрики запросов по маршрутам: количество, гистограмма времени ответа, число и время SQL-запросов,
+размер ответа. Данные собираются в памяти процесса и отдаются в текстовом формате Prometheus на /metrics/.
+"""
+import bisect
+import hmac
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+# Счетчики SQL текущего запроса: [количество, суммарное время]. ContextVar переносится
+# в потоки sync_to_async, поэтому запросы асинхронных представлений тоже учитываются.
+_request_db_stats = ContextVar('request_db_stats', default=None)
+
+
+def count_queries(execute, sql, params, many, context):
+    stats = _request_db_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats[0] += 1
+        stats[1] += time.perf_counter() - started
+
+
+def install_query_counter(connection, **kwargs):
+    if count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_queries)
+
+
+connection_created.connect(install_query_counter)
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'total', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class RouteMetrics:
+    __slots__ = ('latency', 'queries', 'db_time', 'response_bytes', 'responses')
+
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_COUNT_BUCKETS)
+        self.db_time = 0.0
+        self.response_bytes = 0
+        self.responses = 0
+
+
+class MetricsRegistry:
+    """
+    Потокобезопасное хранилище метрик по (маршрут, метод) и счетчиков по (маршрут, метод, статус).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+        self._requests = {}
+
+    def observe(self, route, method, status, duration, queries, db_time):
+        with self._lock:
+            metrics = self._routes.get((route, method))
+            if metrics is None:
+                metrics = self._routes[(route, method)] = RouteMetrics()
+            metrics.latency.observe(duration)
+            metrics.queries.observe(queries)
+            metrics.db_time += db_time
+            key = (route, method, status)
+            self._requests[key] = self._requests.get(key, 0) + 1
+
+    def observe_size(self, route, method, size):
+        with self._lock:
+            metrics = self._routes.get((route, method))
+            if metrics is not None:
+                metrics.response_bytes += size
+                metrics.responses += 1
+
+    def clear(self):
+        with self._lock:
+            self._routes.clear()
+            self._requests.clear()
+
+    def render(self):
+        with self._lock:
+            requests = sorted(self._requests.items())
+            routes = sorted(self._routes.items())
+            lines = [
+                '# HELP rhick_http_requests_total Количество запросов',
+                '# TYPE rhick_http_requests_total counter',
+            ]
+            for (route, method, status), value in requests:
+                lines.append(f'rhick_http_requests_total{labels(route, method, status=status)} {value}')
+
+            lines += [
+                '# HELP rhick_http_request_duration_seconds Время ответа',
+                '# TYPE rhick_http_request_duration_seconds histogram',
+            ]
+            for (route, method), metrics in routes:
+                lines += render_histogram('rhick_http_request_duration_seconds', metrics.latency, route, method)
+
+            lines += [
+                '# HELP rhick_db_queries_per_request Количество SQL-запросов на один запрос',
+                '# TYPE rhick_db_queries_per_request histogram',
+            ]
+            for (route, method), metrics in routes:
+                lines += render_histogram('rhick_db_queries_per_request', metrics.queries, route, method)
+
+            lines += [
+                '# HELP rhick_db_query_duration_seconds_total Суммарное время SQL-запросов',
+                '# TYPE rhick_db_query_duration_seconds_total counter',
+            ]
+            for (route, method), metrics in routes:
+                lines.append(f'rhick_db_query_duration_seconds_total{labels(route, method)} {metrics.db_time:.6f}')
+
+            lines += [
+                '# HELP rhick_http_response_size_bytes Размер тела ответа',
+                '# TYPE rhick_http_response_size_bytes summary',
+            ]
+            for (route, method), metrics in routes:
+                lines.append(f'rhick_http_response_size_bytes_sum{labels(route, method)} {metrics.response_bytes}')
+                lines.append(f'rhick_http_response_size_bytes_count{labels(route, method)} {metrics.responses}')
+        return '\n'.join(lines) + '\n'
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def labels(route, method, **extra):
+    pairs = [('route', route), ('method', method), *extra.items()]
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in pairs) + '}'
+
+
+def render_histogram(name, histogram, route, method):
+    lines = []
+    cumulative = 0
+    for bound, count in zip(histogram.buckets, histogram.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{labels(route, method, le=bound)} {cumulative}')
+    lines.append(f'{name}_bucket{labels(route, method, le="+Inf")} {histogram.count}')
+    lines.append(f'{name}_sum{labels(route, method)} {histogram.total:.6f}')
+    lines.append(f'{name}_count{labels(route, method)} {histogram.count}')
+    return lines
+
+
+registry = MetricsRegistry()
+
+
+def get_route(request):
+    """
+    Шаблон маршрута (например, sales/api/orders/<int:pk>/) для приложений из METRICS_NAMESPACES,
+    иначе None — такие запросы не учитываются.
+    """
+    match = getattr(request, 'resolver_match', None)
+    if match is None or not match.namespaces or match.namespaces[0] not in settings.METRICS_NAMESPACES:
+        return None
+    return match.route
+
+
+def count_streaming_bytes(content, route, method):
+    size = 0
+    for chunk in content:
+        size += len(chunk)
+        yield chunk
+    registry.observe_size(route, method, size)
+
+
+async def acount_streaming_bytes(content, route, method):
+    size = 0
+    async for chunk in content:
+        size += len(chunk)
+        yield chunk
+    registry.observe_size(route, method, size)
+
+
+class MetricsMiddleware:
+    """
+    Записывает метрики каждого запроса. Работает и под WSGI, и под ASGI.
+    Для потоковых ответов время считается до первого байта, размер — по окончании передачи.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        for connection in connections.all(initialized_only=True):
+            install_query_counter(connection)
+        stats = [0, 0.0]
+        token = _request_db_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_db_stats.reset(token)
+        self.record(request, response, time.perf_counter() - started, stats)
+        return response
+
+    async def __acall__(self, request):
+        stats = [0, 0.0]
+        token = _request_db_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_db_stats.reset(token)
+        self.record(request, response, time.perf_counter() - started, stats)
+        return response
+
+    def record(self, request, response, duration, stats):
+        route = get_route(request)
+        if route is None:
+            return
+        registry.observe(route, request.method, response.status_code, duration, stats[0], stats[1])
+        if not response.streaming:
+            registry.observe_size(route, request.method, len(response.content))
+        elif response.is_async:
+            response.streaming_content = acount_streaming_bytes(response.streaming_content, route, request.method)
+        else:
+            response.streaming_content = count_streaming_bytes(response.streaming_content, route, request.method)
+
+
+def metrics_view(request):
+    """
+    Метрики в формате Prometheus. Доступ по заголовку «Authorization: Bearer <METRICS_TOKEN>»
+    или для сотрудников (is_staff) с сессией админки.
+    """
+    token = settings.METRICS_TOKEN
+    authorization = request.headers.get('Authorization', '')
+    authorized = bool(token) and hmac.compare_digest(authorization, f'Bearer {token}')
+    if not authorized and not request.user.is_staff:
+        return HttpResponseForbidden('Доступ запрещен')
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -25,6 +25,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'RHick.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -56,10 +57,26 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'RHick.wsgi.application'
 
+# В базу пишут и веб-процесс, и run_telegram_bot. WAL позволяет читать во время записи,
+# timeout — время ожидания блокировки, IMMEDIATE берет блокировку записи в начале транзакции
+# (иначе повышение чтения до записи падает с «database is locked» без ожидания).
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA mmap_size=134217728;'
+                'PRAGMA cache_size=-20000;'
+                'PRAGMA temp_store=MEMORY;'
+            ),
+        },
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
@@ -128,6 +145,70 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Keyset-пагинация списка заказов
+ORDERS_PAGE_SIZE = 50
+ORDERS_MAX_PAGE_SIZE = 200
+
+# Максимальное число заказов в LRU-кэше деталей заказа (на процесс)
+ORDER_DETAIL_CACHE_SIZE = 1000
+
+# Дисковый кэш WebP -> PNG (MEDIA_ROOT/converted): предельный размер в байтах
+# и срок хранения неиспользуемых файлов в секундах
+CONVERTED_IMAGES_MAX_BYTES = 200 * 1024 * 1024
+CONVERTED_IMAGES_MAX_AGE = 30 * 24 * 60 * 60
+
+# Дисковый кэш готовых документов заказов (MEDIA_ROOT/documents). По умолчанию выключен: документы
+# рендерятся в память и загружаются из буфера, а повторная отправка в Telegram идет по file_id.
+# Имеет смысл для частых повторных выгрузок одних и тех же заказов (архивы, скачивание)
+RENDERED_DOCUMENTS_CACHE = False
+# Предельный размер кэша документов в байтах и срок хранения неиспользуемых файлов в секундах
+RENDERED_DOCUMENTS_MAX_BYTES = 500 * 1024 * 1024
+RENDERED_DOCUMENTS_MAX_AGE = 30 * 24 * 60 * 60
+
+# Максимальное число записей журнала изменений в одном ответе /sales/api/sync/
+SYNC_MAX_CHANGES = 1000
+
+# Максимальное число результатов поиска /sales/api/search/
+SEARCH_MAX_RESULTS = 100
+
+# Срок гарантии на подтвержденные заказы (дней с даты подтверждения)
+WARRANTY_DAYS = 365
+
+# Повтор записи при «database is locked» (RHick.db.retry_on_lock): число попыток и начальная пауза в секундах
+SQLITE_LOCK_RETRIES = 5
+SQLITE_LOCK_RETRY_DELAY = 0.05
+
+# Метрики запросов на /metrics/: учитываются маршруты этих приложений.
+# Без токена метрики доступны только сотрудникам (is_staff).
+METRICS_NAMESPACES = ('sales', 'users', 'telegrambot')
+METRICS_TOKEN = None
+
+# Фоновая отправка заказов в Telegram (run_export_workers): число попыток, начальная пауза
+# между попытками и время, после которого зависшая задача возвращается в очередь (в секундах)
+EXPORT_JOB_MAX_ATTEMPTS = 5
+EXPORT_JOB_RETRY_DELAY = 30
+EXPORT_JOB_STALE_TIMEOUT = 600
+
+# Выгружаемые документы собираются в памяти; больше этого размера (байт) — во временном файле.
+# None — всегда в памяти
+EXPORT_SPOOL_MAX_MEMORY = 20 * 1024 * 1024
+
+# Пул процессов рендера PDF (sales.render_pool): число процессов (0 — рендер в текущем процессе),
+# таймаут на документ в секундах, документов на процесс до перезапуска и предел одновременных рендеров
+# (None — по числу процессов)
+PDF_RENDER_WORKERS = 2
+PDF_RENDER_TIMEOUT = 60
+PDF_RENDER_MAX_TASKS_PER_CHILD = 50
+PDF_RENDER_CONCURRENCY = None
+
+# Пакетная выгрузка документов в ZIP: число процессов рендера на архив (None — по числу ядер)
+# и число архивов, которые процесс run_export_workers собирает одновременно
+BATCH_EXPORT_WORKERS = None
+BATCH_EXPORT_CONCURRENCY = 1
+
+# Уменьшенные копии фото товаров (px по длинной стороне): Excel, PDF, приложение
+PHOTO_RENDITION_SIZES = (64, 300, 800)
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=7),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
@@ -136,3 +217,15 @@ SIMPLE_JWT = {
 }
 
 TELEGRAM_BOT_TOKEN = '8334862964:AAEMTpBpfHSi60cvzivPjEmrkpDWcn_IoLs'
+
+# Клиент Telegram Bot API (telegrambot.utils.client). Для локальной имитации (run_fake_telegram_api)
+# укажите ее адрес, например http://127.0.0.1:8081
+TELEGRAM_API_BASE_URL = 'https://api.telegram.org'
+# Таймауты (подключение, ответ) в секундах и число соединений в пуле на токен
+TELEGRAM_API_TIMEOUT = (5, 60)
+TELEGRAM_API_POOL_SIZE = 10
+# Повторы при сетевых ошибках, 5xx и 429: число повторов, начальная пауза в секундах
+# и наибольший retry_after, который клиент ждет сам (больше — ошибка, повтор остается очереди)
+TELEGRAM_API_RETRIES = 3
+TELEGRAM_API_RETRY_DELAY = 1
+TELEGRAM_API_MAX_RETRY_AFTER = 60
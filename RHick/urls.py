@@ -2,10 +2,12 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from .metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('sales/', include('sales.urls', namespace='sales')),
+    path('metrics/', metrics_view, name='metrics'),
     path('telegram/', include('telegrambot.urls', namespace='telegrambot')),
     path('', include('users.urls', namespace='users')),
 
@@ -1,11 +1,13 @@
 from django.contrib import admin
-from .models import Order, OrderProduct, Password
+from django.utils import timezone
+from .models import ChangeLog, ExportJob, Order, OrderProduct, Password, TelegramDocument
 
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ['client', 'vat', 'additional_expenses', 'is_confirmed', 'confirmed_at', 'is_rejected',
-                    'rejected_at', 'created_at']
+    list_display = ['client', 'vat', 'additional_expenses', 'products_count', 'subtotal', 'grand_total',
+                    'is_confirmed', 'confirmed_at', 'warranty_ends_at', 'is_rejected', 'rejected_at', 'created_at']
+    readonly_fields = ['subtotal', 'products_count', 'grand_total', 'warranty_ends_at']
     list_filter = ['client', 'is_confirmed', 'is_rejected']
     search_fields = ['client', ]
 
@@ -22,3 +24,31 @@ class OrderProductAdmin(admin.ModelAdmin):
 class PasswordAdmin(admin.ModelAdmin):
     list_display = ('organization_name', 'nvr_password', 'camera_password', 'created_at')
     search_fields = ('organization_name',)
+
+
+@admin.register(ChangeLog)
+class ChangeLogAdmin(admin.ModelAdmin):
+    list_display = ('id', 'entity', 'object_id', 'action', 'created_at')
+    list_filter = ('entity', 'action')
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'order', 'file_type', 'status', 'attempts', 'max_attempts', 'progress_done',
+                    'progress_total', 'run_after', 'finished_at', 'created_at')
+    list_filter = ('kind', 'status', 'file_type')
+    readonly_fields = ('attempts', 'last_error', 'progress_done', 'progress_total', 'result', 'worker', 'started_at',
+                       'finished_at')
+    actions = ['requeue']
+
+    @admin.action(description='Вернуть в очередь')
+    def requeue(self, request, queryset):
+        queryset.exclude(status=ExportJob.RUNNING).update(status=ExportJob.PENDING, attempts=0, worker='',
+                                                          run_after=timezone.now(), finished_at=None)
+
+
+@admin.register(TelegramDocument)
+class TelegramDocumentAdmin(admin.ModelAdmin):
+    list_display = ('id', 'bot_id', 'key', 'file_id', 'updated_at')
+    list_filter = ('bot_id',)
+    search_fields = ('key', 'file_id')
@@ -5,3 +5,6 @@ class SalesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'sales'
     verbose_name = 'Hickvision'
+
+    def ready(self):
+        from . import signals  # noqa: F401
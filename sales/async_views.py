@@ -0,0 +1,276 @@
+import logging
+import os
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import Http404, HttpResponse, JsonResponse
+from django.shortcuts import aget_object_or_404
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import APIException, UnsupportedMediaType
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.parsers import DataAndFiles, FormParser, JSONParser, MultiPartParser
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from RHick.db import retry_on_lock
+
+from .cache import order_detail_cache
+from .conditional import add_order_validators, aget_order_version, evaluate_order_conditions
+from .filters import filter_orders
+from .models import ExportJob, Order, OrderProduct, Password
+from .pagination import OrderKeysetPagination
+from .serializers import OrderSerializer, OrderProductSerializer, OrderDetailSerializer, PasswordSerializer
+from .views import export_job_accepted
+
+logger = logging.getLogger(__name__)
+
+PARSERS = [JSONParser(), FormParser(), MultiPartParser()]
+
+
+def validate_and_save(serializer):
+    """
+    Синхронная часть записи: валидация (может обращаться к БД), сохранение и представление.
+    """
+    if not serializer.is_valid():
+        return False, serializer.errors
+    serializer.save()
+    return True, serializer.data
+
+
+class AsyncAPIView(View):
+    """
+    Базовое асинхронное представление для ASGI: JWT-аутентификация как в DRF, ответы в JSON,
+    ошибки DRF (ValidationError, NotFound, AuthenticationFailed) и Http404 возвращаются как JSON.
+    Работа с БД идет через асинхронный ORM, в поток уходят только валидация и сохранение.
+    """
+    authentication_required = True
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            if self.authentication_required:
+                user = await self.authenticate(request)
+                if user is None:
+                    return self.json({"detail": "Учетные данные не были предоставлены."},
+                                     status=status.HTTP_401_UNAUTHORIZED)
+                request.user = user
+            return await super().dispatch(request, *args, **kwargs)
+        except APIException as exc:
+            return self.json(exc.detail, status=exc.status_code)
+        except Http404:
+            return self.json({"detail": "Не найдено."}, status=status.HTTP_404_NOT_FOUND)
+
+    async def authenticate(self, request):
+        result = await sync_to_async(JWTAuthentication().authenticate)(request)
+        return result[0] if result else None
+
+    @staticmethod
+    def json(data, status=status.HTTP_200_OK):
+        return JsonResponse(data, status=status, encoder=JSONEncoder, safe=False,
+                            json_dumps_params={'ensure_ascii': False})
+
+    @staticmethod
+    def get_data(request):
+        """
+        Тело запроса разбирается теми же парсерами, что и в DRF: multipart и формы — для любого метода
+        (Django заполняет request.POST только для POST), некорректное тело — ParseError (400).
+        """
+        if not int(request.META.get('CONTENT_LENGTH') or 0):
+            return {}
+        parser = DefaultContentNegotiation().select_parser(request, PARSERS)
+        if parser is None:
+            raise UnsupportedMediaType(request.content_type)
+        result = parser.parse(request, request.META.get('CONTENT_TYPE', ''),
+                              {'request': request, 'encoding': request.encoding or settings.DEFAULT_CHARSET})
+        if isinstance(result, DataAndFiles):
+            data = result.data.copy()
+            data.update(result.files)
+            return data
+        return result
+
+
+class AsyncOrderListCreateView(AsyncAPIView):
+    async def get(self, request):
+        orders = filter_orders(Order.objects.all(), request.GET)
+        paginator = OrderKeysetPagination()
+        page = await paginator.apaginate_queryset(orders, request)
+        serializer = OrderSerializer(page, many=True)
+        return self.json({'next': paginator.get_next_link(), 'results': serializer.data})
+
+    async def post(self, request):
+        serializer = OrderSerializer(data=self.get_data(request))
+        ok, data = await sync_to_async(validate_and_save)(serializer)
+        return self.json(data, status=status.HTTP_201_CREATED if ok else status.HTTP_400_BAD_REQUEST)
+
+
+class AsyncOrderDetailView(AsyncAPIView):
+    authentication_required = False
+
+    async def get(self, request, pk):
+        version = await aget_order_version(pk)
+        if version is None:
+            raise Http404
+        not_modified = evaluate_order_conditions(request, pk, version)
+        if not_modified is not None:
+            return not_modified
+
+        payload = order_detail_cache.get(pk, version['revision'])
+        if payload is None:
+            order = await aget_object_or_404(Order.objects.prefetch_related('products'), pk=pk)
+            payload = OrderDetailSerializer(order).data
+            order_detail_cache.set(pk, order.revision, payload)
+        return add_order_validators(self.json(payload), pk, version)
+
+    async def put(self, request, pk):
+        order = await aget_object_or_404(Order, pk=pk)
+        precondition_failed = evaluate_order_conditions(request, pk, {'revision': order.revision,
+                                                                      'updated_at': order.updated_at})
+        if precondition_failed is not None:
+            return precondition_failed
+
+        serializer = OrderSerializer(order, data=self.get_data(request))
+        ok, data = await sync_to_async(validate_and_save)(serializer)
+        if not ok:
+            return self.json(data, status=status.HTTP_400_BAD_REQUEST)
+        return add_order_validators(self.json(data), pk, await aget_order_version(pk))
+
+    async def delete(self, request, pk):
+        order = await aget_object_or_404(Order, pk=pk)
+        precondition_failed = evaluate_order_conditions(request, pk, {'revision': order.revision,
+                                                                      'updated_at': order.updated_at})
+        if precondition_failed is not None:
+            return precondition_failed
+
+        await order.adelete()
+        return HttpResponse(status=status.HTTP_204_NO_CONTENT)
+
+
+class AsyncOrderProductsView(AsyncAPIView):
+    async def get(self, request, order_id):
+        order = await aget_object_or_404(Order, id=order_id)
+        products = [product async for product in OrderProduct.objects.filter(order=order)]
+
+        if not products:
+            return self.json({"detail": "Продукты для этого заказа не найдены."}, status=status.HTTP_404_NOT_FOUND)
+
+        serializer = OrderProductSerializer(products, many=True)
+        return self.json({
+            "products": serializer.data,
+            "total_order_price": order.subtotal
+        })
+
+    async def post(self, request, order_id):
+        order = await aget_object_or_404(Order, id=order_id)
+        data = self.get_data(request)
+        data.pop('id', None)
+        data['order'] = order.id
+
+        serializer = OrderProductSerializer(data=data)
+        ok, data = await sync_to_async(validate_and_save)(serializer)
+        if not ok:
+            logger.error(f"Ошибки сериализатора: {data}")
+        return self.json(data, status=status.HTTP_201_CREATED if ok else status.HTTP_400_BAD_REQUEST)
+
+    async def put(self, request, order_id, product_id):
+        order = await aget_object_or_404(Order, id=order_id)
+        precondition_failed = evaluate_order_conditions(request, order_id, {'revision': order.revision,
+                                                                            'updated_at': order.updated_at})
+        if precondition_failed is not None:
+            return precondition_failed
+
+        product = await aget_object_or_404(OrderProduct, id=product_id, order=order)
+        data = self.get_data(request)
+        data['order'] = order.id
+
+        serializer = OrderProductSerializer(product, data=data)
+        ok, data = await sync_to_async(validate_and_save)(serializer)
+        if not ok:
+            return self.json(data, status=status.HTTP_400_BAD_REQUEST)
+        return add_order_validators(self.json(data), order_id, await aget_order_version(order_id))
+
+    async def delete(self, request, order_id, product_id):
+        order = await aget_object_or_404(Order, id=order_id)
+        precondition_failed = evaluate_order_conditions(request, order_id, {'revision': order.revision,
+                                                                            'updated_at': order.updated_at})
+        if precondition_failed is not None:
+            return precondition_failed
+
+        product = await aget_object_or_404(OrderProduct, id=product_id, order=order)
+
+        photo_path = product.photo.path if product.photo else None
+        await product.adelete()
+        if photo_path and os.path.exists(photo_path):
+            await sync_to_async(os.remove)(photo_path)
+
+        return HttpResponse(status=status.HTTP_204_NO_CONTENT)
+
+
+class AsyncOrderConfirmView(AsyncAPIView):
+    async def patch(self, request, pk):
+        order = await aget_object_or_404(Order, pk=pk)
+        if order.is_rejected:
+            return self.json({"error": "Нельзя подтвердить отклоненный заказ"}, status=status.HTTP_400_BAD_REQUEST)
+        order.is_confirmed = True
+        await sync_to_async(retry_on_lock(order.save))()
+        return self.json({"status": "Заказ подтвержден"})
+
+
+class AsyncOrderRejectView(AsyncAPIView):
+    async def patch(self, request, pk):
+        order = await aget_object_or_404(Order, pk=pk)
+        if order.is_confirmed:
+            return self.json({"error": "Нельзя отклонить подтвержденный заказ"}, status=status.HTTP_400_BAD_REQUEST)
+        order.is_rejected = True
+        await sync_to_async(retry_on_lock(order.save))()
+        return self.json({"status": "Заказ отклонен"})
+
+
+class AsyncPasswordView(AsyncAPIView):
+    async def get(self, request, pk=None):
+        if pk:
+            password = await Password.objects.filter(pk=pk).afirst()
+            if password is None:
+                return self.json({"error": "Запись не найдена"}, status=status.HTTP_404_NOT_FOUND)
+            return self.json(PasswordSerializer(password).data)
+        passwords = [password async for password in Password.objects.all()]
+        return self.json(PasswordSerializer(passwords, many=True).data)
+
+    async def post(self, request):
+        serializer = PasswordSerializer(data=self.get_data(request))
+        ok, data = await sync_to_async(validate_and_save)(serializer)
+        return self.json(data, status=status.HTTP_201_CREATED if ok else status.HTTP_400_BAD_REQUEST)
+
+    async def put(self, request, pk):
+        password = await Password.objects.filter(pk=pk).afirst()
+        if password is None:
+            return self.json({"error": "Запись не найдена"}, status=status.HTTP_404_NOT_FOUND)
+        serializer = PasswordSerializer(password, data=self.get_data(request))
+        ok, data = await sync_to_async(validate_and_save)(serializer)
+        return self.json(data, status=status.HTTP_200_OK if ok else status.HTTP_400_BAD_REQUEST)
+
+    async def delete(self, request, pk):
+        deleted, _ = await Password.objects.filter(pk=pk).adelete()
+        if not deleted:
+            return self.json({"error": "Запись не найдена"}, status=status.HTTP_404_NOT_FOUND)
+        return HttpResponse(status=status.HTTP_204_NO_CONTENT)
+
+
+@csrf_exempt
+async def async_export_order_to_telegram(request, order_id):
+    """
+    Асинхронный вариант постановки заказа в очередь отправки в Telegram (см. export_order_to_telegram).
+    """
+    order = await Order.objects.filter(id=order_id).afirst()
+    if order is None:
+        return JsonResponse({'status': 'error', 'message': 'Заказ не найден.'}, status=404)
+
+    file_type = request.GET.get('file_type', ExportJob.EXCEL)
+    if file_type not in dict(ExportJob.FILE_TYPE_CHOICES):
+        return JsonResponse({'status': 'error', 'message': 'Допустимые форматы: excel, pdf.'}, status=400)
+
+    job = await sync_to_async(retry_on_lock(ExportJob.objects.enqueue))(order, file_type)
+    return export_job_accepted(request, job)
@@ -0,0 +1,154 @@
+"""
+Пакетная выгрузка документов заказов (PDF или Excel) в один ZIP-архив. Документы рендерятся
+параллельно в процессах (рендер WeasyPrint упирается в CPU и держит GIL), архив собирается
+по частям по мере готовности документов, в конце добавляется сводная книга Excel.
+Через API архив собирается задачей ExportJob в run_export_workers; одновременно в процессе
+собирается не больше BATCH_EXPORT_CONCURRENCY архивов.
+"""
+import io
+import multiprocessing
+import os
+import tempfile
+import threading
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.core.files import File
+
+from .excel import OrderWorkbook
+from .render_pool import pdf_render_pool
+
+BATCH_FILE_TYPES = {'pdf': 'pdf', 'excel': 'xlsx'}
+SUMMARY_NAME = 'Сводка.xlsx'
+ERRORS_NAME = 'Ошибки.txt'
+
+# Каждый архив держит свой пул из BATCH_EXPORT_WORKERS процессов, поэтому число одновременно
+# собираемых архивов ограничено на весь процесс
+archive_slots = threading.BoundedSemaphore(settings.BATCH_EXPORT_CONCURRENCY)
+
+
+def init_worker():
+    """
+    Инициализация процесса рендера (spawn): приложение настраивается заново.
+    Процесс сам рендерит документы, общий пул рендера PDF в нем не нужен.
+    """
+    django.setup()
+    pdf_render_pool.disable()
+
+
+def render_document(order_id, file_type):
+    """
+    Выполняется в процессе пула: возвращает (id заказа, имя файла, содержимое, ошибка).
+    """
+    from .models import Order
+    from .utils import open_order_document
+
+    name = f'Заказ-{order_id}.{BATCH_FILE_TYPES[file_type]}'
+    try:
+        order = Order.objects.prefetch_related('products').get(pk=order_id)
+        # С RENDERED_DOCUMENTS_CACHE неизмененные с прошлой выгрузки заказы берутся из кэша без рендера
+        with open_order_document(order, file_type) as document:
+            return order_id, name, document.read(), None
+    except Exception as e:
+        return order_id, name, None, f'{type(e).__name__}: {e}'
+
+
+class ZipStream(io.RawIOBase):
+    """
+    Поток без перемотки, в который пишет zipfile; записанные байты забираются через take().
+    zipfile в этом режиме пишет размеры и CRC после данных файла.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def take(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_rendered(order_ids, file_type, workers):
+    """
+    Рендерит документы в пуле процессов и отдает результаты в порядке order_ids.
+    В работе не больше workers * 2 задач, чтобы готовые документы не копились в памяти.
+    Процессы запускаются через spawn: веб-процесс многопоточный (и может держать пул рендера PDF),
+    и fork унаследовал бы захваченные другими потоками блокировки и открытые соединения с SQLite.
+    """
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_worker) as executor:
+        pending = deque()
+        for order_id in order_ids:
+            pending.append(executor.submit(render_document, order_id, file_type))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def iter_batch_archive(orders, file_type, workers=None, progress=None):
+    """
+    ZIP-архив с документами заказов из queryset orders и сводной книгой. Отдается частями (bytes).
+    progress(готово, всего) вызывается после каждого документа.
+    """
+    workers = workers or settings.BATCH_EXPORT_WORKERS or os.cpu_count() or 1
+    # Сводка строится до рендера по тому же чтению заказов, что и список документов
+    summary = OrderWorkbook()
+    summary.add_summary_sheet()
+    order_ids = []
+    for order in orders.order_by('created_at', 'id').iterator(chunk_size=2000):
+        summary.add_summary_row(order)
+        order_ids.append(order.pk)
+    summary.close_summary(len(order_ids))
+
+    stream = ZipStream()
+    errors = []
+    with zipfile.ZipFile(stream, 'w') as archive:
+        for done, (order_id, name, data, error) in enumerate(iter_rendered(order_ids, file_type, workers), 1):
+            if error:
+                errors.append(f'Заказ #{order_id}: {error}')
+            else:
+                # PDF и xlsx уже сжаты, повторное сжатие только тратит время
+                archive.writestr(name, data, compress_type=zipfile.ZIP_STORED)
+            if progress:
+                progress(done, len(order_ids))
+            yield stream.take()
+
+        buffer = io.BytesIO()
+        summary.save(buffer)
+        archive.writestr(SUMMARY_NAME, buffer.getvalue(), compress_type=zipfile.ZIP_STORED)
+        if errors:
+            archive.writestr(ERRORS_NAME, '\n'.join(errors), compress_type=zipfile.ZIP_DEFLATED)
+    yield stream.take()
+
+
+def build_archive_job(job):
+    """
+    Собирает архив задачи ExportJob (kind=ARCHIVE) во временный файл и сохраняет его в job.result.
+    Ход рендера записывается в задачу (progress_done/progress_total) и виден на статусе задачи.
+    """
+    from .filters import filter_orders
+    from .models import Order
+
+    orders = filter_orders(Order.objects.all(), job.params)
+    with archive_slots, tempfile.TemporaryFile() as output:
+        for chunk in iter_batch_archive(orders, job.file_type, progress=job.set_progress):
+            output.write(chunk)
+        output.seek(0)
+        job.result.save(f'orders-{job.pk}.zip', File(output), save=False)
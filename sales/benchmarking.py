@@ -0,0 +1,12 @@
+"""
+Общие функции для команд замеров (benchmark_*, stress_sqlite_writes).
+"""
+
+
+def percentile(values, percent):
+    """
+    Перцентиль percent (0–100) по методу ближайшего ранга.
+    """
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
@@ -0,0 +1,278 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from PIL import Image as PILImage
+
+
+class OrderDetailCache:
+    """
+    LRU-кэш сериализованных деталей заказа в памяти процесса.
+    Запись действительна только для той revision заказа, с которой была сохранена,
+    поэтому устаревшие данные не отдаются даже без явной инвалидации (например, из другого процесса).
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, order_id, revision):
+        with self._lock:
+            entry = self._entries.get(order_id)
+            if entry is None or entry[0] != revision:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(order_id)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, order_id, revision, payload):
+        with self._lock:
+            self._entries[order_id] = (revision, payload)
+            self._entries.move_to_end(order_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, *order_ids):
+        with self._lock:
+            for order_id in order_ids:
+                if self._entries.pop(order_id, None) is not None:
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / requests, 4) if requests else None,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+class DiskCache:
+    """
+    Каталог MEDIA_ROOT/<directory> с файлами, вытесняемыми по возрасту и размеру.
+    Время изменения файла обновляется при каждом обращении: по нему вытесняются давно
+    не использованные файлы при превышении max_bytes и файлы старше max_age секунд.
+    """
+    directory_name = None
+    # Обход каталога при вытеснении — не чаще раза в EVICT_INTERVAL секунд на процесс,
+    # иначе пакетная выгрузка тысяч документов обходила бы каталог перед каждой записью
+    EVICT_INTERVAL = 60
+    # Временные файлы (.tmp) пишутся параллельными записями и затем переименовываются в файл кэша:
+    # вытесняются только давно не изменявшиеся, оставшиеся от прерванных записей
+    TEMP_SUFFIX = '.tmp'
+    TEMP_FILE_MAX_AGE = 3600
+
+    def __init__(self, max_bytes, max_age):
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._evicted_at = None
+
+    @property
+    def directory(self):
+        return os.path.join(settings.MEDIA_ROOT, self.directory_name)
+
+    def entry_path(self, digest, extension):
+        return os.path.join(self.directory, digest[:2], f'{digest}.{extension.lower()}')
+
+    def touch(self, path):
+        """
+        Отмечает обращение к файлу кэша. False, если файла нет.
+        """
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return False
+        with self._lock:
+            self.hits += 1
+        return True
+
+    def write(self, target, write):
+        """
+        Создает файл target: write(f) пишет содержимое в открытый на запись файл.
+        """
+        # Место освобождается до записи, чтобы не вытеснить только что созданный файл
+        if self._evicted_at is None or time.monotonic() - self._evicted_at >= self.EVICT_INTERVAL:
+            self.evict()
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # Запись во временный файл и атомарная замена: параллельный экспорт не увидит недописанный файл
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(target), suffix=self.TEMP_SUFFIX)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+            os.replace(temp_path, target)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        with self._lock:
+            self.misses += 1
+        return target
+
+    def entries(self):
+        """
+        Файлы кэша: список (время последнего обращения, размер, путь). Временные файлы
+        незавершенных записей в список не входят.
+        """
+        result = []
+        temp_expires = time.time() - self.TEMP_FILE_MAX_AGE
+        for root, _dirs, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if name.endswith(self.TEMP_SUFFIX) and stat.st_mtime >= temp_expires:
+                    continue
+                result.append((stat.st_mtime, stat.st_size, path))
+        return result
+
+    def evict(self):
+        """
+        Удаляет файлы старше max_age, затем самые давно использованные, пока размер кэша больше max_bytes.
+        Возвращает число удаленных файлов.
+        """
+        self._evicted_at = time.monotonic()
+        entries = sorted(self.entries())
+        total = sum(size for _mtime, size, _path in entries)
+        expires = time.time() - self.max_age
+        removed = []
+        for mtime, size, path in entries:
+            if mtime >= expires and total <= self.max_bytes:
+                continue
+            removed.append(path)
+            total -= size
+        return self._remove(removed)
+
+    def _remove(self, paths):
+        for path in paths:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self.evictions += len(paths)
+        return len(paths)
+
+    def stats(self):
+        entries = self.entries()
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                'entries': len(entries),
+                'bytes': sum(size for _mtime, size, _path in entries),
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / requests, 4) if requests else None,
+                'evictions': self.evictions,
+            }
+
+
+class ConvertedImageCache(DiskCache):
+    """
+    Дисковый кэш сконвертированных изображений (например, WebP -> PNG для Excel и PDF).
+    Ключ — sha256 содержимого исходного файла и целевой формат, поэтому одинаковые фото
+    конвертируются один раз, а замена файла под тем же именем дает новый ключ.
+    Вытесняются в том числе файлы, оставшиеся от удаленных фото.
+    """
+    directory_name = 'converted'
+    HASH_CHUNK_SIZE = 1024 * 1024
+    # Хэши исходных файлов запоминаются по (путь, размер, mtime), чтобы не перечитывать файл
+    MAX_KNOWN_HASHES = 4096
+
+    def __init__(self, max_bytes, max_age):
+        super().__init__(max_bytes, max_age)
+        self._hashes = OrderedDict()
+
+    def content_hash(self, path):
+        stat = os.stat(path)
+        key = (path, stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            digest = self._hashes.get(key)
+            if digest is not None:
+                self._hashes.move_to_end(key)
+                return digest
+
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(self.HASH_CHUNK_SIZE), b''):
+                sha.update(chunk)
+        digest = sha.hexdigest()
+        with self._lock:
+            self._hashes[key] = digest
+            while len(self._hashes) > self.MAX_KNOWN_HASHES:
+                self._hashes.popitem(last=False)
+        return digest
+
+    def convert(self, source_path, image_format='PNG'):
+        """
+        Путь к копии source_path в формате image_format. При попадании в кэш файл не декодируется.
+        """
+        target = self.entry_path(self.content_hash(source_path), image_format)
+        if self.touch(target):
+            return target
+
+        def write(f):
+            with PILImage.open(source_path) as img:
+                img.save(f, image_format)
+
+        return self.write(target, write)
+
+    def remove_orphans(self, digests):
+        """
+        Удаляет файлы, чей исходник не входит в digests (хэши содержимого существующих фото).
+        """
+        return self._remove([path for _mtime, _size, path in self.entries()
+                             if os.path.basename(path).split('.')[0] not in digests])
+
+
+class RenderedDocumentCache(DiskCache):
+    """
+    Дисковый кэш готовых документов заказов (PDF, xlsx). Ключ — хэш содержимого заказа и версии
+    шаблона (sales.documents.document_key), поэтому измененный заказ получает новый ключ,
+    а прежний файл со временем вытесняется.
+    """
+    directory_name = 'documents'
+
+    def open(self, key, extension, write):
+        """
+        Файл документа, открытый на чтение. При промахе документ создается вызовом write(f).
+        """
+        target = self.entry_path(key, extension)
+        if self.touch(target):
+            try:
+                return open(target, 'rb')
+            except FileNotFoundError:
+                # Вытеснен другим процессом между проверкой и открытием
+                pass
+        return open(self.write(target, write), 'rb')
+
+
+order_detail_cache = OrderDetailCache(settings.ORDER_DETAIL_CACHE_SIZE)
+converted_image_cache = ConvertedImageCache(settings.CONVERTED_IMAGES_MAX_BYTES, settings.CONVERTED_IMAGES_MAX_AGE)
+rendered_document_cache = RenderedDocumentCache(settings.RENDERED_DOCUMENTS_MAX_BYTES,
+                                                settings.RENDERED_DOCUMENTS_MAX_AGE)
@@ -0,0 +1,72 @@
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+from django.views.decorators.http import condition
+
+from .models import Order
+
+
+def get_order_version(request, order_id):
+    """
+    revision и updated_at заказа одним легким запросом; результат запоминается на запросе,
+    чтобы ETag и Last-Modified не читали базу дважды.
+    """
+    versions = request.__dict__.setdefault('_order_versions', {})
+    if order_id not in versions:
+        versions[order_id] = Order.objects.filter(pk=order_id).values('revision', 'updated_at').first()
+    return versions[order_id]
+
+
+def make_order_etag(order_id, revision):
+    return f'{order_id}-{revision}'
+
+
+def order_etag(request, pk=None, order_id=None, **kwargs):
+    order_id = pk if pk is not None else order_id
+    version = get_order_version(request, order_id)
+    return make_order_etag(order_id, version['revision']) if version else None
+
+
+def order_last_modified(request, pk=None, order_id=None, **kwargs):
+    order_id = pk if pk is not None else order_id
+    version = get_order_version(request, order_id)
+    return version['updated_at'] if version else None
+
+
+# Условные запросы по версии заказа: If-None-Match/If-Modified-Since отдают 304 без сериализации,
+# If-Match/If-Unmodified-Since на изменяющих методах отдают 412 при устаревшей версии.
+order_condition = condition(etag_func=order_etag, last_modified_func=order_last_modified)
+
+
+def add_order_validators(response, order_id, version):
+    response['ETag'] = quote_etag(make_order_etag(order_id, version['revision']))
+    response['Last-Modified'] = http_date(version['updated_at'].timestamp())
+    return response
+
+
+def set_order_validators(response, order_id):
+    """
+    Проставляет ответу ETag и Last-Modified текущей версии заказа (после изменения).
+    """
+    version = Order.objects.filter(pk=order_id).values('revision', 'updated_at').first()
+    if version:
+        add_order_validators(response, order_id, version)
+    return response
+
+
+async def aget_order_version(order_id):
+    return await Order.objects.filter(pk=order_id).values('revision', 'updated_at').afirst()
+
+
+def evaluate_order_conditions(request, order_id, version):
+    """
+    Проверка условных заголовков для асинхронных представлений (аналог order_condition):
+    возвращает ответ 304/412 или None, если запрос нужно выполнять.
+    """
+    response = get_conditional_response(
+        request,
+        etag=quote_etag(make_order_etag(order_id, version['revision'])),
+        last_modified=int(version['updated_at'].timestamp()),
+    )
+    if response is not None:
+        add_order_validators(response, order_id, version)
+    return response
@@ -0,0 +1,40 @@
+"""
+Ключи готовых документов заказов. Ключ — хэш полей заказа, его товаров и версии оформления:
+пока заказ не изменился, документ отправляется в Telegram по file_id первой загрузки без рендера
+и повторной выгрузки файла (а с RENDERED_DOCUMENTS_CACHE берется из дискового кэша).
+"""
+import hashlib
+import json
+
+# Увеличивается при изменении кода, который строит документы (строки PDF, листы Excel)
+DOCUMENT_LAYOUT_VERSION = 1
+
+# Поля, которые меняются без изменения содержимого документа
+ORDER_IGNORED_FIELDS = {'updated_at', 'revision'}
+PRODUCT_IGNORED_FIELDS = {'order', 'created_at', 'updated_at'}
+
+
+def model_values(instance, ignored):
+    return {field.attname: field.value_to_string(instance)
+            for field in instance._meta.concrete_fields if field.name not in ignored}
+
+
+def order_fingerprint(order):
+    """
+    Содержимое заказа для ключа. Товары берутся из order.products.all() (используйте prefetch_related)
+    и сортируются по id: без ORDER BY база может вернуть их в любом порядке, а ключ от порядка зависеть не должен.
+    """
+    products = sorted(order.products.all(), key=lambda product: product.pk)
+    return {
+        'order': model_values(order, ORDER_IGNORED_FIELDS),
+        'products': [model_values(product, PRODUCT_IGNORED_FIELDS) for product in products],
+    }
+
+
+def document_key(order, kind, version=''):
+    """
+    sha256 документа вида kind (например, pdf или excel) с версией оформления version.
+    """
+    payload = json.dumps([DOCUMENT_LAYOUT_VERSION, kind, version, order_fingerprint(order)],
+                         sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
@@ -0,0 +1,216 @@
+"""
+Выгрузка заказов в Excel в режиме write-only: строки сразу пишутся в файл листа, а не держатся
+в памяти, поэтому память не растет с количеством строк. Фото вставляются из уменьшенных копий
+по пути к файлу и читаются только при сохранении книги, по одному. Оформление задано именованными
+стилями, которые регистрируются в книге один раз и переиспользуются всеми ячейками.
+"""
+import logging
+
+from django.utils import timezone
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.drawing.image import Image
+from openpyxl.styles import Alignment, Font, NamedStyle
+
+from .cache import converted_image_cache
+from .renditions import rendition_path
+
+logger = logging.getLogger(__name__)
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Фото в Excel 30x30, берется наименьшая копия не меньше этого размера
+EXCEL_PHOTO_SIZE = 64
+PHOTO_ROW_HEIGHT = 30
+# Ограничение Excel на длину названия листа
+MAX_SHEET_TITLE = 31
+
+CENTER = Alignment(horizontal='center', vertical='center')
+STYLES = [
+    NamedStyle(name='rhick_label', font=Font(bold=True), alignment=Alignment(horizontal='left', vertical='center')),
+    NamedStyle(name='rhick_value', alignment=CENTER),
+    NamedStyle(name='rhick_header', font=Font(bold=True), alignment=CENTER),
+    NamedStyle(name='rhick_total', font=Font(bold=True), alignment=CENTER),
+    NamedStyle(name='rhick_datetime', alignment=CENTER, number_format='DD.MM.YYYY HH:MM'),
+]
+
+ORDER_COLUMN_WIDTHS = {'A': 30, 'B': 30, 'C': 20, 'D': 20, 'E': 20}
+PRODUCT_HEADERS = ["Название товара", "Фото", "Количество", "Цена за единицу", "Общая стоимость"]
+SUMMARY_HEADERS = ["№ заказа", "Клиент", "Дата создания", "Статус", "Товаров", "Итого без НДС", "Итого с НДС",
+                   "Прочие расходы", "Общий итог"]
+SUMMARY_COLUMN_WIDTHS = {'A': 12, 'B': 30, 'C': 18, 'D': 16, 'E': 10, 'F': 18, 'G': 18, 'H': 18, 'I': 18}
+
+
+def order_status(order):
+    if order.is_confirmed:
+        return 'Подтвержден'
+    if order.is_rejected:
+        return 'Отклонен'
+    return 'В ожидании'
+
+
+def order_totals(order):
+    totals = order.get_totals()
+    return totals['subtotal'], totals['total_with_vat'], totals['expenses_amount'], totals['grand_total']
+
+
+def load_photo(photo_field):
+    """
+    Фото для вставки в лист. openpyxl хранит только путь к копии (файл закрывается сразу после
+    чтения размеров) и читает данные при сохранении книги, освобождая их после записи в архив:
+    память не растет с количеством фото.
+    """
+    path = rendition_path(photo_field, EXCEL_PHOTO_SIZE)
+    if path.lower().endswith('.webp'):
+        path = converted_image_cache.convert(path, 'PNG')
+    image = Image(path)
+    image.width = PHOTO_ROW_HEIGHT
+    image.height = PHOTO_ROW_HEIGHT
+    return image
+
+
+class OrderWorkbook:
+    """
+    Книга Excel с заказами: по листу на заказ и, при необходимости, сводный лист.
+    Листы write-only пишутся последовательно; сводный лист создается первым и дополняется
+    строкой после каждого заказа.
+    """
+
+    def __init__(self):
+        self.workbook = Workbook(write_only=True)
+        for style in STYLES:
+            self.workbook.add_named_style(style)
+        self.summary = None
+        self.summary_totals = [0, 0, 0, 0, 0]
+        self.titles = set()
+
+    def cell(self, sheet, value, style=None):
+        cell = WriteOnlyCell(sheet, value=value)
+        if style:
+            cell.style = style
+        return cell
+
+    def unique_title(self, title):
+        title = title[:MAX_SHEET_TITLE]
+        candidate, index = title, 2
+        while candidate in self.titles:
+            suffix = f' ({index})'
+            candidate = title[:MAX_SHEET_TITLE - len(suffix)] + suffix
+            index += 1
+        self.titles.add(candidate)
+        return candidate
+
+    def add_summary_sheet(self, title='Сводка'):
+        self.summary = self.workbook.create_sheet(self.unique_title(title))
+        for column, width in SUMMARY_COLUMN_WIDTHS.items():
+            self.summary.column_dimensions[column].width = width
+        self.summary.freeze_panes = 'A2'
+        self.summary.append([self.cell(self.summary, header, 'rhick_header') for header in SUMMARY_HEADERS])
+
+    def add_order_sheet(self, order, title=None):
+        """
+        Лист заказа в том же виде, что и одиночная выгрузка: реквизиты, товары с фото и итоги.
+        Товары берутся из order.products.all() (используйте prefetch_related).
+        """
+        sheet = self.workbook.create_sheet(self.unique_title(title or f'Заказ-{order.id}'))
+        for column, width in ORDER_COLUMN_WIDTHS.items():
+            sheet.column_dimensions[column].width = width
+
+        for label, value in (("Название клиента:", order.client),
+                             ("Использованный НДС:", f"{order.vat}%"),
+                             ("Прочие расходы (%):", f"{order.additional_expenses}%")):
+            sheet.append([self.cell(sheet, label, 'rhick_label'), self.cell(sheet, value, 'rhick_value')])
+        sheet.append([self.cell(sheet, header, 'rhick_header') for header in PRODUCT_HEADERS])
+
+        row_num = 5
+        products = 0
+        for product in order.products.all():
+            photo = None
+            if product.photo:
+                try:
+                    image = load_photo(product.photo)
+                    image.anchor = f'B{row_num}'
+                    sheet.add_image(image)
+                except Exception as e:
+                    logger.warning(f"Ошибка обработки изображения: {e}")
+                    photo = "Изображение недоступно"
+            # Высота задается только строкам товаров; строка пишется в файл листа сразу при append,
+            # после чего ее размеры удаляются и не копятся в памяти
+            sheet.row_dimensions[row_num].height = PHOTO_ROW_HEIGHT
+            sheet.append([
+                self.cell(sheet, product.name, 'rhick_value'),
+                self.cell(sheet, photo, 'rhick_value' if photo else None),
+                self.cell(sheet, product.quantity, 'rhick_value'),
+                self.cell(sheet, product.price, 'rhick_value'),
+                self.cell(sheet, product.quantity * product.price, 'rhick_value'),
+            ])
+            del sheet.row_dimensions[row_num]
+            row_num += 1
+            products += 1
+
+        total_price, total_with_vat, expenses, total_sum = order_totals(order)
+        for label, value in (("Итого без НДС:", total_price), ("Итого с НДС:", total_with_vat),
+                             ("Прочие расходы:", expenses), ("Общий итог:", total_sum)):
+            sheet.append([None, None, None, self.cell(sheet, label, 'rhick_total'),
+                          self.cell(sheet, value, 'rhick_total')])
+
+        if self.summary is not None:
+            self.add_summary_row(order, products)
+        return sheet
+
+    def add_summary_row(self, order, products=None):
+        """
+        Строка заказа на сводном листе. Без products берется сохраненное количество товаров.
+        """
+        total_price, total_with_vat, expenses, total_sum = order_totals(order)
+        values = [order.products_count if products is None else products,
+                  total_price, total_with_vat, expenses, total_sum]
+        self.summary_totals = [total + value for total, value in zip(self.summary_totals, values)]
+        # Excel не хранит часовой пояс: дата пишется в местном времени
+        created_at = timezone.localtime(order.created_at).replace(tzinfo=None)
+        self.summary.append(
+            [self.cell(self.summary, order.id, 'rhick_value'),
+             self.cell(self.summary, order.client, 'rhick_value'),
+             self.cell(self.summary, created_at, 'rhick_datetime'),
+             self.cell(self.summary, order_status(order), 'rhick_value')]
+            + [self.cell(self.summary, value, 'rhick_value') for value in values]
+        )
+
+    def close_summary(self, orders_count):
+        """
+        Итоговая строка сводного листа: количество заказов и суммы по всем заказам.
+        """
+        self.summary.append(
+            [self.cell(self.summary, "Итого:", 'rhick_total'),
+             self.cell(self.summary, f"Заказов: {orders_count}", 'rhick_total'), None, None]
+            + [self.cell(self.summary, value, 'rhick_total') for value in self.summary_totals]
+        )
+
+    def save(self, target):
+        self.workbook.save(target)
+
+
+def write_order_workbook(order, target):
+    """
+    Книга с одним заказом (лист «Order»), как в выгрузке заказа в Telegram.
+    """
+    workbook = OrderWorkbook()
+    workbook.add_order_sheet(order, title='Order')
+    workbook.save(target)
+
+
+def write_orders_workbook(orders, target, chunk_size=100):
+    """
+    Книга с несколькими заказами: сводный лист и по листу на заказ. Заказы и товары читаются
+    из БД порциями по chunk_size заказов. Возвращает количество выгруженных заказов.
+    """
+    workbook = OrderWorkbook()
+    workbook.add_summary_sheet()
+    count = 0
+    for order in orders.prefetch_related('products').order_by('created_at', 'id').iterator(chunk_size=chunk_size):
+        workbook.add_order_sheet(order)
+        count += 1
+    workbook.close_summary(count)
+    workbook.save(target)
+    return count
+
@@ -0,0 +1,74 @@
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+
+ORDER_STATUSES = ('confirmed', 'rejected', 'pending')
+# Параметры запроса, которые учитывает filter_orders (фильтр архива сохраняется в задаче экспорта)
+ORDER_FILTER_PARAMS = ('status', 'date_from', 'date_to', 'client', 'warranty_expires_within')
+
+
+def start_of_day(date):
+    """
+    Начало дня в текущем часовом поясе (aware datetime), чтобы фильтр по created_at использовал индекс.
+    """
+    return timezone.make_aware(datetime.combine(date, time.min))
+
+
+def parse_date_param(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+    date = parse_date(value)
+    if date is None:
+        raise ValidationError({name: 'Ожидается дата в формате ГГГГ-ММ-ДД.'})
+    return date
+
+
+def filter_created_between(queryset, date_from=None, date_to=None):
+    """
+    Заказы, созданные с date_from по date_to включительно. Верхняя граница — начало следующего дня.
+    """
+    if date_from:
+        queryset = queryset.filter(created_at__gte=start_of_day(date_from))
+    if date_to:
+        queryset = queryset.filter(created_at__lt=start_of_day(date_to + timedelta(days=1)))
+    return queryset
+
+
+def filter_orders(queryset, params):
+    """
+    Фильтрует заказы по параметрам запроса:
+    status (confirmed/rejected/pending), date_from и date_to (включительно), client
+    и warranty_expires_within (гарантия заканчивается в ближайшие N дней).
+    """
+    status = params.get('status')
+    if status:
+        if status not in ORDER_STATUSES:
+            raise ValidationError({'status': f'Допустимые значения: {", ".join(ORDER_STATUSES)}.'})
+        if status == 'confirmed':
+            queryset = queryset.filter(is_confirmed=True)
+        elif status == 'rejected':
+            queryset = queryset.filter(is_rejected=True)
+        else:
+            queryset = queryset.filter(is_confirmed=False, is_rejected=False)
+
+    queryset = filter_created_between(queryset, parse_date_param(params, 'date_from'),
+                                      parse_date_param(params, 'date_to'))
+
+    client = params.get('client')
+    if client:
+        queryset = queryset.filter(client=client)
+
+    warranty_days = params.get('warranty_expires_within')
+    if warranty_days:
+        try:
+            warranty_days = int(warranty_days)
+        except ValueError:
+            warranty_days = -1
+        if warranty_days < 0:
+            raise ValidationError({'warranty_expires_within': 'Ожидается неотрицательное число дней.'})
+        queryset = queryset.warranty_expires_within(warranty_days)
+
+    return queryset
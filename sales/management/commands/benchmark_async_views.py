@@ -0,0 +1,103 @@
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import AccessToken
+from sales.benchmarking import percentile
+from sales.models import Order
+
+ENDPOINTS = {
+    'list': ('/sales/api/orders/', '/sales/api/async/orders/'),
+    'detail': ('/sales/api/orders/{order_id}/', '/sales/api/async/orders/{order_id}/'),
+    'products': ('/sales/api/orders/{order_id}/products/', '/sales/api/async/orders/{order_id}/products/'),
+    'passwords': ('/sales/api/passwords/', '/sales/api/async/passwords/'),
+}
+
+
+class Command(BaseCommand):
+    help = 'Сравнить пропускную способность синхронного и асинхронного API под конкурентной нагрузкой (ASGI)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', type=str, required=True, help='Пользователь, от имени которого идут запросы')
+        parser.add_argument('--endpoint', choices=list(ENDPOINTS), default='list', help='Какой эндпоинт нагружать')
+        parser.add_argument('--order-id', type=int, help='Заказ для detail/products (по умолчанию последний)')
+        parser.add_argument('--requests', type=int, default=500, help='Количество запросов на каждый стек')
+        parser.add_argument('--concurrency', type=int, default=50, help='Одновременных запросов')
+        parser.add_argument('--output', type=str, help='Сохранить результаты в JSON-файл')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"Пользователь {options['username']} не найден")
+
+        order_id = options['order_id'] or Order.objects.order_by('-id').values_list('id', flat=True).first()
+        if order_id is None and options['endpoint'] in ('detail', 'products'):
+            raise CommandError('Нет заказов для теста')
+
+        token = str(AccessToken.for_user(user))
+        sync_path, async_path = (path.format(order_id=order_id) for path in ENDPOINTS[options['endpoint']])
+
+        results = asyncio.run(self.run_benchmark(token, sync_path, async_path,
+                                                 options['requests'], options['concurrency']))
+
+        for result in results:
+            self.stdout.write(
+                f"{result['stack']:>5} {result['path']}: {result['rps']:.1f} req/s, "
+                f"p50 {result['p50_ms']:.1f} ms, p95 {result['p95_ms']:.1f} ms, p99 {result['p99_ms']:.1f} ms, "
+                f"ошибок {result['errors']}"
+            )
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump({'endpoint': options['endpoint'], 'requests': options['requests'],
+                           'concurrency': options['concurrency'], 'results': results}, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Результаты сохранены: {options['output']}"))
+
+    async def run_benchmark(self, token, sync_path, async_path, total, concurrency):
+        from RHick.asgi import application
+
+        transport = httpx.ASGITransport(app=application)
+        headers = {'Authorization': f'Bearer {token}'}
+        async with httpx.AsyncClient(transport=transport, base_url='http://testserver', headers=headers,
+                                     timeout=None) as client:
+            # Прогрев: первый запрос инициализирует соединение с БД и URL-резолвер
+            await client.get(sync_path)
+            await client.get(async_path)
+            return [
+                await self.run_stack(client, 'sync', sync_path, total, concurrency),
+                await self.run_stack(client, 'async', async_path, total, concurrency),
+            ]
+
+    async def run_stack(self, client, stack, path, total, concurrency):
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+        errors = 0
+
+        async def one_request():
+            nonlocal errors
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.get(path)
+                latencies.append((time.perf_counter() - started) * 1000)
+                if response.status_code >= 400:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one_request() for _ in range(total)))
+        elapsed = time.perf_counter() - started
+
+        return {
+            'stack': stack,
+            'path': path,
+            'rps': total / elapsed,
+            'mean_ms': statistics.mean(latencies),
+            'p50_ms': percentile(latencies, 50),
+            'p95_ms': percentile(latencies, 95),
+            'p99_ms': percentile(latencies, 99),
+            'errors': errors,
+        }
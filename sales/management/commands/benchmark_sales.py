@@ -0,0 +1,198 @@
+import json
+import platform
+import statistics
+import time
+
+import django
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from sales.models import Order
+from sales.seeding import PRODUCT_DISTRIBUTIONS, seed_sales_data
+from sales.serializers import OrderDetailSerializer, OrderSerializer
+
+
+def order_list_serializer(order):
+    orders = Order.objects.order_by('-created_at', '-id')[:settings.ORDERS_PAGE_SIZE]
+    return OrderSerializer(orders, many=True).data
+
+
+def order_detail_serializer(order):
+    return OrderDetailSerializer(Order.objects.prefetch_related('products').get(pk=order.pk)).data
+
+
+def generate_order_excel(order):
+    from sales.utils import generate_order_excel
+
+    generate_order_excel(Order.objects.prefetch_related('products').get(pk=order.pk)).close()
+
+
+def generate_order_pdf(order):
+    from sales.utils import generate_order_pdf
+
+    generate_order_pdf(Order.objects.prefetch_related('products').get(pk=order.pk)).close()
+
+
+def pdf_generator(order):
+    from telegrambot.utils.pdf_generator import PDFGenerator
+
+    return PDFGenerator.generate_order_pdf(Order.objects.prefetch_related('products').get(pk=order.pk))
+
+
+def get_statistics(order):
+    from telegrambot.handlers.orders import OrderHandler
+
+    # async_to_sync выполняет синхронную часть в текущем потоке — внутри транзакции с тестовыми данными
+    return async_to_sync(OrderHandler().get_statistics)()
+
+
+CASES = {
+    'order_list_serializer': order_list_serializer,
+    'order_detail_serializer': order_detail_serializer,
+    'generate_order_excel': generate_order_excel,
+    'generate_order_pdf': generate_order_pdf,
+    'pdf_generator': pdf_generator,
+    'get_statistics': get_statistics,
+}
+
+
+class Command(BaseCommand):
+    help = ('Замерить сериализаторы, генерацию Excel/PDF и статистику бота на синтетических данных разного объема. '
+            'Данные создаются в транзакции и откатываются после замеров')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=str, default='100,1000,10000', help='Количество заказов через запятую')
+        parser.add_argument('--cases', type=str, default=','.join(CASES), help='Какие замеры выполнять')
+        parser.add_argument('--repeat', type=int, default=5, help='Повторов каждого замера')
+        parser.add_argument('--max-products', type=int, default=30, help='Максимум товаров в заказе')
+        parser.add_argument('--distribution', choices=PRODUCT_DISTRIBUTIONS, default='skewed',
+                            help='Распределение количества товаров')
+        parser.add_argument('--photo-ratio', type=float, default=0.2, help='Доля товаров с фото (0..1)')
+        parser.add_argument('--seed', type=int, default=0, help='Начальное значение генератора')
+        parser.add_argument('--output', type=str, help='Сохранить результаты в JSON-файл')
+        parser.add_argument('--compare', type=str, help='JSON-файл предыдущего запуска для сравнения')
+        parser.add_argument('--threshold', type=float, default=10.0,
+                            help='Рост медианы в процентах, который считается регрессией')
+        parser.add_argument('--fail-on-regression', action='store_true',
+                            help='Завершиться с ошибкой, если найдены регрессии')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',')]
+        except ValueError:
+            raise CommandError('--sizes: ожидаются целые числа через запятую')
+        cases = options['cases'].split(',')
+        unknown = set(cases) - set(CASES)
+        if unknown:
+            raise CommandError(f"Неизвестные замеры: {', '.join(sorted(unknown))}. Доступны: {', '.join(CASES)}")
+
+        results = []
+        for size in sizes:
+            results += self.run_size(size, cases, options)
+
+        report = {
+            'meta': {
+                'created_at': timezone.now().isoformat(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'seed': options['seed'],
+                'repeat': options['repeat'],
+                'max_products': options['max_products'],
+                'distribution': options['distribution'],
+                'photo_ratio': options['photo_ratio'],
+            },
+            'results': results,
+        }
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+            self.stdout.write(self.style.SUCCESS(f"Результаты сохранены: {options['output']}"))
+
+        if options['compare']:
+            regressions = self.compare(results, options['compare'], options['threshold'])
+            if regressions and options['fail_on_regression']:
+                raise CommandError(f'Найдено регрессий: {regressions}')
+
+    def run_size(self, size, cases, options):
+        results = []
+        photos = []
+        try:
+            with transaction.atomic():
+                photos = seed_sales_data(size, max_products=options['max_products'],
+                                         distribution=options['distribution'], photo_ratio=options['photo_ratio'],
+                                         seed=options['seed'])['photos']
+                # Для замеров по одному заказу берется самый крупный
+                order = Order.objects.annotate(count=Count('products')).order_by('-count', 'pk').first()
+
+                for case in cases:
+                    result = self.run_case(case, order, size, options['repeat'])
+                    results.append(result)
+                    if 'error' in result:
+                        self.stdout.write(self.style.WARNING(f"{size:>7} {case}: ошибка — {result['error']}"))
+                    else:
+                        self.stdout.write(
+                            f"{size:>7} {case}: медиана {result['median_ms']:.2f} ms, "
+                            f"мин {result['min_ms']:.2f} ms, запросов {result['queries']}"
+                        )
+                transaction.set_rollback(True)
+        finally:
+            # Файлы не откатываются вместе с транзакцией
+            for name in photos:
+                default_storage.delete(name)
+        return results
+
+    @staticmethod
+    def run_case(case, order, size, repeat):
+        func = CASES[case]
+        result = {'case': case, 'size': size}
+        try:
+            # Первый запуск — прогрев (импорты, шаблоны, шрифты) и подсчет SQL-запросов
+            with CaptureQueriesContext(connection) as queries:
+                func(order)
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                func(order)
+                timings.append((time.perf_counter() - started) * 1000)
+        except Exception as e:
+            result['error'] = f'{type(e).__name__}: {e}'
+            return result
+
+        result.update({
+            'queries': len(queries),
+            'min_ms': min(timings),
+            'median_ms': statistics.median(timings),
+            'mean_ms': statistics.mean(timings),
+            'max_ms': max(timings),
+        })
+        return result
+
+    def compare(self, results, path, threshold):
+        try:
+            with open(path, encoding='utf-8') as f:
+                previous = {(row['case'], row['size']): row for row in json.load(f)['results']}
+        except (OSError, ValueError, KeyError) as e:
+            raise CommandError(f'Не удалось прочитать {path}: {e}')
+
+        self.stdout.write(f'Сравнение с {path}:')
+        regressions = 0
+        for row in results:
+            before = previous.get((row['case'], row['size']))
+            if before is None or 'median_ms' not in before or 'median_ms' not in row:
+                continue
+            change = (row['median_ms'] - before['median_ms']) / before['median_ms'] * 100
+            line = (f"{row['size']:>7} {row['case']}: {before['median_ms']:.2f} → {row['median_ms']:.2f} ms "
+                    f"({change:+.1f}%), запросов {before['queries']} → {row['queries']}")
+            if change > threshold or row['queries'] > before['queries']:
+                regressions += 1
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(line)
+        return regressions
@@ -0,0 +1,51 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ValidationError
+from sales.excel import write_orders_workbook
+from sales.filters import filter_orders
+from sales.models import Order
+from sales.streaming import EXPORT_FILE_TYPES, iter_export
+
+
+class Command(BaseCommand):
+    help = 'Выгрузить заказы с товарами в NDJSON, CSV или Excel (xlsx: сводный лист и лист на каждый заказ)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file-type', choices=[*EXPORT_FILE_TYPES, 'xlsx'], default='ndjson', help='Формат выгрузки')
+        parser.add_argument('--output', type=str, help='Файл для записи (по умолчанию stdout)')
+        parser.add_argument('--status', type=str, help='confirmed, rejected или pending')
+        parser.add_argument('--date-from', type=str, help='Дата создания с (ГГГГ-ММ-ДД)')
+        parser.add_argument('--date-to', type=str, help='Дата создания по (ГГГГ-ММ-ДД)')
+        parser.add_argument('--client', type=str, help='Название клиента')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Размер порции чтения из БД')
+
+    def handle(self, *args, **options):
+        params = {
+            'status': options['status'],
+            'date_from': options['date_from'],
+            'date_to': options['date_to'],
+            'client': options['client'],
+        }
+        try:
+            orders = filter_orders(Order.objects.all(), params)
+        except ValidationError as e:
+            raise CommandError(e.detail)
+
+        if options['file_type'] == 'xlsx':
+            if not options['output']:
+                raise CommandError('Для xlsx нужно указать --output')
+            count = write_orders_workbook(orders, options['output'])
+            self.stderr.write(self.style.SUCCESS(f"Выгружено заказов: {count}, файл: {options['output']}"))
+            return
+
+        output = open(options['output'], 'w', encoding='utf-8', newline='') if options['output'] else sys.stdout
+        try:
+            for chunk in iter_export(orders, options['file_type'], options['chunk_size']):
+                output.write(chunk)
+        finally:
+            if output is not sys.stdout:
+                output.close()
+
+        if options['output']:
+            self.stderr.write(self.style.SUCCESS(f"Выгрузка сохранена: {options['output']}"))
@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ValidationError
+from sales.batch_export import BATCH_FILE_TYPES, iter_batch_archive
+from sales.filters import filter_orders
+from sales.models import Order
+
+
+class Command(BaseCommand):
+    help = ('Выгрузить PDF или Excel каждого заказа по фильтру в один ZIP-архив со сводной книгой. '
+            'Документы рендерятся параллельно в нескольких процессах')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', type=str, required=True, help='Файл архива (.zip)')
+        parser.add_argument('--file-type', choices=list(BATCH_FILE_TYPES), default='pdf', help='Формат документов')
+        parser.add_argument('--status', type=str, help='confirmed, rejected или pending')
+        parser.add_argument('--date-from', type=str, help='Дата создания с (ГГГГ-ММ-ДД)')
+        parser.add_argument('--date-to', type=str, help='Дата создания по (ГГГГ-ММ-ДД)')
+        parser.add_argument('--client', type=str, help='Название клиента')
+        parser.add_argument('--workers', type=int, help='Количество процессов рендера (по умолчанию по числу ядер)')
+
+    def handle(self, *args, **options):
+        params = {
+            'status': options['status'],
+            'date_from': options['date_from'],
+            'date_to': options['date_to'],
+            'client': options['client'],
+        }
+        try:
+            orders = filter_orders(Order.objects.all(), params)
+        except ValidationError as e:
+            raise CommandError(e.detail)
+
+        started = time.perf_counter()
+        total = 0
+
+        def progress(done, count):
+            nonlocal total
+            total = count
+            self.stderr.write(f'\rГотово {done}/{count} ({done / count:.0%})', ending='')
+            self.stderr.flush()
+
+        with open(options['output'], 'wb') as output:
+            for chunk in iter_batch_archive(orders, options['file_type'], options['workers'], progress):
+                output.write(chunk)
+        if total:
+            self.stderr.write('')
+        self.stderr.write(self.style.SUCCESS(
+            f"Документов: {total}, за {time.perf_counter() - started:.1f} с, архив: {options['output']}"
+        ))
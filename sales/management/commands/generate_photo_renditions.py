@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from sales.models import OrderProduct
+from sales.renditions import generate_renditions, rendition_name
+
+
+class Command(BaseCommand):
+    help = 'Создать уменьшенные копии фото товаров, загруженных до их появления (или пересоздать все с --force)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Пересоздать копии, даже если они уже есть')
+
+    def handle(self, *args, **options):
+        created = skipped = 0
+        names = OrderProduct.objects.exclude(photo='').exclude(photo__isnull=True).values_list('photo', flat=True)
+        for name in names.iterator():
+            if not default_storage.exists(name):
+                self.stdout.write(self.style.WARNING(f'Файл не найден: {name}'))
+                continue
+            complete = all(default_storage.exists(rendition_name(name, size))
+                           for size in settings.PHOTO_RENDITION_SIZES)
+            if complete and not options['force']:
+                skipped += 1
+                continue
+            if generate_renditions(name):
+                created += 1
+        self.stdout.write(self.style.SUCCESS(f'Обработано фото: {created}, пропущено (копии уже есть): {skipped}'))
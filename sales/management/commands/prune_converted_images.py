@@ -0,0 +1,44 @@
+import os
+
+from django.core.management.base import BaseCommand
+from sales.cache import converted_image_cache
+from sales.models import OrderProduct
+
+
+class Command(BaseCommand):
+    help = ('Очистить кэш конвертированных фото: удалить файлы удаленных или замененных фото, '
+            'устаревшие и лишние сверх лимита, а также PNG-копии, которые раньше сохранялись рядом с WebP')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Только показать, что будет удалено')
+
+    def handle(self, *args, **options):
+        digests = set()
+        legacy = []
+        photos = set(OrderProduct.objects.exclude(photo='').exclude(photo__isnull=True).values_list('photo', flat=True))
+        for name in photos:
+            path = OrderProduct.photo.field.storage.path(name)
+            if not os.path.exists(path):
+                continue
+            digests.add(converted_image_cache.content_hash(path))
+            stem, extension = os.path.splitext(name)
+            # PNG рядом с WebP создавался старой конвертацией; если это само фото товара — не трогаем
+            if extension.lower() == '.webp' and f'{stem}.png' not in photos:
+                png_path = f'{os.path.splitext(path)[0]}.png'
+                if os.path.exists(png_path):
+                    legacy.append(png_path)
+
+        if options['dry_run']:
+            orphans = [path for _mtime, _size, path in converted_image_cache.entries()
+                       if os.path.basename(path).split('.')[0] not in digests]
+            self.stdout.write(f'Файлов кэша без исходного фото: {len(orphans)}, старых PNG-копий: {len(legacy)}')
+            return
+
+        orphans = converted_image_cache.remove_orphans(digests)
+        evicted = converted_image_cache.evict()
+        for path in legacy:
+            os.remove(path)
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено файлов кэша без исходного фото: {orphans}, устаревших или сверх лимита: {evicted}, '
+            f'старых PNG-копий: {len(legacy)}'
+        ))
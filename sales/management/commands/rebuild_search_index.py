@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from sales import search
+
+
+class Command(BaseCommand):
+    help = 'Перестроить полнотекстовый индекс поиска (клиенты, продукты, организации)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Количество строк в одной пачке вставки')
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            raise CommandError('Полнотекстовый индекс поддерживается только для SQLite; используется поиск по icontains')
+
+        with transaction.atomic():
+            total = search.rebuild_index(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Проиндексировано объектов: {total}'))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Q
+from sales.models import Order, grand_total_expression
+from sales.signals import orders_changed
+
+
+class Command(BaseCommand):
+    help = 'Проверить и исправить сохраненные итоги заказов (subtotal, products_count, grand_total)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Только показать расхождения, ничего не менять')
+        parser.add_argument('--all', action='store_true', help='Пересчитать все заказы, а не только расхождения')
+        parser.add_argument('--batch-size', type=int, default=500, help='Количество заказов в одном UPDATE')
+
+    def handle(self, *args, **options):
+        orders = Order.objects.all()
+        if not options['all']:
+            drifted = Order.objects.with_live_totals().filter(
+                ~Q(subtotal=F('live_subtotal'))
+                | ~Q(products_count=F('live_products_count'))
+                | ~Q(grand_total=grand_total_expression(F('live_subtotal')))
+            )
+            orders = orders.filter(pk__in=list(drifted.values_list('pk', flat=True)))
+
+        order_ids = list(orders.order_by('pk').values_list('pk', flat=True))
+        if not order_ids:
+            self.stdout.write(self.style.SUCCESS('Расхождений не найдено'))
+            return
+
+        if options['check']:
+            self.stdout.write(self.style.WARNING(f'Заказов с расхождениями: {len(order_ids)}'))
+            self.stdout.write(', '.join(str(pk) for pk in order_ids))
+            return
+
+        batch_size = options['batch_size']
+        updated = 0
+        for start in range(0, len(order_ids), batch_size):
+            batch = order_ids[start:start + batch_size]
+            with transaction.atomic():
+                updated += Order.objects.filter(pk__in=batch).refresh_totals()
+                orders_changed(*batch)
+
+        self.stdout.write(self.style.SUCCESS(f'Пересчитано заказов: {updated}'))
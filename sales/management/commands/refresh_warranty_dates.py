@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from sales.models import Order
+from sales.signals import orders_changed
+
+
+class Command(BaseCommand):
+    help = 'Заполнить или пересчитать даты окончания гарантии (warranty_ends_at) по confirmed_at и WARRANTY_DAYS'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Только показать количество расхождений')
+        parser.add_argument('--batch-size', type=int, default=500, help='Количество заказов в одном UPDATE')
+
+    def handle(self, *args, **options):
+        order_ids = list(Order.objects.with_stale_warranty().order_by('pk').values_list('pk', flat=True))
+        if not order_ids:
+            self.stdout.write(self.style.SUCCESS('Расхождений не найдено'))
+            return
+
+        if options['check']:
+            self.stdout.write(f'Заказов с устаревшей датой окончания гарантии: {len(order_ids)}')
+            return
+
+        batch_size = options['batch_size']
+        for start in range(0, len(order_ids), batch_size):
+            batch = order_ids[start:start + batch_size]
+            with transaction.atomic():
+                Order.objects.filter(pk__in=batch).refresh_warranty()
+                orders_changed(*batch)
+
+        self.stdout.write(self.style.SUCCESS(f'Обновлено заказов: {len(order_ids)}'))
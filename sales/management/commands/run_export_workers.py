@@ -0,0 +1,89 @@
+import os
+import signal
+import socket
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+from RHick.db import retry_on_lock
+from sales.batch_export import build_archive_job
+from sales.models import ExportJob
+from sales.utils import send_order_to_telegram
+
+
+class Command(BaseCommand):
+    help = ('Обработчики очереди экспорта (ExportJob): отправка заказов в Telegram и сборка ZIP-архивов. '
+            'Повтор с нарастающей паузой, после исчерпания попыток задача помечается как невыполненная')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=2, help='Количество параллельных обработчиков')
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help='Пауза в секундах, если очередь пуста')
+        parser.add_argument('--once', action='store_true', help='Обработать готовые задачи и завершиться')
+
+    def handle(self, *args, **options):
+        self.stop = threading.Event()
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, lambda *_: self.stop.set())
+
+        requeued = retry_on_lock(ExportJob.objects.requeue_stale)(settings.EXPORT_JOB_STALE_TIMEOUT)
+        if requeued:
+            self.stdout.write(self.style.WARNING(f'Возвращено в очередь зависших задач: {requeued}'))
+
+        prefix = f'{socket.gethostname()}:{os.getpid()}'
+        workers = [threading.Thread(target=self.work, args=(f'{prefix}:{index}', options), daemon=True)
+                   for index in range(options['concurrency'])]
+        for worker in workers:
+            worker.start()
+        try:
+            while any(worker.is_alive() for worker in workers):
+                for worker in workers:
+                    worker.join(timeout=1)
+        except KeyboardInterrupt:
+            self.stdout.write('Остановка: дожидаемся текущих задач')
+            self.stop.set()
+            for worker in workers:
+                worker.join()
+
+    def work(self, name, options):
+        """
+        Цикл одного обработчика. Файл формируется в этом потоке, а ожидание ответа Telegram
+        не держит GIL, поэтому несколько потоков отправляют заказы параллельно.
+        """
+        try:
+            while not self.stop.is_set():
+                jobs = retry_on_lock(ExportJob.objects.claim)(name)
+                if not jobs:
+                    if options['once']:
+                        return
+                    self.stop.wait(options['poll_interval'])
+                    continue
+                for job in jobs:
+                    self.run_job(job)
+        finally:
+            connection.close()
+
+    def run_job(self, job):
+        try:
+            if job.kind == ExportJob.ARCHIVE:
+                build_archive_job(job)
+            else:
+                send_order_to_telegram(job.order, file_type=job.file_type)
+        except Exception as e:
+            retry_on_lock(job.mark_failed)(f'{type(e).__name__}: {e}', settings.EXPORT_JOB_RETRY_DELAY,
+                                           retry_after=getattr(e, 'retry_after', None))
+            if job.status == ExportJob.DEAD:
+                self.stdout.write(self.style.ERROR(f'Задача #{job.pk} не выполнена после {job.attempts} попыток: {e}'))
+            else:
+                self.stdout.write(self.style.WARNING(
+                    f'Задача #{job.pk}: попытка {job.attempts}/{job.max_attempts} не удалась ({e}), '
+                    f'повтор после {timezone.localtime(job.run_after):%H:%M:%S}'
+                ))
+            return
+        retry_on_lock(job.mark_done)()
+        if job.kind == ExportJob.ARCHIVE:
+            self.stdout.write(self.style.SUCCESS(f'Задача #{job.pk}: архив собран, документов {job.progress_total}'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Задача #{job.pk}: заказ #{job.order_id} отправлен ({job.file_type})'))
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from sales import search
+from sales.seeding import PRODUCT_DISTRIBUTIONS, seed_sales_data
+
+
+class Command(BaseCommand):
+    help = 'Заполнить базу синтетическими заказами, товарами и паролями (детерминированно по --seed)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=1000, help='Количество заказов')
+        parser.add_argument('--min-products', type=int, default=1, help='Минимум товаров в заказе')
+        parser.add_argument('--max-products', type=int, default=10, help='Максимум товаров в заказе')
+        parser.add_argument('--distribution', choices=PRODUCT_DISTRIBUTIONS, default='uniform',
+                            help='Распределение количества товаров: uniform или skewed (длинный хвост)')
+        parser.add_argument('--photo-ratio', type=float, default=0.0, help='Доля товаров с фото (0..1)')
+        parser.add_argument('--passwords', type=int, default=0, help='Количество записей паролей')
+        parser.add_argument('--days', type=int, default=365, help='За сколько последних дней распределить заказы')
+        parser.add_argument('--seed', type=int, default=0, help='Начальное значение генератора')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Размер пачки вставки')
+
+    def handle(self, *args, **options):
+        if not 0 <= options['min_products'] <= options['max_products']:
+            raise CommandError('Нужно 0 <= --min-products <= --max-products')
+        if not 0 <= options['photo_ratio'] <= 1:
+            raise CommandError('--photo-ratio должен быть от 0 до 1')
+
+        with transaction.atomic():
+            created = seed_sales_data(
+                options['orders'],
+                min_products=options['min_products'],
+                max_products=options['max_products'],
+                distribution=options['distribution'],
+                photo_ratio=options['photo_ratio'],
+                passwords=options['passwords'],
+                seed=options['seed'],
+                days=options['days'],
+                batch_size=options['batch_size'],
+            )
+            # Массовая вставка идет мимо сигналов, поэтому индекс поиска перестраивается целиком
+            search.rebuild_index()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Создано заказов: {created['orders']}, товаров: {created['products']}, "
+            f"фото: {len(created['photos'])}, паролей: {created['passwords']}"
+        ))
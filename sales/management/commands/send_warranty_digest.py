@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from sales.models import Order
+
+# Ограничение Telegram на длину одного сообщения
+MESSAGE_LIMIT = 4000
+
+
+class Command(BaseCommand):
+    help = 'Отправить в Telegram-чат сводку заказов, гарантия которых скоро заканчивается (запускать раз в день)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='Гарантия заканчивается в ближайшие N дней')
+        parser.add_argument('--dry-run', action='store_true', help='Вывести сводку, не отправляя в Telegram')
+
+    def handle(self, *args, **options):
+        if options['days'] < 0:
+            raise CommandError('--days должен быть неотрицательным')
+
+        # Диапазон и сортировка по warranty_ends_at идут по индексу order_warranty_ends_idx
+        orders = (Order.objects.warranty_expires_within(options['days'])
+                  .order_by('warranty_ends_at')
+                  .values_list('id', 'client', 'warranty_ends_at'))
+
+        now = timezone.now()
+        lines = [
+            f"#{order_id} {client} — {timezone.localtime(ends_at).strftime('%d.%m.%Y')} "
+            f"(осталось {(ends_at - now).days} дн.)"
+            for order_id, client, ends_at in orders
+        ]
+        if not lines:
+            self.stdout.write(f"Гарантий, истекающих в ближайшие {options['days']} дн., нет")
+            return
+
+        messages = self.split_messages(
+            f"⏰ Гарантия заканчивается в ближайшие {options['days']} дн. (заказов: {len(lines)}):", lines
+        )
+        if options['dry_run']:
+            self.stdout.write('\n\n'.join(messages))
+            return
+
+        from sales.utils import send_telegram_message
+
+        for message in messages:
+            if not send_telegram_message(message):
+                raise CommandError('Не удалось отправить сводку в Telegram')
+        self.stdout.write(self.style.SUCCESS(f'Сводка отправлена: {len(lines)} заказов, сообщений: {len(messages)}'))
+
+    @staticmethod
+    def split_messages(header, lines):
+        messages = []
+        current = header
+        for line in lines:
+            if len(current) + len(line) + 1 > MESSAGE_LIMIT:
+                messages.append(current)
+                current = line
+            else:
+                current += '\n' + line
+        messages.append(current)
+        return messages
@@ -0,0 +1,160 @@
+import copy
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections
+from RHick.db import is_lock_error, retry_on_lock
+from sales.benchmarking import percentile
+from sales.models import Order, OrderProduct
+
+MODES = ('baseline', 'tuned')
+# Настройки SQLite «как было»: журнал DELETE, отложенные транзакции, таймаут по умолчанию, без постоянных соединений
+BASELINE_SETTINGS = {'OPTIONS': {}, 'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False}
+
+
+def create_order(rng, order_ids):
+    order_ids.append(Order.objects.create(client=f'Нагрузка {rng.randint(1, 10000)}', vat=12).pk)
+
+
+def add_product(rng, order_ids):
+    OrderProduct.objects.create(order_id=rng.choice(order_ids), name='Камера', quantity=rng.randint(1, 5),
+                                price=rng.randint(100, 10000))
+
+
+def confirm_order(rng, order_ids):
+    order = Order.objects.get(pk=rng.choice(order_ids))
+    order.is_confirmed = True
+    order.save()
+
+
+OPERATIONS = (create_order, add_product, add_product, confirm_order)
+
+
+def run_worker(mode, operations, seed, barrier, results):
+    """
+    Процесс-писатель: смесь создания заказов, добавления товаров и подтверждения заказов.
+    В режиме tuned записи идут через retry_on_lock.
+    """
+    rng = random.Random(seed)
+    latencies = []
+    lock_errors = 0
+    order_ids = []
+    barrier.wait()
+    try:
+        for _ in range(operations):
+            operation = OPERATIONS[rng.randrange(len(OPERATIONS))] if order_ids else create_order
+            if mode == 'tuned':
+                operation = retry_on_lock(operation)
+            started = time.perf_counter()
+            try:
+                operation(rng, order_ids)
+            except OperationalError as e:
+                if not is_lock_error(e):
+                    raise
+                lock_errors += 1
+                continue
+            latencies.append((time.perf_counter() - started) * 1000)
+    except Exception as e:
+        results.put({'error': f'{type(e).__name__}: {e}'})
+        return
+    finally:
+        connections.close_all()
+    results.put({'latencies': latencies, 'lock_errors': lock_errors})
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный тест конкурентной записи в SQLite несколькими процессами: p99 задержки записи '
+            'и доля ошибок «database is locked» с исходными (baseline) и рабочими (tuned) настройками')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', choices=MODES + ('both',), default='both', help='Какие настройки проверять')
+        parser.add_argument('--processes', type=int, default=4, help='Количество процессов-писателей')
+        parser.add_argument('--operations', type=int, default=200, help='Операций записи на процесс')
+        parser.add_argument('--seed', type=int, default=0, help='Начальное значение генератора')
+        parser.add_argument('--output', type=str, help='Сохранить результаты в JSON-файл')
+
+    def handle(self, *args, **options):
+        if connections['default'].vendor != 'sqlite':
+            raise CommandError('Тест предназначен только для SQLite')
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            raise CommandError('Нужна поддержка fork для запуска процессов')
+
+        modes = MODES if options['mode'] == 'both' else (options['mode'],)
+        results = [self.run_mode(mode, options) for mode in modes]
+
+        for result in results:
+            self.stdout.write(
+                f"{result['mode']:>8}: {result['writes']} записей, {result['writes_per_second']:.1f} зап/с, "
+                f"p50 {result['p50_ms']:.1f} ms, p95 {result['p95_ms']:.1f} ms, p99 {result['p99_ms']:.1f} ms, "
+                f"ошибок блокировки {result['lock_errors']} ({result['lock_error_rate']:.1%})"
+            )
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump({'processes': options['processes'], 'operations': options['operations'],
+                           'results': results}, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Результаты сохранены: {options['output']}"))
+
+    def run_mode(self, mode, options):
+        """
+        Каждый режим работает с отдельной временной базой: journal_mode=WAL сохраняется в файле
+        и исказил бы замер исходных настроек.
+        """
+        settings_dict = connections['default'].settings_dict
+        original = copy.deepcopy({key: settings_dict.get(key) for key in ('NAME', *BASELINE_SETTINGS)})
+        directory = tempfile.mkdtemp(prefix='rhick-stress-')
+        try:
+            settings_dict['NAME'] = os.path.join(directory, 'db.sqlite3')
+            if mode == 'baseline':
+                settings_dict.update(copy.deepcopy(BASELINE_SETTINGS))
+            connections.close_all()
+            call_command('migrate', run_syncdb=True, interactive=False, verbosity=0)
+            # Соединение родителя не должно переходить в дочерние процессы
+            connections.close_all()
+
+            context = multiprocessing.get_context('fork')
+            barrier = context.Barrier(options['processes'] + 1)
+            queue = context.Queue()
+            workers = [
+                context.Process(target=run_worker,
+                                args=(mode, options['operations'], options['seed'] + index, barrier, queue))
+                for index in range(options['processes'])
+            ]
+            for worker in workers:
+                worker.start()
+            barrier.wait()
+            started = time.perf_counter()
+            outcomes = [queue.get() for _ in workers]
+            elapsed = time.perf_counter() - started
+            for worker in workers:
+                worker.join()
+            errors = [outcome['error'] for outcome in outcomes if 'error' in outcome]
+            if errors:
+                raise CommandError(f'Процесс-писатель завершился с ошибкой в режиме {mode}: {errors[0]}')
+        finally:
+            connections.close_all()
+            settings_dict.update(original)
+            shutil.rmtree(directory, ignore_errors=True)
+
+        latencies = [latency for outcome in outcomes for latency in outcome['latencies']]
+        lock_errors = sum(outcome['lock_errors'] for outcome in outcomes)
+        attempted = len(latencies) + lock_errors
+        return {
+            'mode': mode,
+            'writes': len(latencies),
+            'writes_per_second': len(latencies) / elapsed,
+            'mean_ms': statistics.mean(latencies) if latencies else 0,
+            'p50_ms': percentile(latencies, 50) if latencies else 0,
+            'p95_ms': percentile(latencies, 95) if latencies else 0,
+            'p99_ms': percentile(latencies, 99) if latencies else 0,
+            'lock_errors': lock_errors,
+            'lock_error_rate': lock_errors / attempted if attempted else 0,
+        }
@@ -0,0 +1,127 @@
+# Generated by Django 5.1.2 on 2026-10-18 07:24
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity', models.CharField(choices=[('order', 'Заказ'), ('product', 'Продукт'), ('password', 'Пароль')], max_length=20, verbose_name='Тип объекта')),
+                ('object_id', models.PositiveBigIntegerField(verbose_name='ID объекта')),
+                ('action', models.CharField(choices=[('upsert', 'Создание/изменение'), ('delete', 'Удаление')], default='upsert', max_length=10, verbose_name='Действие')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата изменения')),
+            ],
+            options={
+                'verbose_name': 'Изменение',
+                'verbose_name_plural': 'Журнал изменений',
+            },
+        ),
+        migrations.CreateModel(
+            name='Password',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('organization_name', models.CharField(max_length=255, verbose_name='Название организации')),
+                ('nvr_password', models.CharField(max_length=255, verbose_name='Пароль от NVR')),
+                ('camera_password', models.CharField(max_length=255, verbose_name='Пароль от камеры')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'Пароль',
+                'verbose_name_plural': 'Пароли',
+            },
+        ),
+        migrations.CreateModel(
+            name='Order',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('client', models.CharField(max_length=100, verbose_name='Название клиента')),
+                ('vat', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True, verbose_name='НДС (%)')),
+                ('additional_expenses', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True, verbose_name='Прочие расходы (%)')),
+                ('advance', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True, verbose_name='Аванс')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('is_confirmed', models.BooleanField(default=False, verbose_name='Подтвержденный заказ')),
+                ('is_rejected', models.BooleanField(default=False, verbose_name='Отклоненный заказ')),
+                ('confirmed_at', models.DateTimeField(blank=True, null=True, verbose_name='Дата подтверждения')),
+                ('rejected_at', models.DateTimeField(blank=True, null=True, verbose_name='Дата отклонения')),
+                ('warranty_ends_at', models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Дата окончания гарантии')),
+                ('subtotal', models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=14, verbose_name='Сумма без НДС')),
+                ('products_count', models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество товаров')),
+                ('grand_total', models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=14, verbose_name='Общий итог')),
+                ('revision', models.PositiveIntegerField(default=1, editable=False, verbose_name='Версия')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'Заказ',
+                'verbose_name_plural': 'Заказы',
+                'indexes': [models.Index(fields=['-created_at', '-id'], name='order_created_idx'), models.Index(fields=['is_confirmed', 'created_at'], name='order_confirmed_created_idx'), models.Index(fields=['is_rejected', 'created_at'], name='order_rejected_created_idx'), models.Index(fields=['client', 'created_at'], name='order_client_created_idx'), models.Index(fields=['warranty_ends_at'], name='order_warranty_ends_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='OrderProduct',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, verbose_name='Название')),
+                ('quantity', models.PositiveIntegerField(verbose_name='Количество')),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Цена')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+                ('photo', models.ImageField(blank=True, null=True, upload_to='order_product_photos/', verbose_name='Фото')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='products', to='sales.order', verbose_name='Заказ')),
+            ],
+            options={
+                'verbose_name': 'Продукт',
+                'verbose_name_plural': 'Продукты',
+            },
+        ),
+        migrations.CreateModel(
+            name='TelegramDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bot_id', models.CharField(max_length=32, verbose_name='ID бота')),
+                ('key', models.CharField(max_length=64, verbose_name='Ключ документа')),
+                ('file_id', models.CharField(max_length=255, verbose_name='file_id')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'Документ в Telegram',
+                'verbose_name_plural': 'Документы в Telegram',
+                'constraints': [models.UniqueConstraint(fields=('bot_id', 'key'), name='telegramdocument_bot_key_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_type', models.CharField(choices=[('excel', 'Excel'), ('pdf', 'PDF')], default='excel', max_length=10, verbose_name='Формат')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('running', 'Выполняется'), ('done', 'Выполнена'), ('dead', 'Не выполнена')], default='pending', max_length=10, verbose_name='Статус')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Попыток')),
+                ('max_attempts', models.PositiveIntegerField(default=5, verbose_name='Максимум попыток')),
+                ('last_error', models.TextField(blank=True, verbose_name='Последняя ошибка')),
+                ('worker', models.CharField(blank=True, max_length=100, verbose_name='Обработчик')),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Запустить после')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Начало попытки')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Завершена')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='export_jobs', to='sales.order', verbose_name='Заказ')),
+            ],
+            options={
+                'verbose_name': 'Задача экспорта',
+                'verbose_name_plural': 'Задачи экспорта',
+                'indexes': [models.Index(fields=['status', 'run_after'], name='exportjob_status_run_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.1.2 on 2026-10-18 07:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exportjob',
+            name='kind',
+            field=models.CharField(choices=[('telegram', 'Отправка в Telegram'), ('archive', 'ZIP-архив')], default='telegram', max_length=10, verbose_name='Вид'),
+        ),
+        migrations.AddField(
+            model_name='exportjob',
+            name='params',
+            field=models.JSONField(blank=True, default=dict, verbose_name='Фильтр заказов'),
+        ),
+        migrations.AddField(
+            model_name='exportjob',
+            name='progress_done',
+            field=models.PositiveIntegerField(default=0, verbose_name='Готово документов'),
+        ),
+        migrations.AddField(
+            model_name='exportjob',
+            name='progress_total',
+            field=models.PositiveIntegerField(default=0, verbose_name='Всего документов'),
+        ),
+        migrations.AddField(
+            model_name='exportjob',
+            name='result',
+            field=models.FileField(blank=True, upload_to='exports/', verbose_name='Архив'),
+        ),
+        migrations.AlterField(
+            model_name='exportjob',
+            name='order',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='export_jobs', to='sales.order', verbose_name='Заказ'),
+        ),
+    ]
@@ -1,6 +1,139 @@
-from django.db import models
+from datetime import timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import (Count, DecimalField, ExpressionWrapper, F, FloatField, IntegerField, OuterRef, Q,
+                              Subquery, Sum, Value)
+from django.db.models.functions import Cast, Coalesce, Round
 from django.utils import timezone
 
+from .renditions import delete_photo, generate_renditions
+
+MONEY_FIELD = DecimalField(max_digits=20, decimal_places=2)
+ZERO = Value(Decimal(0), output_field=MONEY_FIELD)
+CENT = Decimal('0.01')
+
+
+def money(value):
+    """
+    Денежная сумма в Decimal, округленная до копеек (половина — вверх).
+    """
+    return Decimal(str(value or 0)).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def calculate_totals(subtotal, vat=None, additional_expenses=None, advance=None):
+    """
+    Итоги заказа для API, Excel, PDF и бота. НДС и прочие расходы считаются от суммы без НДС
+    и округляются до копеек каждый, общий итог — их сумма с subtotal (так же считает grand_total_expression).
+    """
+    subtotal = money(subtotal)
+    vat_amount = money(subtotal * money(vat) / 100)
+    expenses_amount = money(subtotal * money(additional_expenses) / 100)
+    grand_total = subtotal + vat_amount + expenses_amount
+    advance = money(advance)
+    return {
+        'subtotal': subtotal,
+        'vat_amount': vat_amount,
+        'expenses_amount': expenses_amount,
+        'total_with_vat': subtotal + vat_amount,
+        'grand_total': grand_total,
+        'advance': advance,
+        'amount_due': grand_total - advance,
+    }
+
+
+def to_hundredths(expression):
+    """
+    Значение с двумя знаками после запятой как целое число сотых: дальше суммы считаются
+    в целых числах, без погрешности REAL в SQLite.
+    """
+    return Cast(Round(expression * Value(100)), IntegerField())
+
+
+def percent_cents(subtotal_cents, percent_field):
+    """
+    «subtotal * percent_field / 100» в копейках с округлением половины вверх, как в calculate_totals.
+    """
+    percent = to_hundredths(Coalesce(F(percent_field), ZERO))
+    return (subtotal_cents * percent + Value(5000)) / Value(10000)
+
+
+def grand_total_expression(subtotal):
+    """
+    Выражение общей суммы заказа: сумма без НДС плюс НДС и прочие расходы, округленные до копеек.
+    """
+    subtotal_cents = to_hundredths(subtotal)
+    total_cents = (subtotal_cents + percent_cents(subtotal_cents, 'vat')
+                   + percent_cents(subtotal_cents, 'additional_expenses'))
+    return ExpressionWrapper(Cast(total_cents, FloatField()) / Value(100.0), output_field=MONEY_FIELD)
+
+
+class OrderQuerySet(models.QuerySet):
+    def with_live_totals(self):
+        """
+        Добавляет live_subtotal и live_products_count, посчитанные заново по товарам заказа.
+        Нужно для поиска расхождений с сохраненными итогами.
+        """
+        return self.annotate(
+            live_subtotal=Coalesce(
+                Sum(F('products__quantity') * F('products__price'), output_field=MONEY_FIELD), ZERO
+            ),
+            live_products_count=Count('products'),
+        )
+
+    def refresh_totals(self):
+        """
+        Пересчитывает сохраненные итоги (subtotal, products_count, grand_total) выбранных заказов
+        одним UPDATE с подзапросами по товарам и увеличивает их revision.
+        """
+        products = OrderProduct.objects.filter(order=OuterRef('pk')).order_by().values('order')
+        subtotal = Coalesce(
+            Subquery(products.annotate(
+                total=Sum(F('quantity') * F('price'), output_field=MONEY_FIELD)
+            ).values('total')),
+            ZERO,
+        )
+        products_count = Coalesce(Subquery(products.annotate(count=Count('pk')).values('count')), 0)
+        return self.update(
+            subtotal=Round(subtotal, 2, output_field=MONEY_FIELD),
+            products_count=products_count,
+            grand_total=grand_total_expression(subtotal),
+            revision=F('revision') + 1,
+            updated_at=timezone.now(),
+        )
+
+    def with_stale_warranty(self):
+        """
+        Заказы, у которых сохраненная warranty_ends_at не совпадает с рассчитанной по confirmed_at.
+        """
+        has_warranty = Q(is_confirmed=True, confirmed_at__isnull=False)
+        expected = F('confirmed_at') + timedelta(days=settings.WARRANTY_DAYS)
+        return self.filter(
+            has_warranty & (Q(warranty_ends_at__isnull=True) | ~Q(warranty_ends_at=expected))
+            | ~has_warranty & Q(warranty_ends_at__isnull=False)
+        )
+
+    def refresh_warranty(self):
+        """
+        Пересчитывает warranty_ends_at выбранных заказов (например, после изменения WARRANTY_DAYS)
+        и увеличивает их revision.
+        """
+        has_warranty = Q(is_confirmed=True, confirmed_at__isnull=False)
+        self.filter(has_warranty).update(
+            warranty_ends_at=F('confirmed_at') + timedelta(days=settings.WARRANTY_DAYS),
+            revision=F('revision') + 1,
+            updated_at=timezone.now(),
+        )
+        self.exclude(has_warranty).update(warranty_ends_at=None, revision=F('revision') + 1, updated_at=timezone.now())
+
+    def warranty_expires_within(self, days):
+        """
+        Подтвержденные заказы, гарантия которых заканчивается в ближайшие days дней (диапазон по индексу).
+        """
+        now = timezone.now()
+        return self.filter(warranty_ends_at__gte=now, warranty_ends_at__lt=now + timedelta(days=days))
+
 
 class Order(models.Model):
     client = models.CharField(max_length=100, verbose_name='Название клиента')
@@ -13,37 +146,72 @@ class Order(models.Model):
     is_rejected = models.BooleanField(default=False, verbose_name="Отклоненный заказ")
     confirmed_at = models.DateTimeField(null=True, blank=True, verbose_name="Дата подтверждения")
     rejected_at = models.DateTimeField(null=True, blank=True, verbose_name="Дата отклонения")
+    warranty_ends_at = models.DateTimeField(null=True, blank=True, editable=False,
+                                            verbose_name="Дата окончания гарантии")
+    subtotal = models.DecimalField(max_digits=14, decimal_places=2, default=0, editable=False,
+                                   verbose_name='Сумма без НДС')
+    products_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество товаров')
+    grand_total = models.DecimalField(max_digits=14, decimal_places=2, default=0, editable=False,
+                                      verbose_name='Общий итог')
+    revision = models.PositiveIntegerField(default=1, editable=False, verbose_name='Версия')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
+
+    objects = OrderQuerySet.as_manager()
+
+    # Поля, которые ведутся через refresh_totals(), а не через обычное сохранение
+    MAINTAINED_FIELDS = ('subtotal', 'products_count', 'grand_total', 'revision')
 
     class Meta:
         verbose_name = 'Заказ'
         verbose_name_plural = 'Заказы'
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='order_created_idx'),
+            models.Index(fields=['is_confirmed', 'created_at'], name='order_confirmed_created_idx'),
+            models.Index(fields=['is_rejected', 'created_at'], name='order_rejected_created_idx'),
+            models.Index(fields=['client', 'created_at'], name='order_client_created_idx'),
+            models.Index(fields=['warranty_ends_at'], name='order_warranty_ends_idx'),
+        ]
 
     def __str__(self):
         return f"Заказ {self.id} от {self.client}"
 
+    def get_totals(self):
+        """
+        Итоги заказа по сохраненному subtotal (см. calculate_totals).
+        """
+        return calculate_totals(self.subtotal, self.vat, self.additional_expenses, self.advance)
+
     def get_total_price(self):
         """
-        Вычисляем общую стоимость всех товаров в заказе без НДС.
+        Общая стоимость всех товаров в заказе без НДС (сохраненное значение).
         """
-        total_price = sum([product.quantity * product.price for product in self.products.all()])
-        return total_price
+        return self.get_totals()['subtotal']
 
     def get_total_price_with_vat(self):
         """
-        Вычисляем общую стоимость заказа только с учетом НДС.
+        Общая стоимость заказа только с учетом НДС.
         """
-        total_price = self.get_total_price()
-        vat_multiplier = 1 + (self.vat / 100 if self.vat else 0)  # Учет НДС
-        return total_price * vat_multiplier
+        return self.get_totals()['total_with_vat']
 
     def get_additional_expenses_amount(self):
         """
-        Вычисляем сумму прочих расходов в абсолютном значении на основе общей стоимости заказа без НДС.
+        Сумма прочих расходов в абсолютном значении на основе общей стоимости заказа без НДС.
+        """
+        return self.get_totals()['expenses_amount']
+
+    def calculate_grand_total(self):
+        """
+        Общая сумма заказа по сохраненному subtotal с учетом НДС и прочих расходов.
         """
-        total_price = self.get_total_price()
-        if self.additional_expenses:
-            return total_price * (self.additional_expenses / 100)
-        return 0
+        return self.get_totals()['grand_total']
+
+    def calculate_warranty_ends_at(self):
+        """
+        Дата окончания гарантии: WARRANTY_DAYS дней с подтверждения заказа.
+        """
+        if self.is_confirmed and self.confirmed_at:
+            return self.confirmed_at + timedelta(days=settings.WARRANTY_DAYS)
+        return None
 
     def save(self, *args, **kwargs):
         if self.is_confirmed and self.confirmed_at is None:
@@ -55,7 +223,27 @@ class Order(models.Model):
         if self.is_confirmed and self.is_rejected:
             raise ValueError("Заказ не может быть одновременно подтвержденным и отклоненным.")
 
-        super(Order, self).save(*args, **kwargs)
+        self.grand_total = self.calculate_grand_total()
+        self.warranty_ends_at = self.calculate_warranty_ends_at()
+
+        update_fields = kwargs.get('update_fields')
+        if self._state.adding or (update_fields is not None and not update_fields):
+            super(Order, self).save(*args, **kwargs)
+            return
+
+        if update_fields is None:
+            update_fields = [field.name for field in self._meta.concrete_fields if not field.primary_key]
+        elif {'is_confirmed', 'confirmed_at'} & set(update_fields):
+            # Дата подтверждения могла быть проставлена выше, от нее зависит конец гарантии
+            update_fields = [*update_fields, 'confirmed_at', 'warranty_ends_at']
+        # Итоги и версию не перезаписываем значениями из памяти (товары могли измениться параллельно),
+        # а пересчитываем в той же транзакции. Версия растет и при частичном сохранении (update_fields):
+        # по ней строятся ETag и кэш деталей заказа.
+        kwargs['update_fields'] = {name for name in update_fields if name not in self.MAINTAINED_FIELDS}
+        with transaction.atomic():
+            super(Order, self).save(*args, **kwargs)
+            Order.objects.filter(pk=self.pk).refresh_totals()
+        self.refresh_from_db(fields=[*self.MAINTAINED_FIELDS, 'updated_at'])
 
 
 class OrderProduct(models.Model):
@@ -75,12 +263,22 @@ class OrderProduct(models.Model):
         return f'{self.name} - {self.order}'
 
     def save(self, *args, **kwargs):
+        photo_changed = bool(self.photo)
+        old_photo = None
         if self.pk and self.photo:
             old_photo = OrderProduct.objects.get(pk=self.pk).photo
-            if old_photo and old_photo != self.photo:
-                old_photo.delete(save=False)
+            photo_changed = old_photo != self.photo
+
+        # Итоги заказа пересчитываются сигналом post_save в той же транзакции. Замененное фото и его копии
+        # удаляются только после фиксации: при ошибке или откате запись по-прежнему ссылается на свой файл
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if old_photo and photo_changed:
+                transaction.on_commit(lambda: delete_photo(old_photo.name, old_photo.storage))
 
-        super().save(*args, **kwargs)
+        # Уменьшенные копии создаются один раз, при появлении нового фото
+        if photo_changed:
+            generate_renditions(self.photo.name)
 
 
 class Password(models.Model):
@@ -96,3 +294,202 @@ class Password(models.Model):
     class Meta:
         verbose_name = "Пароль"
         verbose_name_plural = "Пароли"
+
+
+class ChangeLogQuerySet(models.QuerySet):
+    def record(self, entity, object_ids, action='upsert'):
+        """
+        Записывает изменения объектов одного типа одним INSERT.
+        """
+        return self.bulk_create([ChangeLog(entity=entity, object_id=object_id, action=action)
+                                 for object_id in object_ids])
+
+
+class ChangeLog(models.Model):
+    """
+    Журнал изменений для дельта-синхронизации мобильного приложения.
+    Возрастающий id записи служит курсором синхронизации.
+    """
+    ORDER = 'order'
+    PRODUCT = 'product'
+    PASSWORD = 'password'
+    ENTITY_CHOICES = [(ORDER, 'Заказ'), (PRODUCT, 'Продукт'), (PASSWORD, 'Пароль')]
+
+    UPSERT = 'upsert'
+    DELETE = 'delete'
+    ACTION_CHOICES = [(UPSERT, 'Создание/изменение'), (DELETE, 'Удаление')]
+
+    entity = models.CharField(max_length=20, choices=ENTITY_CHOICES, verbose_name="Тип объекта")
+    object_id = models.PositiveBigIntegerField(verbose_name="ID объекта")
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES, default=UPSERT, verbose_name="Действие")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата изменения")
+
+    objects = ChangeLogQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Изменение'
+        verbose_name_plural = 'Журнал изменений'
+
+    def __str__(self):
+        return f'{self.get_action_display()} {self.get_entity_display()} #{self.object_id}'
+
+
+class ExportJobQuerySet(models.QuerySet):
+    def enqueue(self, order, file_type):
+        return self.create(order=order, file_type=file_type, max_attempts=settings.EXPORT_JOB_MAX_ATTEMPTS)
+
+    def enqueue_archive(self, params, file_type):
+        """
+        Задача сборки ZIP-архива документов заказов по фильтру params (status, date_from, date_to, client).
+        """
+        return self.create(kind=ExportJob.ARCHIVE, params=params, file_type=file_type,
+                           max_attempts=settings.EXPORT_JOB_MAX_ATTEMPTS)
+
+    def claim(self, worker, limit=1):
+        """
+        Забирает до limit готовых к запуску задач для обработчика worker.
+        Выборка и пометка выполняются в одной транзакции (в SQLite — с блокировкой записи),
+        поэтому одну задачу не заберут два обработчика.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            job_ids = list(self.filter(status=ExportJob.PENDING, run_after__lte=now)
+                           .order_by('run_after', 'id').values_list('id', flat=True)[:limit])
+            # Ход сборки считается заново с каждой попытки
+            self.filter(pk__in=job_ids, status=ExportJob.PENDING).update(
+                status=ExportJob.RUNNING, worker=worker, started_at=now, attempts=F('attempts') + 1,
+                progress_done=0, updated_at=now
+            )
+            return list(self.filter(pk__in=job_ids, status=ExportJob.RUNNING, worker=worker)
+                        .select_related('order'))
+
+    def requeue_stale(self, timeout):
+        """
+        Возвращает в очередь задачи, застрявшие в RUNNING дольше timeout секунд (обработчик упал или был убит).
+        """
+        now = timezone.now()
+        return self.filter(status=ExportJob.RUNNING, started_at__lt=now - timedelta(seconds=timeout)).update(
+            status=ExportJob.PENDING, worker='', run_after=now, updated_at=now
+        )
+
+
+class ExportJob(models.Model):
+    """
+    Фоновая задача экспорта: отправка заказа в Telegram или сборка ZIP-архива документов заказов
+    по фильтру. Обрабатывается командой run_export_workers; после max_attempts неудачных попыток
+    переходит в DEAD и больше не запускается.
+    """
+    TELEGRAM = 'telegram'
+    ARCHIVE = 'archive'
+    KIND_CHOICES = [(TELEGRAM, 'Отправка в Telegram'), (ARCHIVE, 'ZIP-архив')]
+
+    EXCEL = 'excel'
+    PDF = 'pdf'
+    FILE_TYPE_CHOICES = [(EXCEL, 'Excel'), (PDF, 'PDF')]
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    DEAD = 'dead'
+    STATUS_CHOICES = [(PENDING, 'В очереди'), (RUNNING, 'Выполняется'), (DONE, 'Выполнена'),
+                      (DEAD, 'Не выполнена')]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, default=TELEGRAM, verbose_name="Вид")
+    order = models.ForeignKey('Order', on_delete=models.CASCADE, null=True, blank=True, related_name='export_jobs',
+                              verbose_name="Заказ")
+    params = models.JSONField(default=dict, blank=True, verbose_name="Фильтр заказов")
+    file_type = models.CharField(max_length=10, choices=FILE_TYPE_CHOICES, default=EXCEL, verbose_name="Формат")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING, verbose_name="Статус")
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Попыток")
+    max_attempts = models.PositiveIntegerField(default=5, verbose_name="Максимум попыток")
+    last_error = models.TextField(blank=True, verbose_name="Последняя ошибка")
+    progress_done = models.PositiveIntegerField(default=0, verbose_name="Готово документов")
+    progress_total = models.PositiveIntegerField(default=0, verbose_name="Всего документов")
+    result = models.FileField(upload_to='exports/', blank=True, verbose_name="Архив")
+    worker = models.CharField(max_length=100, blank=True, verbose_name="Обработчик")
+    run_after = models.DateTimeField(default=timezone.now, verbose_name="Запустить после")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="Начало попытки")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Завершена")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
+
+    objects = ExportJobQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Задача экспорта'
+        verbose_name_plural = 'Задачи экспорта'
+        indexes = [models.Index(fields=['status', 'run_after'], name='exportjob_status_run_idx')]
+
+    def __str__(self):
+        if self.kind == self.ARCHIVE:
+            return f'Архив {self.get_file_type_display()} #{self.pk} ({self.get_status_display()})'
+        return f'{self.get_file_type_display()} заказа #{self.order_id} ({self.get_status_display()})'
+
+    def set_progress(self, done, total):
+        self.progress_done, self.progress_total = done, total
+        ExportJob.objects.filter(pk=self.pk).update(progress_done=done, progress_total=total,
+                                                    updated_at=timezone.now())
+
+    def mark_done(self):
+        self.status = self.DONE
+        self.finished_at = timezone.now()
+        self.last_error = ''
+        self.save(update_fields=['status', 'finished_at', 'last_error', 'result', 'updated_at'])
+
+    def mark_failed(self, error, retry_delay, retry_after=None):
+        """
+        Неудачная попытка: задача возвращается в очередь с паузой retry_delay * 2^(attempts-1),
+        но не меньше retry_after (пауза, которую потребовал Telegram), или, если попытки исчерпаны,
+        переходит в DEAD.
+        """
+        self.last_error = error
+        if self.attempts >= self.max_attempts:
+            self.status = self.DEAD
+            self.finished_at = timezone.now()
+        else:
+            self.status = self.PENDING
+            delay = max(retry_delay * 2 ** (self.attempts - 1), retry_after or 0)
+            self.run_after = timezone.now() + timedelta(seconds=delay)
+        self.worker = ''
+        self.save(update_fields=['status', 'last_error', 'finished_at', 'run_after', 'worker', 'updated_at'])
+
+
+class TelegramDocumentQuerySet(models.QuerySet):
+    def for_bot(self, token, key):
+        return self.filter(bot_id=TelegramDocument.bot_id_for(token), key=key)
+
+    def file_id(self, token, key):
+        return self.for_bot(token, key).values_list('file_id', flat=True).first()
+
+    def remember(self, token, key, file_id):
+        self.update_or_create(bot_id=TelegramDocument.bot_id_for(token), key=key, defaults={'file_id': file_id})
+
+    def forget(self, token, key):
+        self.for_bot(token, key).delete()
+
+
+class TelegramDocument(models.Model):
+    """
+    file_id документа, уже загруженного в Telegram, по ключу содержимого (sales.documents.document_key).
+    file_id действителен только для бота, который загрузил файл, поэтому хранится по id бота
+    (часть токена до двоеточия; сам токен не сохраняется).
+    """
+    bot_id = models.CharField(max_length=32, verbose_name="ID бота")
+    key = models.CharField(max_length=64, verbose_name="Ключ документа")
+    file_id = models.CharField(max_length=255, verbose_name="file_id")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
+
+    objects = TelegramDocumentQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Документ в Telegram'
+        verbose_name_plural = 'Документы в Telegram'
+        constraints = [models.UniqueConstraint(fields=['bot_id', 'key'], name='telegramdocument_bot_key_uniq')]
+
+    def __str__(self):
+        return f'{self.key[:12]} (бот {self.bot_id})'
+
+    @staticmethod
+    def bot_id_for(token):
+        return token.split(':', 1)[0]
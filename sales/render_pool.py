@@ -0,0 +1,185 @@
+"""
+Пул процессов рендера PDF. WeasyPrint занимает CPU и держит GIL, поэтому рендер в потоке
+останавливает остальные запросы процесса (в боте — все обработчики, ожидающие sync_to_async).
+Процессы пула запускаются заранее: WeasyPrint уже импортирован, шрифты шаблонов и базовые стили
+загружены, и первый документ не платит за прогрев. Процесс перезапускается после
+PDF_RENDER_MAX_TASKS_PER_CHILD документов, чтобы память не росла.
+"""
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+# Семейства шрифтов из шаблонов заказов (sales/order_pdf.html, telegram/order_pdf.html): пробный рендер
+# ими загружает те же шрифты, что понадобятся документам
+TEMPLATE_FONT_FAMILIES = ('Arial, Helvetica, sans-serif', 'Arial, sans-serif')
+MAX_CACHED_STYLESHEETS = 32
+
+
+class RenderTimeout(Exception):
+    pass
+
+
+# Состояние процесса рендера: конфигурация шрифтов и разобранные стили (по тексту CSS)
+_font_config = None
+_stylesheets = {}
+
+
+def get_stylesheet(css):
+    from weasyprint import CSS
+
+    stylesheet = _stylesheets.get(css)
+    if stylesheet is None:
+        if len(_stylesheets) >= MAX_CACHED_STYLESHEETS:
+            _stylesheets.pop(next(iter(_stylesheets)))
+        stylesheet = _stylesheets[css] = CSS(string=css, font_config=_font_config)
+    return stylesheet
+
+
+def warm_up(base_styles=()):
+    """
+    Инициализатор процесса пула: импорт WeasyPrint, базовые стили и пробный рендер шрифтами шаблонов
+    (он загружает обычное и жирное начертания в pango и заполняет внутренние кэши).
+    """
+    global _font_config
+    from weasyprint import HTML
+    from weasyprint.text.fonts import FontConfiguration
+
+    _font_config = FontConfiguration()
+    for css in base_styles:
+        get_stylesheet(css)
+    sample = ''.join(f'<p style="font-family: {family}">Заказ <b>№ 1</b></p>' for family in TEMPLATE_FONT_FAMILIES)
+    HTML(string=sample).write_pdf(font_config=_font_config)
+
+
+def render(html, base_url, styles):
+    """
+    Рендер HTML в PDF (bytes) с дополнительными стилями styles (тексты CSS).
+    """
+    from weasyprint import HTML
+
+    if _font_config is None:
+        warm_up()
+    stylesheets = [get_stylesheet(css) for css in styles]
+    return HTML(string=html, base_url=base_url).write_pdf(stylesheets=stylesheets, font_config=_font_config)
+
+
+def ping():
+    return os.getpid()
+
+
+class PDFRenderPool:
+    """
+    Пул процессов рендера: размер PDF_RENDER_WORKERS (0 — рендер в текущем процессе),
+    таймаут на документ PDF_RENDER_TIMEOUT и семафор на PDF_RENDER_CONCURRENCY одновременных рендеров.
+    Если документ не уложился в таймаут, пул заменяется новым: следующие документы не ждут зависший рендер.
+    initializer — функция подготовки процесса (по умолчанию warm_up).
+    """
+
+    def __init__(self, initializer=warm_up):
+        self.initializer = initializer
+        self._executor = None
+        self._semaphore = None
+        self._lock = threading.Lock()
+        self._base_styles = []
+        self.enabled = True
+
+    @property
+    def size(self):
+        return settings.PDF_RENDER_WORKERS if self.enabled else 0
+
+    def register_styles(self, styles):
+        """
+        Стили, которые процессы загружают при старте: список текстов CSS или функция, которая его возвращает.
+        """
+        self._base_styles.append(styles)
+
+    def base_styles(self):
+        result = []
+        for styles in self._base_styles:
+            result += styles() if callable(styles) else styles
+        return tuple(result)
+
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._semaphore = threading.BoundedSemaphore(settings.PDF_RENDER_CONCURRENCY or self.size)
+                # max_tasks_per_child несовместим с fork; процессы spawn не наследуют состояние веб-процесса
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.size,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=self.initializer,
+                    initargs=(self.base_styles(),),
+                    max_tasks_per_child=settings.PDF_RENDER_MAX_TASKS_PER_CHILD,
+                )
+            return self._executor
+
+    def warm(self):
+        """
+        Запускает все процессы пула сразу, а не по мере первых запросов.
+        """
+        if not self.size:
+            return
+        executor = self.executor()
+        futures = [executor.submit(ping) for _ in range(self.size)]
+        for future in futures:
+            future.result(timeout=settings.PDF_RENDER_TIMEOUT)
+
+    def render_pdf(self, html, base_url=None, styles=()):
+        base_url = base_url or os.getcwd()
+        if not self.size:
+            return render(html, base_url, styles)
+        return self.run(render, html, base_url, tuple(styles))
+
+    def run(self, func, *args):
+        """
+        Выполняет func(*args) в процессе пула не дольше PDF_RENDER_TIMEOUT секунд.
+        """
+        executor = self.executor()
+        semaphore = self._semaphore
+        timeout = settings.PDF_RENDER_TIMEOUT
+        if not semaphore.acquire(timeout=timeout):
+            raise RenderTimeout(f'Нет свободного процесса рендера PDF за {timeout} с')
+        try:
+            future = executor.submit(func, *args)
+            try:
+                return future.result(timeout=timeout)
+            except FutureTimeoutError:
+                self.restart(executor)
+                raise RenderTimeout(f'Рендер PDF не завершился за {timeout} с')
+            except BrokenProcessPool:
+                self.restart(executor)
+                raise
+        finally:
+            semaphore.release()
+
+    def restart(self, executor):
+        """
+        Заменяет пул executor новым (создается при следующем документе). Ожидающие в очереди задачи
+        отменяются, процессы старого пула дорабатывают начатые документы и завершаются.
+        """
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def disable(self):
+        """
+        Рендер в текущем процессе. Для процессов, которые сами являются рабочими (пакетная выгрузка).
+        """
+        self.enabled = False
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+pdf_render_pool = PDFRenderPool()
+atexit.register(pdf_render_pool.shutdown)
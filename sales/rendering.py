@@ -0,0 +1,114 @@
+import base64
+import hashlib
+import os
+import re
+import threading
+
+from .render_pool import pdf_render_pool
+
+PLACEHOLDER_RE = re.compile(r'\{\{ (\w+) \}\}')
+STYLE_RE = re.compile(r'<style[^>]*>(.*?)</style>', re.DOTALL | re.IGNORECASE)
+
+
+def file_digest(path):
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+class FileAsset:
+    """
+    Файл, загруженный в память процесса. Перечитывается только при изменении mtime,
+    поэтому правка шаблона или логотипа подхватывается без перезапуска.
+    digest — sha256 содержимого файла на момент загрузки (версия для кэша документов).
+    """
+
+    def __init__(self, path, load):
+        self.path = path
+        self.load = load
+        self.digest = None
+        self._mtime = None
+        self._value = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    self._value = self.load(self.path) if mtime is not None else None
+                    self.digest = file_digest(self.path) if mtime is not None else None
+                    self._mtime = mtime
+        return self._value
+
+
+class CompiledTemplate:
+    """
+    HTML-шаблон с плейсхолдерами {{ name }}, разобранный на куски один раз.
+    Стили из <style> вынесены отдельно: процессы рендера разбирают их один раз и держат в кэше.
+    """
+
+    def __init__(self, source):
+        self.styles = STYLE_RE.findall(source)
+        # Нечетные элементы — имена плейсхолдеров, четные — текст между ними
+        self.parts = PLACEHOLDER_RE.split(STYLE_RE.sub('', source))
+
+    def render(self, context):
+        """
+        Подставляет значения за один проход. Плейсхолдеры без значения остаются как есть.
+        """
+        return ''.join(
+            part if index % 2 == 0 else str(context.get(part, f'{{{{ {part} }}}}'))
+            for index, part in enumerate(self.parts)
+        )
+
+
+def load_template(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return CompiledTemplate(f.read())
+
+
+def load_logo_data_uri(path):
+    try:
+        with open(path, 'rb') as f:
+            encoded = base64.b64encode(f.read()).decode('utf-8')
+        return f"data:image/png;base64,{encoded}"
+    except Exception as e:
+        print(f"Ошибка при загрузке логотипа: {e}")
+        return None
+
+
+class PDFRenderer:
+    """
+    Рендерер PDF по HTML-шаблону. Создается один раз на процесс: шаблон и логотип держатся в памяти
+    и перечитываются только при изменении файлов. Сам рендер выполняется в пуле процессов.
+    """
+
+    def __init__(self, template_path, logo_path):
+        self.template = FileAsset(template_path, load_template)
+        self.logo = FileAsset(logo_path, load_logo_data_uri)
+        pdf_render_pool.register_styles(self.base_styles)
+
+    def base_styles(self):
+        template = self.template.get()
+        return template.styles if template else []
+
+    def version(self):
+        """
+        Версия оформления: хэш содержимого шаблона и логотипа.
+        """
+        self.template.get()
+        self.logo.get()
+        return f'{self.template.digest}:{self.logo.digest}'
+
+    def render_html(self, context):
+        return self.template.get().render(context)
+
+    def write_pdf(self, context, base_url=None):
+        template = self.template.get()
+        return pdf_render_pool.render_pdf(template.render(context), base_url, template.styles)
@@ -0,0 +1,93 @@
+"""
+Уменьшенные копии фото товаров. Создаются один раз при сохранении фото и лежат рядом с оригиналом:
+order_product_photos/camera.webp -> order_product_photos/camera_64.jpg, camera_300.jpg, camera_800.jpg.
+"""
+import io
+import logging
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image as PILImage, ImageOps
+
+logger = logging.getLogger(__name__)
+
+RENDITION_FORMAT = 'JPEG'
+RENDITION_EXTENSION = '.jpg'
+RENDITION_QUALITY = 85
+
+
+def rendition_name(name, size):
+    stem = os.path.splitext(name)[0]
+    return f'{stem}_{size}{RENDITION_EXTENSION}'
+
+
+def generate_renditions(name, storage=default_storage):
+    """
+    Создает копии фото name для всех размеров PHOTO_RENDITION_SIZES (по длинной стороне, без увеличения).
+    Прозрачность заменяется белым фоном. Возвращает имена созданных файлов.
+    Если файл не удается прочитать как изображение, копии не создаются — везде используется оригинал.
+    """
+    created = []
+    try:
+        with storage.open(name, 'rb') as f, PILImage.open(f) as original:
+            image = ImageOps.exif_transpose(original)
+            if image.mode in ('RGBA', 'LA', 'P'):
+                image = image.convert('RGBA')
+                background = PILImage.new('RGB', image.size, (255, 255, 255))
+                background.paste(image, mask=image.getchannel('A'))
+                image = background
+            elif image.mode != 'RGB':
+                image = image.convert('RGB')
+
+            # От большего размера к меньшему: каждая копия уменьшается из предыдущей, а не из оригинала
+            for size in sorted(settings.PHOTO_RENDITION_SIZES, reverse=True):
+                image = image.copy()
+                image.thumbnail((size, size), PILImage.LANCZOS)
+                buffer = io.BytesIO()
+                image.save(buffer, RENDITION_FORMAT, quality=RENDITION_QUALITY, optimize=True)
+                target = rendition_name(name, size)
+                storage.delete(target)
+                created.append(storage.save(target, ContentFile(buffer.getvalue())))
+    except OSError as e:
+        logger.warning(f"Не удалось создать копии фото {name}: {e}")
+    return created
+
+
+def delete_renditions(name, storage=default_storage):
+    for size in settings.PHOTO_RENDITION_SIZES:
+        storage.delete(rendition_name(name, size))
+
+
+def delete_photo(name, storage=default_storage):
+    """
+    Удаляет фото name вместе с его копиями.
+    """
+    delete_renditions(name, storage)
+    storage.delete(name)
+
+
+def rendition_path(photo_field, size):
+    """
+    Путь к наименьшей копии фото не меньше size пикселей. Если подходящей копии нет
+    (фото меньше или копии еще не созданы), возвращается путь к оригиналу.
+    """
+    for rendition_size in sorted(settings.PHOTO_RENDITION_SIZES):
+        if rendition_size >= size:
+            path = photo_field.storage.path(rendition_name(photo_field.name, rendition_size))
+            if os.path.exists(path):
+                return path
+    return photo_field.path
+
+
+def rendition_urls(photo_field):
+    """
+    URL копий фото по размерам ({64: url, ...}); отсутствующие копии пропускаются.
+    """
+    urls = {}
+    for size in settings.PHOTO_RENDITION_SIZES:
+        name = rendition_name(photo_field.name, size)
+        if photo_field.storage.exists(name):
+            urls[size] = photo_field.storage.url(name)
+    return urls
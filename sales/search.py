@@ -0,0 +1,222 @@
+import re
+
+from django.db import OperationalError, connection
+
+# Полнотекстовый индекс SQLite FTS5 с триграммным токенизатором: поиск по подстроке и префиксу,
+# а совпадение по большей части триграмм слова дает устойчивость к опечаткам.
+INDEX_TABLE = 'sales_search_index'
+ENTITY_CODES = {'order': 0, 'product': 1, 'password': 2}
+MIN_TERM_LENGTH = 3
+# Доля общих триграмм, начиная с которой нечеткое совпадение попадает в выдачу
+MIN_SIMILARITY = 0.25
+# Доля триграмм слова, которые должны совпасть при поиске с одной опечаткой
+MIN_TYPO_SHARE = 0.5
+FUZZY_CANDIDATES_FACTOR = 5
+
+# Базы (по NAME), в которых таблица индекса уже проверена в этом процессе
+_ready_databases = set()
+
+
+def is_available():
+    return connection.vendor == 'sqlite'
+
+
+def ensure_index(force=False):
+    """
+    Создает виртуальную таблицу индекса, если ее еще нет. FTS5-таблицы нет в миграциях: она есть только в SQLite
+    и пересоздается здесь же, если пропала (заполняет ее rebuild_search_index).
+    """
+    name = connection.settings_dict['NAME']
+    if not is_available() or (name in _ready_databases and not force):
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {INDEX_TABLE} USING fts5("
+            f"body, entity UNINDEXED, object_id UNINDEXED, order_id UNINDEXED, tokenize='trigram')"
+        )
+    _ready_databases.add(name)
+
+
+def execute(sql, params=(), many=False):
+    """
+    Выполняет запрос к индексу и возвращает строки результата. Если таблица пропала (например,
+    была создана в откаченной транзакции), она создается заново и запрос повторяется.
+    """
+    ensure_index()
+    for attempt in range(2):
+        try:
+            with connection.cursor() as cursor:
+                if many:
+                    cursor.executemany(sql, params)
+                else:
+                    cursor.execute(sql, params)
+                return cursor.fetchall() if cursor.description else []
+        except OperationalError as e:
+            if attempt or 'no such table' not in str(e):
+                raise
+            ensure_index(force=True)
+
+
+def make_rowid(entity, object_id):
+    # rowid кодирует тип и id объекта, чтобы обновление и удаление шли по первичному ключу FTS-таблицы
+    return object_id * len(ENTITY_CODES) + ENTITY_CODES[entity]
+
+
+def index_object(entity, object_id, text, order_id=None):
+    if not is_available():
+        return
+    rowid = make_rowid(entity, object_id)
+    execute(f"DELETE FROM {INDEX_TABLE} WHERE rowid = %s", [rowid])
+    execute(f"INSERT INTO {INDEX_TABLE} (rowid, body, entity, object_id, order_id) VALUES (%s, %s, %s, %s, %s)",
+            [rowid, text, entity, object_id, order_id])
+
+
+def remove_object(entity, object_id):
+    if not is_available():
+        return
+    execute(f"DELETE FROM {INDEX_TABLE} WHERE rowid = %s", [make_rowid(entity, object_id)])
+
+
+def index_order(order):
+    index_object('order', order.pk, order.client, order.pk)
+
+
+def index_product(product):
+    index_object('product', product.pk, product.name, product.order_id)
+
+
+def index_password(password):
+    index_object('password', password.pk, password.organization_name)
+
+
+def rebuild_index(chunk_size=2000):
+    """
+    Полностью перестраивает индекс по текущим данным. Возвращает количество проиндексированных объектов.
+    """
+    from .models import Order, OrderProduct, Password
+
+    if not is_available():
+        return 0
+    sources = [
+        ('order', Order.objects.values_list('pk', 'client', 'pk')),
+        ('product', OrderProduct.objects.values_list('pk', 'name', 'order_id')),
+        ('password', Password.objects.values_list('pk', 'organization_name', 'pk')),
+    ]
+    insert = f"INSERT INTO {INDEX_TABLE} (rowid, body, entity, object_id, order_id) VALUES (%s, %s, %s, %s, %s)"
+    total = 0
+    execute(f"DELETE FROM {INDEX_TABLE}")
+    for entity, queryset in sources:
+        batch = []
+        for object_id, text, order_id in queryset.iterator(chunk_size=chunk_size):
+            batch.append([make_rowid(entity, object_id), text, entity, object_id,
+                          order_id if entity != 'password' else None])
+            if len(batch) >= chunk_size:
+                execute(insert, batch, many=True)
+                total += len(batch)
+                batch = []
+        if batch:
+            execute(insert, batch, many=True)
+            total += len(batch)
+    return total
+
+
+def quote_term(term):
+    return '"' + term.replace('"', '""') + '"'
+
+
+def trigrams(term):
+    term = term.lower()
+    return {term[i:i + MIN_TERM_LENGTH] for i in range(len(term) - MIN_TERM_LENGTH + 1)}
+
+
+def typo_match(term):
+    """
+    Условие MATCH для слова с одной опечаткой (замена, пропуск или лишняя буква в позиции i):
+    в тексте есть и часть слова до i, и часть после нее. Каждая часть — группа подряд идущих триграмм,
+    так что совпасть должны все триграммы слова, кроме задетых опечаткой. Части короче триграммы
+    не проверяются, а варианты, где проверяется меньше MIN_TYPO_SHARE триграмм слова, пропускаются;
+    если не осталось ни одного варианта, слово должно совпасть точно.
+    """
+    min_trigrams = (len(term) - MIN_TERM_LENGTH + 1) * MIN_TYPO_SHARE
+    groups = []
+    for i in range(len(term)):
+        parts = [part for part in (term[:i], term[i + 1:]) if len(part) >= MIN_TERM_LENGTH]
+        if parts and sum(len(part) - MIN_TERM_LENGTH + 1 for part in parts) >= min_trigrams:
+            groups.append('(' + ' AND '.join(map(quote_term, parts)) + ')')
+    return ' OR '.join(groups) or quote_term(term)
+
+
+def run_query(match, limit, entities=None, exclude_rowids=()):
+    extra = ''
+    params = [match]
+    if entities:
+        extra += f" AND entity IN ({', '.join(['%s'] * len(entities))})"
+        params += list(entities)
+    if exclude_rowids:
+        extra += f" AND rowid NOT IN ({', '.join(['%s'] * len(exclude_rowids))})"
+        params += list(exclude_rowids)
+    params.append(limit)
+    return execute(
+        f"SELECT rowid, entity, object_id, order_id, body, bm25({INDEX_TABLE}) AS score "
+        f"FROM {INDEX_TABLE} WHERE {INDEX_TABLE} MATCH %s{extra} ORDER BY score LIMIT %s",
+        params,
+    )
+
+
+def search(query, limit=20, entities=None):
+    """
+    Ищет клиентов, названия товаров и организации. Сначала точные совпадения по подстроке/префиксу
+    всех слов, затем (если результатов мало) совпадения с одной опечаткой в каждом слове, и только если
+    не нашлось ничего — по любым общим триграммам с отсевом по MIN_SIMILARITY. Ранжирование bm25.
+    Возвращает список словарей entity, object_id, order_id, text, exact.
+    """
+    terms = [term for term in re.split(r'\s+', query.strip()) if len(term) >= MIN_TERM_LENGTH]
+    if not terms:
+        return []
+
+    if not is_available():
+        return fallback_search(terms, limit, entities)
+
+    exact_match = ' AND '.join(quote_term(term) for term in terms)
+    rows = [(row, True) for row in run_query(exact_match, limit, entities)]
+    if len(rows) < limit:
+        near_match = ' AND '.join(f'({typo_match(term)})' for term in terms)
+        seen = [row[0] for row, _ in rows]
+        rows += [(row, False) for row in run_query(near_match, limit - len(rows), entities, seen)]
+    if not rows:
+        grams = set().union(*(trigrams(term) for term in terms))
+        fuzzy_match = ' OR '.join(quote_term(gram) for gram in sorted(grams))
+        # Кандидаты, совпавшие хотя бы по одной триграмме, отсеиваются по доле общих триграмм
+        candidates = run_query(fuzzy_match, limit * FUZZY_CANDIDATES_FACTOR, entities)
+        similar = [row for row in candidates if len(grams & trigrams(row[4])) / len(grams) >= MIN_SIMILARITY]
+        rows = [(row, False) for row in similar[:limit]]
+
+    return [
+        {'entity': entity, 'object_id': object_id, 'order_id': order_id, 'text': body, 'exact': exact}
+        for (rowid, entity, object_id, order_id, body, score), exact in rows
+    ]
+
+
+def fallback_search(terms, limit, entities=None):
+    """
+    Поиск для баз без FTS5: обычный icontains по всем словам.
+    """
+    from .models import Order, OrderProduct, Password
+
+    results = []
+    sources = [
+        ('order', Order.objects.all(), 'client', lambda obj: obj.pk),
+        ('product', OrderProduct.objects.all(), 'name', lambda obj: obj.order_id),
+        ('password', Password.objects.all(), 'organization_name', lambda obj: None),
+    ]
+    for entity, queryset, field, get_order_id in sources:
+        if entities and entity not in entities:
+            continue
+        for term in terms:
+            queryset = queryset.filter(**{f'{field}__icontains': term})
+        for obj in queryset[:limit - len(results)]:
+            results.append({'entity': entity, 'object_id': obj.pk, 'order_id': get_order_id(obj),
+                            'text': getattr(obj, field), 'exact': True})
+        if len(results) >= limit:
+            break
+    return results
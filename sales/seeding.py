@@ -0,0 +1,130 @@
+import io
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image as PILImage
+
+from .models import ChangeLog, Order, OrderProduct, Password
+from .renditions import generate_renditions
+
+PRODUCT_NAMES = [
+    'Камера видеонаблюдения Hikvision', 'Купольная камера Dahua', 'Видеорегистратор NVR 16 каналов',
+    'Жесткий диск 4 ТБ', 'Коммутатор PoE 8 портов', 'Кабель UTP Cat6 (305 м)', 'Блок питания 12В',
+    'Монтажная коробка', 'Роутер MikroTik', 'ИБП 1000 ВА', 'Монитор 24"', 'Точка доступа Ubiquiti',
+    'Домофон', 'Считыватель карт', 'Электромагнитный замок',
+]
+CLIENT_PREFIXES = ['ООО', 'ИП', 'АО', 'ЧП', 'СП']
+CLIENT_NAMES = ['Ромашка', 'Восток', 'Техносервис', 'Самарканд Строй', 'Навои Трейд', 'Бухара Ритейл',
+                'Альфа', 'Гранит', 'Импульс', 'Меридиан', 'Сфера', 'Орион']
+PRODUCT_DISTRIBUTIONS = ('uniform', 'skewed')
+
+
+def products_count(rng, distribution, min_products, max_products):
+    """
+    Количество товаров в заказе: равномерно в [min, max] или с «длинным хвостом» —
+    большинство заказов небольшие, редкие заказы близки к максимуму.
+    """
+    if distribution == 'uniform':
+        return rng.randint(min_products, max_products)
+    value = min_products - 1 + int(rng.paretovariate(1.2))
+    return max(min_products, min(max_products, value))
+
+
+def make_photo(rng, image_format):
+    color = (rng.randrange(256), rng.randrange(256), rng.randrange(256))
+    buffer = io.BytesIO()
+    PILImage.new('RGB', (800, 600), color).save(buffer, image_format)
+    return buffer.getvalue()
+
+
+def seed_sales_data(orders, min_products=1, max_products=10, distribution='uniform', photo_ratio=0.0,
+                    passwords=0, seed=0, days=365, batch_size=1000):
+    """
+    Создает orders заказов с товарами и passwords записей паролей. При одинаковом seed данные
+    совпадают (кроме id и момента отсчета дат). Итоги заказов пересчитываются UPDATE-ами по batch_size заказов,
+    созданные объекты записываются в журнал изменений (ChangeLog), чтобы попасть в дельта-синхронизацию.
+    Возвращает словарь с количеством созданных объектов и именами сохраненных файлов фото и их копий (photos).
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+
+    order_objects = []
+    for _ in range(orders):
+        confirmed = rng.random() < 0.5
+        rejected = not confirmed and rng.random() < 0.3
+        order_objects.append(Order(
+            client=f'{rng.choice(CLIENT_PREFIXES)} {rng.choice(CLIENT_NAMES)} {rng.randint(1, 999)}',
+            vat=rng.choice([None, Decimal('12.00'), Decimal('15.00')]),
+            additional_expenses=rng.choice([None, Decimal('0.00'), Decimal('5.00'), Decimal('10.00')]),
+            advance=rng.choice([None, None, Decimal(rng.randint(1, 50) * 1000)]),
+            is_confirmed=confirmed,
+            is_rejected=rejected,
+        ))
+    Order.objects.bulk_create(order_objects, batch_size=batch_size)
+
+    # auto_now_add перезаписывает created_at при вставке, поэтому даты распределяются отдельным UPDATE
+    for order in order_objects:
+        order.created_at = now - timedelta(minutes=rng.randint(0, days * 24 * 60))
+        order.confirmed_at = order.created_at + timedelta(days=1) if order.is_confirmed else None
+        order.rejected_at = order.created_at + timedelta(days=1) if order.is_rejected else None
+        order.warranty_ends_at = order.calculate_warranty_ends_at()
+    Order.objects.bulk_update(order_objects, ['created_at', 'confirmed_at', 'rejected_at', 'warranty_ends_at'],
+                              batch_size=batch_size)
+
+    product_objects = []
+    product_ids = []
+    products = 0
+    photos = []
+    for order in order_objects:
+        for _ in range(products_count(rng, distribution, min_products, max_products)):
+            product = OrderProduct(
+                order=order,
+                name=rng.choice(PRODUCT_NAMES),
+                quantity=rng.randint(1, 20),
+                price=Decimal(rng.randint(500, 500000)) / 100,
+            )
+            if rng.random() < photo_ratio:
+                image_format = rng.choice(['JPEG', 'WEBP'])
+                extension = 'jpg' if image_format == 'JPEG' else 'webp'
+                product.photo = default_storage.save(f'order_product_photos/seed_{order.pk}.{extension}',
+                                                     ContentFile(make_photo(rng, image_format)))
+                photos.append(product.photo.name)
+                photos += generate_renditions(product.photo.name)
+            product_objects.append(product)
+            products += 1
+        if len(product_objects) >= batch_size:
+            OrderProduct.objects.bulk_create(product_objects, batch_size=batch_size)
+            product_ids += [product.pk for product in product_objects]
+            product_objects = []
+    OrderProduct.objects.bulk_create(product_objects, batch_size=batch_size)
+    product_ids += [product.pk for product in product_objects]
+
+    order_ids = [order.pk for order in order_objects]
+    for start in range(0, len(order_ids), batch_size):
+        Order.objects.filter(pk__in=order_ids[start:start + batch_size]).refresh_totals()
+
+    password_objects = Password.objects.bulk_create([
+        Password(
+            organization_name=f'{rng.choice(CLIENT_PREFIXES)} {rng.choice(CLIENT_NAMES)} {rng.randint(1, 999)}',
+            nvr_password=f'nvr{rng.randint(100000, 999999)}',
+            camera_password=f'cam{rng.randint(100000, 999999)}',
+        )
+        for _ in range(passwords)
+    ], batch_size=batch_size)
+
+    # bulk_create не отправляет сигналы: записи журнала для дельта-синхронизации (/sync/) пишутся здесь
+    for entity, object_ids in ((ChangeLog.ORDER, order_ids), (ChangeLog.PRODUCT, product_ids),
+                               (ChangeLog.PASSWORD, [password.pk for password in password_objects])):
+        for start in range(0, len(object_ids), batch_size):
+            ChangeLog.objects.record(entity, object_ids[start:start + batch_size])
+
+    return {
+        'orders': orders,
+        'products': products,
+        'photos': photos,
+        'passwords': passwords,
+    }
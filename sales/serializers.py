@@ -1,8 +1,7 @@
 from rest_framework import serializers
-from .models import Order, OrderProduct, Password
-from datetime import timedelta
+from .models import ExportJob, Order, OrderProduct, Password
+from .renditions import rendition_urls
 from django.utils import timezone
-from decimal import Decimal
 
 
 class OrderSerializer(serializers.ModelSerializer):
@@ -16,43 +15,31 @@ class OrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
         fields = ['id', 'client', 'vat', 'additional_expenses', 'advance', 'created_at', 'is_confirmed', 'is_rejected',
-                  'confirmed_at', 'warranty_days_left', 'total_price_without_vat', 'total_price_with_vat', 'vat_amount',
-                  'additional_expenses_amount']
+                  'confirmed_at', 'warranty_ends_at', 'warranty_days_left', 'total_price_without_vat',
+                  'total_price_with_vat', 'vat_amount', 'additional_expenses_amount']
 
-    # Метод для расчета оставшихся дней гарантии
+    # Метод для расчета оставшихся дней гарантии (по сохраненной дате окончания)
     def get_warranty_days_left(self, obj):
-        if obj.is_confirmed and obj.confirmed_at:
-            warranty_end_date = obj.confirmed_at + timedelta(days=365)
-            remaining_days = (warranty_end_date - timezone.now()).days
+        if obj.warranty_ends_at:
+            remaining_days = (obj.warranty_ends_at - timezone.now()).days
             return max(remaining_days, 0)
         return None
 
     # Метод для расчета общей суммы без НДС
     def get_total_price_without_vat(self, obj):
-        total_price = sum([product.quantity * product.price for product in obj.products.all()])
-        return total_price
+        return obj.get_totals()['subtotal']
 
     # Метод для расчета суммы НДС
     def get_vat_amount(self, obj):
-        total_price_without_vat = self.get_total_price_without_vat(obj)
-        vat = obj.vat or Decimal(0)
-        vat_amount = total_price_without_vat * (vat / Decimal(100))
-        return vat_amount
+        return obj.get_totals()['vat_amount']
 
     # Метод для расчета суммы прочих расходов
     def get_additional_expenses_amount(self, obj):
-        total_price_without_vat = self.get_total_price_without_vat(obj)
-        additional_expenses = obj.additional_expenses or Decimal(0)
-        additional_expenses_amount = total_price_without_vat * (additional_expenses / Decimal(100))
-        return additional_expenses_amount
+        return obj.get_totals()['expenses_amount']
 
     # Метод для расчета общей суммы с НДС и прочими расходами
     def get_total_price_with_vat(self, obj):
-        total_price_without_vat = self.get_total_price_without_vat(obj)
-        vat_amount = self.get_vat_amount(obj)
-        additional_expenses_amount = self.get_additional_expenses_amount(obj)
-        total_price_with_vat = total_price_without_vat + vat_amount + additional_expenses_amount
-        return total_price_with_vat
+        return obj.get_totals()['grand_total']
 
     # Валидация
     def validate(self, data):
@@ -63,14 +50,49 @@ class OrderSerializer(serializers.ModelSerializer):
 
 class OrderProductSerializer(serializers.ModelSerializer):
     total_price = serializers.SerializerMethodField()
+    photo_renditions = serializers.SerializerMethodField()
 
     class Meta:
         model = OrderProduct
-        fields = ['id', 'name', 'quantity', 'price', 'total_price', 'order', 'photo']
+        fields = ['id', 'name', 'quantity', 'price', 'total_price', 'order', 'photo', 'photo_renditions']
 
     def get_total_price(self, obj):
         return obj.quantity * obj.price
 
+    def get_photo_renditions(self, obj):
+        """
+        URL уменьшенных копий фото по размеру: {"64": ..., "300": ..., "800": ...}.
+        Клиент выбирает наименьшую копию, которой хватает для отображения.
+        """
+        if not obj.photo:
+            return {}
+        request = self.context.get('request')
+        return {
+            str(size): request.build_absolute_uri(url) if request else url
+            for size, url in rendition_urls(obj.photo).items()
+        }
+
+
+class OrderProductBulkItemSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(required=False)
+
+    class Meta:
+        model = OrderProduct
+        fields = ['id', 'name', 'quantity', 'price']
+
+
+class OrderProductBulkSerializer(serializers.Serializer):
+    upsert = OrderProductBulkItemSerializer(many=True, required=False, default=list)
+    delete = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+
+    def validate(self, data):
+        update_ids = [item['id'] for item in data['upsert'] if 'id' in item]
+        if len(update_ids) != len(set(update_ids)):
+            raise serializers.ValidationError("Один и тот же продукт указан несколько раз.")
+        if set(update_ids) & set(data['delete']):
+            raise serializers.ValidationError("Продукт не может быть одновременно изменен и удален.")
+        return data
+
 
 class OrderDetailSerializer(serializers.ModelSerializer):
     products = OrderProductSerializer(many=True, read_only=True)
@@ -86,29 +108,30 @@ class OrderDetailSerializer(serializers.ModelSerializer):
 
     # Метод для расчета общей суммы без НДС
     def get_total_price_without_vat(self, obj):
-        return sum(product.quantity * product.price for product in obj.products.all())
+        return obj.get_totals()['subtotal']
 
     # Метод для расчета суммы дополнительных расходов
     def get_additional_expenses_amount(self, obj):
-        total_price_without_vat = self.get_total_price_without_vat(obj)
-        additional_expenses = obj.additional_expenses or Decimal(0)
-        return total_price_without_vat * (additional_expenses / Decimal(100))
+        return obj.get_totals()['expenses_amount']
 
     # Метод для расчета общей суммы с НДС
     def get_total_price_with_vat(self, obj):
-        total_price_without_vat = self.get_total_price_without_vat(obj)
-        vat = obj.vat or Decimal(0)
-        return total_price_without_vat + (total_price_without_vat * (vat / Decimal(100)))
+        return obj.get_totals()['total_with_vat']
 
     # Метод для расчета общей итоговой суммы
     def get_total_general_amount(self, obj):
-        total_price_without_vat = self.get_total_price_without_vat(obj)
-        additional_expenses_amount = self.get_additional_expenses_amount(obj)
-        total_price_with_vat = self.get_total_price_with_vat(obj)
-        return total_price_with_vat + additional_expenses_amount
+        return obj.get_totals()['grand_total']
 
 
 class PasswordSerializer(serializers.ModelSerializer):
     class Meta:
         model = Password
         fields = '__all__'
+
+
+class ExportJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ExportJob
+        fields = ['id', 'kind', 'order', 'params', 'file_type', 'status', 'attempts', 'max_attempts', 'last_error',
+                  'progress_done', 'progress_total', 'result', 'run_after', 'started_at', 'finished_at', 'created_at',
+                  'updated_at']
@@ -0,0 +1,106 @@
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import search
+from .cache import order_detail_cache
+from .models import ChangeLog, Order, OrderProduct, Password
+from .renditions import delete_renditions
+
+_deferred = threading.local()
+
+
+def orders_changed(*order_ids):
+    """
+    Общая точка для путей записи, которые меняют заказ в обход Order.save()
+    (пересчет итогов, queryset.update): сбрасывает кэш деталей и пишет журнал изменений.
+    """
+    order_detail_cache.invalidate(*order_ids)
+    ChangeLog.objects.record(ChangeLog.ORDER, order_ids)
+
+
+@contextmanager
+def deferred_totals_refresh():
+    """
+    Внутри блока итоги заказов не пересчитываются на каждый товар: id заказов копятся
+    и пересчитываются одним UPDATE при выходе. Для массовых операций с товарами.
+    """
+    if getattr(_deferred, 'order_ids', None) is not None:
+        yield _deferred.order_ids
+        return
+
+    _deferred.order_ids = set()
+    try:
+        yield _deferred.order_ids
+        order_ids = _deferred.order_ids
+    finally:
+        _deferred.order_ids = None
+    if order_ids:
+        Order.objects.filter(pk__in=order_ids).refresh_totals()
+        orders_changed(*order_ids)
+
+
+def is_order_cascade(origin):
+    """
+    Удаление товара вызвано удалением самого заказа (или выборки заказов).
+    """
+    return isinstance(origin, Order) or getattr(origin, 'model', None) is Order
+
+
+@receiver(post_save, sender=OrderProduct)
+@receiver(post_delete, sender=OrderProduct)
+def refresh_order_totals(sender, instance, **kwargs):
+    """
+    Пересчитывает сохраненные итоги заказа после создания, изменения или удаления товара.
+    """
+    action = ChangeLog.DELETE if kwargs['signal'] is post_delete else ChangeLog.UPSERT
+    ChangeLog.objects.record(ChangeLog.PRODUCT, [instance.pk], action)
+    if action == ChangeLog.DELETE:
+        search.remove_object('product', instance.pk)
+    else:
+        search.index_product(instance)
+
+    if is_order_cascade(kwargs.get('origin')):
+        return
+    order_ids = getattr(_deferred, 'order_ids', None)
+    if order_ids is not None:
+        order_ids.add(instance.order_id)
+        return
+    Order.objects.filter(pk=instance.order_id).refresh_totals()
+    orders_changed(instance.order_id)
+
+
+@receiver(post_delete, sender=OrderProduct)
+def remove_photo_renditions(sender, instance, **kwargs):
+    """
+    Копии фото удаляются после фиксации транзакции: при откате товар и его фото остаются.
+    """
+    if instance.photo:
+        name = instance.photo.name
+        transaction.on_commit(lambda: delete_renditions(name))
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def order_changed(sender, instance, **kwargs):
+    order_detail_cache.invalidate(instance.pk)
+    action = ChangeLog.DELETE if kwargs['signal'] is post_delete else ChangeLog.UPSERT
+    ChangeLog.objects.record(ChangeLog.ORDER, [instance.pk], action)
+    if action == ChangeLog.DELETE:
+        search.remove_object('order', instance.pk)
+    else:
+        search.index_order(instance)
+
+
+@receiver(post_save, sender=Password)
+@receiver(post_delete, sender=Password)
+def password_changed(sender, instance, **kwargs):
+    action = ChangeLog.DELETE if kwargs['signal'] is post_delete else ChangeLog.UPSERT
+    ChangeLog.objects.record(ChangeLog.PASSWORD, [instance.pk], action)
+    if action == ChangeLog.DELETE:
+        search.remove_object('password', instance.pk)
+    else:
+        search.index_password(instance)
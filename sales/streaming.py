@@ -0,0 +1,77 @@
+import csv
+from datetime import datetime
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+ORDER_FIELDS = ['id', 'client', 'vat', 'additional_expenses', 'advance', 'created_at', 'is_confirmed', 'is_rejected',
+                'confirmed_at', 'rejected_at', 'subtotal', 'products_count', 'grand_total']
+PRODUCT_FIELDS = ['id', 'name', 'quantity', 'price', 'photo']
+EXPORT_FILE_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def iter_order_rows(queryset, chunk_size=2000):
+    """
+    Плоские строки «заказ + товар» одним запросом с LEFT JOIN; заказ без товаров дает одну строку
+    с пустыми полями товара. Строки читаются порциями через iterator(), память не растет.
+    """
+    fields = ORDER_FIELDS + [f'products__{field}' for field in PRODUCT_FIELDS]
+    return (queryset
+            .order_by('created_at', 'id', 'products__id')
+            .values_list(*fields)
+            .iterator(chunk_size=chunk_size))
+
+
+def iter_ndjson(queryset, chunk_size=2000):
+    """
+    NDJSON: по строке на заказ, товары вложены списком.
+    """
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    order_size = len(ORDER_FIELDS)
+    current = None
+    for row in iter_order_rows(queryset, chunk_size):
+        if current is None or current['id'] != row[0]:
+            if current is not None:
+                yield encoder.encode(current) + '\n'
+            current = dict(zip(ORDER_FIELDS, row[:order_size]))
+            current['products'] = []
+        if row[order_size] is not None:
+            current['products'].append(dict(zip(PRODUCT_FIELDS, row[order_size:])))
+    if current is not None:
+        yield encoder.encode(current) + '\n'
+
+
+class EchoBuffer:
+    """
+    «Файл» для csv.writer, который просто возвращает записанную строку.
+    """
+
+    def write(self, value):
+        return value
+
+
+def csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return timezone.localtime(value).isoformat()
+    return value
+
+
+def iter_csv(queryset, chunk_size=2000):
+    """
+    CSV: по строке на товар, поля заказа повторяются в каждой строке.
+    """
+    writer = csv.writer(EchoBuffer())
+    yield writer.writerow([f'order_{field}' for field in ORDER_FIELDS] + [f'product_{field}' for field in PRODUCT_FIELDS])
+    for row in iter_order_rows(queryset, chunk_size):
+        yield writer.writerow([csv_value(value) for value in row])
+
+
+def iter_export(queryset, file_type, chunk_size=2000):
+    if file_type == 'csv':
+        return iter_csv(queryset, chunk_size)
+    return iter_ndjson(queryset, chunk_size)
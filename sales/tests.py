@@ -1,3 +1,1101 @@
-from django.test import TestCase
+import base64
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, transaction
+from django.db.models import F, Prefetch
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.client import MULTIPART_CONTENT, encode_multipart, BOUNDARY
+from django.utils import timezone
+from openpyxl import load_workbook
+from PIL import Image
+from rest_framework_simplejwt.tokens import AccessToken
+
+from RHick.db import retry_on_lock
+from RHick.metrics import registry
+
+from .batch_export import ERRORS_NAME, SUMMARY_NAME, render_document
+from .cache import ConvertedImageCache, OrderDetailCache, order_detail_cache
+from .documents import document_key
+from .excel import order_totals, write_order_workbook, write_orders_workbook
+from .management.commands.run_export_workers import Command as ExportWorkersCommand
+from .models import ExportJob, Order, OrderProduct, Password
+from .render_pool import PDFRenderPool, RenderTimeout
+from .rendering import CompiledTemplate, FileAsset, PDFRenderer
+from .renditions import rendition_name
+from . import search
+from .seeding import seed_sales_data
+from .streaming import iter_ndjson
+from .utils import export_file_name, generate_order_excel, generate_order_pdf
+
+
+def png_file(name='photo.png'):
+    buffer = io.BytesIO()
+    Image.new('RGB', (10, 10), 'red').save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+class APITestCase(TestCase):
+    """
+    Пользователь с JWT-токеном и временный MEDIA_ROOT для фото и кэшей.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_override = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.media_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('tester', password='secret')
+        cls.auth = {'headers': {'Authorization': f'Bearer {AccessToken.for_user(cls.user)}'}}
+
+    def create_order(self, **fields):
+        return Order.objects.create(**{'client': 'ООО Тест', 'vat': 12, 'additional_expenses': 0, **fields})
+
+
+class AsyncRequestBodyTests(APITestCase):
+    def setUp(self):
+        self.order = self.create_order()
+        self.product = OrderProduct.objects.create(order=self.order, name='Камера', quantity=2, price=10)
+
+    async def test_multipart_put_matches_sync_view(self):
+        body = encode_multipart(BOUNDARY, {'name': 'Камера 2', 'quantity': 3, 'price': '15.00', 'photo': png_file()})
+        for prefix in ('/sales/api/orders', '/sales/api/async/orders'):
+            response = await self.async_client.put(f'{prefix}/{self.order.pk}/products/{self.product.pk}/', body,
+                                                   content_type=MULTIPART_CONTENT, **self.auth)
+            self.assertEqual(response.status_code, 200, (prefix, response.content))
+            self.assertEqual(response.json()['quantity'], 3)
+            self.assertTrue(response.json()['photo'])
+
+    async def test_malformed_json_returns_400(self):
+        response = await self.async_client.post(f'/sales/api/async/orders/{self.order.pk}/products/', '{"name": ',
+                                                content_type='application/json', **self.auth)
+        self.assertEqual(response.status_code, 400)
+
+
+
+class AsyncLockRetryTests(TransactionTestCase):
+    """
+    Повтор при блокировке работает только вне транзакции, поэтому без обертки TestCase.
+    """
+
+    def setUp(self):
+        user = User.objects.create_user('tester', password='secret')
+        self.auth = {'headers': {'Authorization': f'Bearer {AccessToken.for_user(user)}'}}
+        self.order = Order.objects.create(client='ООО Тест', vat=12)
+
+    async def patch_with_locked_database(self, action):
+        save = Order.save
+        calls = []
+
+        def locked_once(order, *args, **kwargs):
+            calls.append(order.pk)
+            if len(calls) == 1:
+                raise OperationalError('database is locked')
+            return save(order, *args, **kwargs)
+
+        with mock.patch.object(Order, 'save', locked_once), \
+                override_settings(SQLITE_LOCK_RETRY_DELAY=0.001):
+            response = await self.async_client.patch(f'/sales/api/async/orders/{self.order.pk}/{action}/',
+                                                     **self.auth)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(len(calls), 2)
+
+    async def test_confirm_retries_locked_database(self):
+        await self.patch_with_locked_database('confirm')
+        self.assertTrue((await Order.objects.aget(pk=self.order.pk)).is_confirmed)
+
+    async def test_reject_retries_locked_database(self):
+        await self.patch_with_locked_database('reject')
+        self.assertTrue((await Order.objects.aget(pk=self.order.pk)).is_rejected)
+
+
+@override_settings(SQLITE_LOCK_RETRIES=3, SQLITE_LOCK_RETRY_DELAY=0.1)
+@mock.patch('RHick.db.random.uniform', return_value=1)
+@mock.patch('RHick.db.time.sleep')
+class RetryOnLockTests(TransactionTestCase):
+    def failing(self, *errors, result='ok'):
+        return mock.Mock(side_effect=[*errors, result], __qualname__='write')
+
+    def test_lock_error_is_retried_with_growing_pause(self, sleep, uniform):
+        write = self.failing(OperationalError('database is locked'), OperationalError('database is busy'))
+        self.assertEqual(retry_on_lock(write)(1, key='value'), 'ok')
+        self.assertEqual(write.call_count, 3)
+        write.assert_called_with(1, key='value')
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [0.1, 0.2])
+
+    def test_error_after_last_attempt(self, sleep, uniform):
+        write = self.failing(*[OperationalError('database is locked')] * 3)
+        with self.assertRaisesMessage(OperationalError, 'database is locked'):
+            retry_on_lock(write)()
+        self.assertEqual(write.call_count, 3)
+
+    def test_explicit_attempts_and_delay(self, sleep, uniform):
+        write = self.failing(OperationalError('database is locked'))
+        self.assertEqual(retry_on_lock(attempts=2, delay=0.5)(write)(), 'ok')
+        sleep.assert_called_once_with(0.5)
+
+    def test_other_errors_are_not_retried(self, sleep, uniform):
+        write = self.failing(OperationalError('no such table: sales_order'))
+        with self.assertRaises(OperationalError):
+            retry_on_lock(write)()
+        self.assertEqual(write.call_count, 1)
+
+    def test_no_retry_inside_outer_transaction(self, sleep, uniform):
+        write = self.failing(OperationalError('database is locked'))
+        with self.assertRaises(OperationalError), transaction.atomic():
+            retry_on_lock(write)()
+        self.assertEqual(write.call_count, 1)
+        sleep.assert_not_called()
+
+    def test_connection_pragmas(self, sleep, uniform):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute('PRAGMA temp_store')
+            self.assertEqual(cursor.fetchone()[0], 2)
+
+
+class OrderTotalsTests(APITestCase):
+    def setUp(self):
+        # 35.30 × 12 % = 4.236 и 35.30 × 3.5 % = 1.2355: без округления каждой суммы итоги расходятся на копейку
+        self.order = self.create_order(additional_expenses=Decimal('3.5'), advance=10)
+        OrderProduct.objects.create(order=self.order, name='Камера', quantity=1, price=Decimal('35.30'))
+        self.order.refresh_from_db()
+
+    def test_totals_are_rounded_to_cents(self):
+        self.assertEqual(self.order.get_totals(), {
+            'subtotal': Decimal('35.30'), 'vat_amount': Decimal('4.24'), 'expenses_amount': Decimal('1.24'),
+            'total_with_vat': Decimal('39.54'), 'grand_total': Decimal('40.78'), 'advance': Decimal('10.00'),
+            'amount_due': Decimal('30.78'),
+        })
+        self.assertEqual(self.order.grand_total, Decimal('40.78'))
+
+    def test_api_and_excel_use_the_same_totals(self):
+        listed = self.client.get('/sales/api/orders/', **self.auth).json()['results'][0]
+        detail = self.client.get(f'/sales/api/orders/{self.order.pk}/', **self.auth).json()
+        self.assertEqual([Decimal(str(listed[name])) for name in ('vat_amount', 'additional_expenses_amount',
+                                                                  'total_price_with_vat')],
+                         [Decimal('4.24'), Decimal('1.24'), Decimal('40.78')])
+        self.assertEqual([Decimal(str(detail[name])) for name in ('total_price_with_vat', 'total_general_amount')],
+                         [Decimal('39.54'), Decimal('40.78')])
+        self.assertEqual(order_totals(self.order), (Decimal('35.30'), Decimal('39.54'), Decimal('1.24'),
+                                                    Decimal('40.78')))
+
+    def test_update_fields_refreshes_totals_and_revision(self):
+        revision, updated_at = self.order.revision, self.order.updated_at
+        self.order.vat = 20
+        self.order.save(update_fields=['vat'])
+        self.assertEqual(self.order.revision, revision + 1)
+        self.assertGreater(self.order.updated_at, updated_at)
+        self.assertEqual(Order.objects.get(pk=self.order.pk).grand_total, Decimal('43.60'))
+
+        self.order.advance = 20
+        self.order.save(update_fields=['advance'])
+        self.assertEqual(Order.objects.get(pk=self.order.pk).revision, revision + 2)
+
+
+class ProductSignalTotalsTests(APITestCase):
+    def setUp(self):
+        self.order = self.create_order()
+
+    def assertTotals(self, subtotal, products_count, grand_total):
+        order = Order.objects.get(pk=self.order.pk)
+        self.assertEqual((order.subtotal, order.products_count, order.grand_total),
+                         (Decimal(subtotal), products_count, Decimal(grand_total)))
+        return order
+
+    def test_totals_follow_product_create_update_delete(self):
+        camera = OrderProduct.objects.create(order=self.order, name='Камера', quantity=2, price=10)
+        OrderProduct.objects.create(order=self.order, name='Кабель', quantity=1, price=Decimal('5.55'))
+        revision = self.assertTotals('25.55', 2, '28.62').revision
+
+        camera.quantity = 3
+        camera.save()
+        self.assertEqual(self.assertTotals('35.55', 2, '39.82').revision, revision + 1)
+
+        camera.delete()
+        self.assertTotals('5.55', 1, '6.22')
+
+
+class OrderKeysetPaginationTests(APITestCase):
+    def test_cursor_is_stable_for_equal_created_at(self):
+        orders = [self.create_order(client=f'Клиент {i}') for i in range(5)]
+        Order.objects.update(created_at=orders[0].created_at)
+
+        seen, url = [], '/sales/api/orders/?page_size=2'
+        while url:
+            page = self.client.get(url, **self.auth).json()
+            seen += [order['id'] for order in page['results']]
+            url = page['next']
+        self.assertEqual(seen, sorted((order.pk for order in orders), reverse=True))
+
+    def test_invalid_cursor_returns_404(self):
+        response = self.client.get('/sales/api/orders/?cursor=bm90LWpzb24=', **self.auth)
+        self.assertEqual(response.status_code, 404)
+
+
+class ConfirmedOrdersTests(APITestCase):
+    def setUp(self):
+        for created, price, confirmed in [((2026, 1, 10), 100, True), ((2026, 1, 20), 50, True),
+                                          ((2026, 2, 5), 10, True), ((2026, 1, 15), 1000, False)]:
+            order = self.create_order(is_confirmed=confirmed)
+            OrderProduct.objects.create(order=order, name='Камера', quantity=1, price=price)
+            Order.objects.filter(pk=order.pk).update(created_at=timezone.make_aware(datetime(*created, 12)))
+
+    def test_totals_and_periods_are_aggregated_in_sql(self):
+        response = self.client.get('/sales/api/confirmed-orders/?start_date=2026-01-01&end_date=2026-02-28'
+                                   '&page_size=2', **self.auth)
+        self.assertEqual(response.status_code, 200)
+        report = response.json()
+
+        self.assertEqual((report['orders_count'], report['total_without_vat'], report['total_sum']),
+                         (3, 160, 179.2))
+        self.assertEqual([(row['period'], row['orders_count'], row['total_sum']) for row in report['periods']],
+                         [('2026-01-01', 2, 168), ('2026-02-01', 1, 11.2)])
+        # Итоги считаются по всему периоду, а заказы отдаются постранично
+        self.assertEqual(len(report['orders']), 2)
+        self.assertIsNotNone(report['next'])
+
+    def test_end_date_is_inclusive(self):
+        report = self.client.get('/sales/api/confirmed-orders/?end_date=2026-01-20&period=day', **self.auth).json()
+        self.assertEqual([(row['period'], row['orders_count']) for row in report['periods']],
+                         [('2026-01-10', 1), ('2026-01-20', 1)])
+
+    def test_invalid_parameters(self):
+        for query in ('period=year', 'start_date=01.01.2026'):
+            response = self.client.get(f'/sales/api/confirmed-orders/?{query}', **self.auth)
+            self.assertEqual(response.status_code, 400)
+
+
+class OrderProductsBulkTests(APITestCase):
+    def setUp(self):
+        self.order = self.create_order()
+        self.camera = OrderProduct.objects.create(order=self.order, name='Камера', quantity=2, price=10)
+        self.cable = OrderProduct.objects.create(order=self.order, name='Кабель', quantity=1, price=5)
+        self.url = f'/sales/api/orders/{self.order.pk}/products/bulk/'
+
+    def post(self, payload):
+        return self.client.post(self.url, payload, content_type='application/json', **self.auth)
+
+    def assertUnchanged(self):
+        self.assertEqual(sorted(OrderProduct.objects.values_list('name', 'quantity')), [('Кабель', 1), ('Камера', 2)])
+        self.assertEqual(Order.objects.get(pk=self.order.pk).subtotal, Decimal('25.00'))
+
+    def test_upsert_and_delete(self):
+        response = self.post({'upsert': [{'id': self.camera.pk, 'name': 'Камера', 'quantity': 3, 'price': '10.00'},
+                                         {'name': 'Диск', 'quantity': 1, 'price': '7.50'}],
+                              'delete': [self.cable.pk]})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(sorted(OrderProduct.objects.values_list('name', 'quantity')), [('Диск', 1), ('Камера', 3)])
+        self.assertEqual(Decimal(str(response.json()['total_order_price'])), Decimal('37.50'))
+        self.assertEqual(response.json()['products_count'], 2)
+
+    def test_duplicate_ids_are_rejected(self):
+        item = {'id': self.camera.pk, 'name': 'Камера', 'quantity': 5, 'price': '10.00'}
+        self.assertEqual(self.post({'upsert': [item, {**item, 'quantity': 6}]}).status_code, 400)
+        self.assertUnchanged()
+
+    def test_update_and_delete_of_same_id_are_rejected(self):
+        response = self.post({'upsert': [{'id': self.camera.pk, 'name': 'Камера', 'quantity': 5, 'price': '10.00'}],
+                              'delete': [self.camera.pk]})
+        self.assertEqual(response.status_code, 400)
+        self.assertUnchanged()
+
+    def test_product_of_another_order_is_rejected(self):
+        other = OrderProduct.objects.create(order=self.create_order(), name='Чужой', quantity=1, price=1)
+        response = self.post({'upsert': [{'name': 'Диск', 'quantity': 1, 'price': '7.50'}], 'delete': [other.pk]})
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(OrderProduct.objects.filter(pk=other.pk).exists())
+        self.assertFalse(OrderProduct.objects.filter(name='Диск').exists())
+
+
+class ConditionalRequestTests(APITestCase):
+    def setUp(self):
+        self.order = self.create_order()
+        OrderProduct.objects.create(order=self.order, name='Камера', quantity=2, price=10)
+        self.url = f'/sales/api/orders/{self.order.pk}/'
+
+    def test_if_none_match_returns_304(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_etag_changes_with_products(self):
+        etag = self.client.get(self.url)['ETag']
+        OrderProduct.objects.create(order=self.order, name='Кабель', quantity=1, price=5)
+        response = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['products']), 2)
+
+    def test_stale_if_match_returns_412(self):
+        etag = self.client.get(self.url)['ETag']
+        self.order.advance = 5
+        self.order.save(update_fields=['advance'])
+
+        payload = {'client': 'ООО Другой', 'vat': '12.00', 'additional_expenses': '0.00'}
+        response = self.client.put(self.url, payload, content_type='application/json',
+                                   headers={**self.auth['headers'], 'If-Match': etag})
+        self.assertEqual(response.status_code, 412)
+        self.assertEqual(Order.objects.get(pk=self.order.pk).client, 'ООО Тест')
+
+        response = self.client.put(self.url, payload, content_type='application/json',
+                                   headers={**self.auth['headers'], 'If-Match': self.client.get(self.url)['ETag']})
+        self.assertEqual(response.status_code, 200, response.content)
+
+
+    def test_stale_if_match_blocks_delete(self):
+        etag = self.client.get(self.url)['ETag']
+        OrderProduct.objects.create(order=self.order, name='Кабель', quantity=1, price=5)
+
+        for url in (self.url, f'/sales/api/async/orders/{self.order.pk}/'):
+            response = self.client.delete(url, headers={**self.auth['headers'], 'If-Match': etag})
+            self.assertEqual(response.status_code, 412, url)
+        self.assertTrue(Order.objects.filter(pk=self.order.pk).exists())
+
+        response = self.client.delete(self.url, headers={**self.auth['headers'],
+                                                         'If-Match': self.client.get(self.url)['ETag']})
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Order.objects.filter(pk=self.order.pk).exists())
+
+class OrderDetailCacheTests(APITestCase):
+    def setUp(self):
+        order_detail_cache.clear()
+        self.order = self.create_order()
+        self.product = OrderProduct.objects.create(order=self.order, name='Камера', quantity=1, price=10)
+        self.url = f'/sales/api/orders/{self.order.pk}/'
+
+    def get_products(self):
+        return [product['name'] for product in self.client.get(self.url).json()['products']]
+
+    def test_repeated_get_is_served_from_cache(self):
+        self.get_products()
+        hits = order_detail_cache.hits
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get_products(), ['Камера'])
+        self.assertEqual(order_detail_cache.hits, hits + 1)
+
+    def test_product_change_invalidates_entry(self):
+        self.get_products()
+        self.product.name = 'Кабель'
+        self.product.save()
+        self.assertEqual(self.get_products(), ['Кабель'])
+
+    def test_entry_of_older_revision_is_not_served(self):
+        # Запись другого процесса: без явной инвалидации, но с увеличенной revision
+        self.get_products()
+        OrderProduct.objects.filter(pk=self.product.pk).update(name='Кабель')
+        Order.objects.filter(pk=self.order.pk).update(revision=F('revision') + 1)
+        self.assertEqual(self.get_products(), ['Кабель'])
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = OrderDetailCache(max_entries=2)
+        cache.set(1, 1, 'first')
+        cache.set(2, 1, 'second')
+        cache.get(1, 1)
+        cache.set(3, 1, 'third')
+        self.assertEqual([cache.get(order_id, 1) for order_id in (1, 2, 3)], ['first', None, 'third'])
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_stats_are_for_admins_only(self):
+        self.assertEqual(self.client.get('/sales/api/cache-stats/', **self.auth).status_code, 403)
+        admin = User.objects.create_user('admin', is_staff=True)
+        response = self.client.get('/sales/api/cache-stats/',
+                                   headers={'Authorization': f'Bearer {AccessToken.for_user(admin)}'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('hit_ratio', response.json()['order_detail'])
+
+
+class OrderExportStreamingTests(APITestCase):
+    def setUp(self):
+        self.first = self.create_order(is_confirmed=True)
+        OrderProduct.objects.create(order=self.first, name='Камера', quantity=2, price=10)
+        OrderProduct.objects.create(order=self.first, name='Кабель', quantity=1, price=5)
+        self.second = self.create_order(client='ООО Другой')
+
+    def export(self, query):
+        response = self.client.get(f'/sales/api/orders/export/?{query}', **self.auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_ndjson_has_order_per_line_with_nested_products(self):
+        orders = [json.loads(line) for line in self.export('file_type=ndjson').splitlines()]
+        self.assertEqual([(order['id'], order['client']) for order in orders],
+                         [(self.first.pk, 'ООО Тест'), (self.second.pk, 'ООО Другой')])
+        self.assertEqual([product['name'] for product in orders[0]['products']], ['Камера', 'Кабель'])
+        self.assertEqual(orders[0]['grand_total'], '28.00')
+        self.assertEqual(orders[1]['products'], [])
+
+    def test_csv_has_row_per_product(self):
+        rows = list(csv.DictReader(io.StringIO(self.export('file_type=csv'))))
+        self.assertEqual([(row['order_id'], row['product_name']) for row in rows],
+                         [(str(self.first.pk), 'Камера'), (str(self.first.pk), 'Кабель'), (str(self.second.pk), '')])
+        self.assertEqual(rows[2]['order_confirmed_at'], '')
+
+    def test_filters_apply(self):
+        lines = self.export('file_type=ndjson&status=pending').splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines], [self.second.pk])
+
+    def test_orders_are_not_split_across_chunks(self):
+        lines = list(iter_ndjson(Order.objects.all(), chunk_size=1))
+        self.assertEqual([len(json.loads(line)['products']) for line in lines], [2, 0])
+
+    def test_unknown_file_type(self):
+        response = self.client.get('/sales/api/orders/export/?file_type=xml', **self.auth)
+        self.assertEqual(response.status_code, 400)
+
+
+class MetricsTests(APITestCase):
+    def setUp(self):
+        registry.clear()
+        self.staff = User.objects.create_user('staff', is_staff=True)
+        self.order = self.create_order()
+        OrderProduct.objects.create(order=self.order, name='Камера', quantity=1, price=10)
+
+    def metrics(self):
+        self.client.force_login(self.staff)
+        response = self.client.get('/metrics/')
+        self.client.logout()
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode().splitlines()
+
+    def test_requests_are_recorded_by_route_template(self):
+        self.client.get(f'/sales/api/orders/{self.order.pk}/')
+        self.client.get('/sales/api/orders/0/')
+        lines = self.metrics()
+
+        route = 'route="sales/api/orders/<int:pk>/",method="GET"'
+        self.assertIn(f'rhick_http_requests_total{{{route},status="200"}} 1', lines)
+        self.assertIn(f'rhick_http_requests_total{{{route},status="404"}} 1', lines)
+        self.assertIn(f'rhick_http_request_duration_seconds_count{{{route}}} 2', lines)
+        self.assertIn(f'rhick_db_queries_per_request_count{{{route}}} 2', lines)
+        self.assertFalse(any('route="metrics/"' in line for line in lines))
+
+    def test_streamed_response_size_is_counted_after_transfer(self):
+        response = self.client.get('/sales/api/orders/export/?file_type=ndjson', **self.auth)
+        route = 'route="sales/api/orders/export/",method="GET"'
+        self.assertIn(f'rhick_http_response_size_bytes_count{{{route}}} 0', self.metrics())
+        size = len(b''.join(response.streaming_content))
+        lines = self.metrics()
+        self.assertIn(f'rhick_http_response_size_bytes_sum{{{route}}} {size}', lines)
+        self.assertIn(f'rhick_http_response_size_bytes_count{{{route}}} 1', lines)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_access_requires_token_or_staff(self):
+        self.assertEqual(self.client.get('/metrics/').status_code, 403)
+        self.assertEqual(self.client.get('/metrics/', **self.auth).status_code, 403)
+        self.assertEqual(self.client.get('/metrics/', headers={'Authorization': 'Bearer wrong'}).status_code, 403)
+        self.assertEqual(self.client.get('/metrics/', headers={'Authorization': 'Bearer secret'}).status_code, 200)
+
+
+@override_settings(WARRANTY_DAYS=100)
+class WarrantyTests(APITestCase):
+    def setUp(self):
+        now = timezone.now()
+        # Гарантия заканчивается через 10 и 40 дней и закончилась 5 дней назад
+        self.soon, self.later, self.expired = [
+            self.create_order(client=client, is_confirmed=True, confirmed_at=now - timedelta(days=100 - days))
+            for client, days in [('Скоро', 10), ('Позже', 40), ('Истекла', -5)]
+        ]
+        self.pending = self.create_order(client='Не подтвержден')
+
+    def test_warranty_end_is_stored_on_save(self):
+        self.assertEqual(self.soon.warranty_ends_at, self.soon.confirmed_at + timedelta(days=100))
+        self.assertIsNone(self.pending.warranty_ends_at)
+        self.pending.is_confirmed = True
+        self.pending.save(update_fields=['is_confirmed'])
+        self.pending.refresh_from_db()
+        self.assertEqual(self.pending.warranty_ends_at, self.pending.confirmed_at + timedelta(days=100))
+
+    def test_expires_within(self):
+        self.assertEqual(list(Order.objects.warranty_expires_within(30)), [self.soon])
+        self.assertEqual(set(Order.objects.warranty_expires_within(60)), {self.soon, self.later})
+
+        response = self.client.get('/sales/api/orders/?warranty_expires_within=30', **self.auth)
+        self.assertEqual([order['id'] for order in response.json()['results']], [self.soon.pk])
+        response = self.client.get('/sales/api/orders/?warranty_expires_within=-1', **self.auth)
+        self.assertEqual(response.status_code, 400)
+
+    def test_refresh_after_warranty_days_change(self):
+        revision = Order.objects.get(pk=self.soon.pk).revision
+        with override_settings(WARRANTY_DAYS=200):
+            self.assertEqual(Order.objects.with_stale_warranty().count(), 3)
+            call_command('refresh_warranty_dates', batch_size=2, stdout=io.StringIO())
+            self.assertFalse(Order.objects.with_stale_warranty().exists())
+
+        order = Order.objects.get(pk=self.soon.pk)
+        self.assertEqual(order.warranty_ends_at, order.confirmed_at + timedelta(days=200))
+        self.assertEqual(order.revision, revision + 1)
+        self.assertIsNone(Order.objects.get(pk=self.pending.pk).warranty_ends_at)
+
+    def test_digest_lists_expiring_orders(self):
+        output = io.StringIO()
+        call_command('send_warranty_digest', days=60, dry_run=True, stdout=output)
+        lines = output.getvalue().splitlines()
+        self.assertIn('(заказов: 2)', lines[0])
+        self.assertEqual([line.split(' — ')[0] for line in lines[1:]],
+                         [f'#{self.soon.pk} Скоро', f'#{self.later.pk} Позже'])
+
+
+class SyncTests(APITestCase):
+    def sync(self, since=None):
+        url = f'/sales/api/sync/?since={since}' if since else '/sales/api/sync/'
+        response = self.client.get(url, **self.auth)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_deletions_are_returned_as_tombstones(self):
+        order = self.create_order()
+        camera = OrderProduct.objects.create(order=order, name='Камера', quantity=2, price=10)
+        cable = OrderProduct.objects.create(order=order, name='Кабель', quantity=1, price=5)
+        order_id, camera_id, cable_id = order.pk, camera.pk, cable.pk
+        cursor = self.sync()['cursor']
+
+        camera.delete()
+        delta = self.sync(cursor)
+        self.assertEqual(delta['deleted_products'], [camera_id])
+        self.assertEqual(delta['products'], [])
+        self.assertEqual([item['id'] for item in delta['orders']], [order_id])
+
+        order.delete()
+        delta = self.sync(delta['cursor'])
+        self.assertEqual(delta['deleted_orders'], [order_id])
+        self.assertEqual(delta['deleted_products'], [cable_id])
+        self.assertEqual(delta['orders'], [])
+
+    def test_nothing_changed(self):
+        self.create_order()
+        cursor = self.sync()['cursor']
+        delta = self.sync(cursor)
+        self.assertEqual((delta['cursor'], delta['orders'], delta['deleted_orders']), (cursor, [], []))
+
+
+class ConvertedImageCacheTests(APITestCase):
+    def setUp(self):
+        self.cache = ConvertedImageCache(max_bytes=10 ** 6, max_age=3600)
+        shutil.rmtree(self.cache.directory, ignore_errors=True)
+        self.source = os.path.join(self.media_root, 'photo.webp')
+        Image.new('RGB', (10, 10), 'red').save(self.source, 'WEBP')
+
+    def test_same_content_is_converted_once(self):
+        target = self.cache.convert(self.source)
+        copy = os.path.join(self.media_root, 'copy.webp')
+        shutil.copyfile(self.source, copy)
+        with mock.patch('sales.cache.PILImage.open') as image_open:
+            self.assertEqual(self.cache.convert(self.source), target)
+            self.assertEqual(self.cache.convert(copy), target)
+        image_open.assert_not_called()
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 1))
+        with Image.open(target) as img:
+            self.assertEqual(img.format, 'PNG')
+
+    def test_replaced_file_gets_new_key(self):
+        target = self.cache.convert(self.source)
+        Image.new('RGB', (10, 10), 'blue').save(self.source, 'WEBP', lossless=True)
+        stat = os.stat(self.source)
+        os.utime(self.source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+        replaced = self.cache.convert(self.source)
+        self.assertNotEqual(replaced, target)
+        with Image.open(replaced) as img:
+            self.assertEqual(img.getpixel((0, 0)), (0, 0, 255))
+
+    def test_least_recently_used_files_are_evicted(self):
+        paths = []
+        for index, color in enumerate(['red', 'green', 'blue']):
+            Image.new('RGB', (10, 10), color).save(self.source, 'WEBP')
+            os.utime(self.source, ns=(10 ** 18 + index, 10 ** 18 + index))
+            paths.append(self.cache.convert(self.source))
+            os.utime(paths[-1], (1000 + index, 1000 + index))
+        self.cache.max_age = time.time()
+        self.cache.max_bytes = sum(os.path.getsize(path) for path in paths[1:])
+
+        self.assertEqual(self.cache.evict(), 1)
+        self.assertEqual([os.path.exists(path) for path in paths], [False, True, True])
+
+    def test_remove_orphans_keeps_files_being_written(self):
+        kept = self.cache.convert(self.source)
+        os.makedirs(os.path.join(self.cache.directory, 'ab'), exist_ok=True)
+        orphan = os.path.join(self.cache.directory, 'ab', f"{'ab' * 32}.png")
+        writing = os.path.join(self.cache.directory, 'ab', 'tmp1234.tmp')
+        abandoned = os.path.join(self.cache.directory, 'ab', 'tmp5678.tmp')
+        for path in (orphan, writing, abandoned):
+            open(path, 'wb').close()
+        stale = time.time() - ConvertedImageCache.TEMP_FILE_MAX_AGE - 1
+        os.utime(abandoned, (stale, stale))
+
+        self.assertEqual(self.cache.remove_orphans({self.cache.content_hash(self.source)}), 2)
+        self.assertEqual([os.path.exists(path) for path in (kept, orphan, writing, abandoned)],
+                         [True, False, True, False])
+
+
+class SeedingTests(APITestCase):
+    def test_seeded_objects_reach_delta_sync(self):
+        cursor = self.client.get('/sales/api/sync/', **self.auth).json()['cursor']
+        result = seed_sales_data(3, min_products=2, max_products=2, passwords=2, batch_size=2)
+
+        delta = self.client.get(f'/sales/api/sync/?since={cursor}', **self.auth).json()
+        self.assertEqual((len(delta['orders']), len(delta['products']), len(delta['passwords'])),
+                         (result['orders'], result['products'], result['passwords']))
+        self.assertEqual(Order.objects.filter(products_count=2).count(), 3)
+
+    def test_same_seed_gives_same_data(self):
+        def snapshot():
+            return (list(Order.objects.order_by('pk').values_list('client', 'vat', 'subtotal', 'grand_total')),
+                    list(OrderProduct.objects.order_by('pk').values_list('name', 'quantity', 'price')))
+
+        seed_sales_data(5, max_products=4, distribution='skewed', seed=7)
+        first = snapshot()
+        Order.objects.all().delete()
+        seed_sales_data(5, max_products=4, distribution='skewed', seed=7)
+        self.assertEqual(snapshot(), first)
+
+    def test_stored_totals_match_products(self):
+        seed_sales_data(5, max_products=4, seed=3)
+        for order in Order.objects.prefetch_related('products'):
+            subtotal = sum((product.quantity * product.price for product in order.products.all()), Decimal(0))
+            self.assertEqual((order.subtotal, order.products_count), (subtotal, len(order.products.all())))
+
+
+class BenchmarkCommandTests(APITestCase):
+    def setUp(self):
+        self.output = os.path.join(self.media_root, 'benchmark.json')
+
+    def benchmark(self, **options):
+        call_command('benchmark_sales', sizes='3', cases='order_list_serializer,order_detail_serializer', repeat=1,
+                     max_products=3, photo_ratio=0, stdout=io.StringIO(), **options)
+
+    def test_results_are_saved_and_data_rolled_back(self):
+        self.benchmark(output=self.output)
+        with open(self.output, encoding='utf-8') as f:
+            results = json.load(f)['results']
+        self.assertEqual([(row['case'], row['size']) for row in results],
+                         [('order_list_serializer', 3), ('order_detail_serializer', 3)])
+        self.assertTrue(all(row['queries'] > 0 and row['median_ms'] >= 0 for row in results))
+        self.assertFalse(Order.objects.exists())
+
+    def test_regression_against_previous_run(self):
+        previous = {'results': [{'case': 'order_detail_serializer', 'size': 3, 'median_ms': 1e-6, 'queries': 0}]}
+        with open(self.output, 'w', encoding='utf-8') as f:
+            json.dump(previous, f)
+        with self.assertRaisesMessage(CommandError, 'Найдено регрессий: 1'):
+            self.benchmark(compare=self.output, fail_on_regression=True)
+
+
+@override_settings(PDF_RENDER_WORKERS=1, PDF_RENDER_TIMEOUT=5, PDF_RENDER_CONCURRENCY=None)
+class RenderPoolTests(SimpleTestCase):
+    def setUp(self):
+        # Процессы без прогрева WeasyPrint: проверяется только управление пулом
+        self.pool = PDFRenderPool(initializer=len)
+        self.addCleanup(self.pool.shutdown)
+
+    def test_stuck_task_replaces_pool(self):
+        first_pid = self.pool.run(os.getpid)
+        executor = self.pool.executor()
+        with override_settings(PDF_RENDER_TIMEOUT=0.5), self.assertRaises(RenderTimeout):
+            self.pool.run(time.sleep, 3)
+
+        self.assertIsNot(self.pool.executor(), executor)
+        self.assertNotEqual(self.pool.run(os.getpid), first_pid)
+
+    @override_settings(PDF_RENDER_MAX_TASKS_PER_CHILD=2)
+    def test_worker_is_replaced_after_max_tasks(self):
+        pids = [self.pool.run(os.getpid) for _ in range(4)]
+        self.assertEqual(len(set(pids)), 2)
+
+
+class RenderAssetTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.template_path = self.write('order.html', '<style>p { color: red; }</style><p>{{ client }}</p>')
+        self.logo_path = self.write('logo.png', b'logo')
+
+    def write(self, name, content, mtime_ns=None):
+        path = os.path.join(self.directory, name)
+        with open(path, 'wb') as f:
+            f.write(content.encode() if isinstance(content, str) else content)
+        if mtime_ns:
+            os.utime(path, ns=(mtime_ns, mtime_ns))
+        return path
+
+    def test_file_is_reloaded_only_when_changed(self):
+        load = mock.Mock(side_effect=lambda path: Path(path).read_text(encoding='utf-8'))
+        asset = FileAsset(self.write('data.txt', 'один', mtime_ns=10 ** 18), load)
+        self.assertEqual((asset.get(), asset.get()), ('один', 'один'))
+        self.assertEqual(load.call_count, 1)
+        digest = asset.digest
+
+        self.write('data.txt', 'два', mtime_ns=2 * 10 ** 18)
+        self.assertEqual(asset.get(), 'два')
+        self.assertEqual(load.call_count, 2)
+        self.assertNotEqual(asset.digest, digest)
+
+        os.remove(asset.path)
+        self.assertEqual((asset.get(), asset.digest), (None, None))
+
+    def test_template_is_compiled_once(self):
+        template = CompiledTemplate('<style>p { margin: 0; }</style><p>{{ client }}: {{ total }} {{ missing }}</p>')
+        self.assertEqual(template.styles, ['p { margin: 0; }'])
+        self.assertEqual(template.render({'client': 'ООО Тест', 'total': 10}), '<p>ООО Тест: 10 {{ missing }}</p>')
+
+    @mock.patch('sales.rendering.pdf_render_pool.register_styles')
+    def test_version_follows_template_and_logo(self, register_styles):
+        renderer = PDFRenderer(self.template_path, self.logo_path)
+        self.assertEqual(renderer.render_html({'client': 'ООО Тест'}), '<p>ООО Тест</p>')
+        self.assertEqual(renderer.base_styles(), ['p { color: red; }'])
+        version = renderer.version()
+        self.assertEqual(renderer.version(), version)
+
+        self.write('logo.png', b'new logo', mtime_ns=os.stat(self.logo_path).st_mtime_ns + 10 ** 9)
+        self.assertNotEqual(renderer.version(), version)
+        self.assertEqual(renderer.logo.get(), 'data:image/png;base64,' + base64.b64encode(b'new logo').decode())
+
+
+class DocumentKeyTests(APITestCase):
+    def setUp(self):
+        self.order = self.create_order()
+        self.camera = OrderProduct.objects.create(order=self.order, name='Камера', quantity=2, price=10)
+        OrderProduct.objects.create(order=self.order, name='Кабель', quantity=1, price=5)
+
+    def key(self, ordering='id'):
+        products = Prefetch('products', queryset=OrderProduct.objects.order_by(ordering))
+        return document_key(Order.objects.prefetch_related(products).get(pk=self.order.pk), 'pdf')
+
+    def test_key_does_not_depend_on_product_order(self):
+        self.assertEqual(self.key('id'), self.key('-id'))
+
+    def test_key_changes_with_product(self):
+        key = self.key()
+        self.camera.price = 11
+        self.camera.save()
+        self.assertNotEqual(self.key(), key)
+        # Изменение без влияния на документ (только updated_at) ключ не меняет
+        changed = self.key()
+        self.camera.save()
+        self.assertEqual(self.key(), changed)
+
+
+class PhotoRenditionTests(APITestCase):
+    def setUp(self):
+        self.order = self.create_order()
+
+    def files(self, name):
+        return [default_storage.exists(path) for path in
+                [name] + [rendition_name(name, size) for size in settings.PHOTO_RENDITION_SIZES]]
+
+    def create_product(self):
+        return OrderProduct.objects.create(order=self.order, name='Камера', quantity=1, price=10, photo=png_file())
+
+    def test_upload_creates_renditions(self):
+        response = self.client.post(f'/sales/api/orders/{self.order.pk}/products/',
+                                    {'name': 'Камера', 'quantity': 1, 'price': '10.00', 'photo': png_file()},
+                                    **self.auth)
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(sorted(response.json()['photo_renditions'], key=int),
+                         [str(size) for size in settings.PHOTO_RENDITION_SIZES])
+        self.assertTrue(all(self.files(OrderProduct.objects.get().photo.name)))
+
+    def test_replaced_photo_is_removed_after_commit(self):
+        product = self.create_product()
+        old_name = product.photo.name
+        product.photo = png_file('new.png')
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        self.assertFalse(any(self.files(old_name)))
+        self.assertTrue(all(self.files(product.photo.name)))
+
+    def test_rolled_back_replacement_keeps_photo(self):
+        product = self.create_product()
+        old_name = product.photo.name
+        product.photo = png_file('new.png')
+        with self.captureOnCommitCallbacks(execute=True), self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                product.save()
+                raise RuntimeError
+        self.assertEqual(OrderProduct.objects.get().photo.name, old_name)
+        self.assertTrue(all(self.files(old_name)))
+
+    def test_delete_removes_photo_and_renditions(self):
+        product = self.create_product()
+        name = product.photo.name
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(f'/sales/api/orders/{self.order.pk}/products/{product.pk}/', **self.auth)
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(any(self.files(name)))
+
+
+class InMemoryExportTests(APITestCase):
+    def setUp(self):
+        order = self.create_order()
+        OrderProduct.objects.create(order=order, name='Камера', quantity=2, price=10)
+        self.order = Order.objects.prefetch_related('products').get(pk=order.pk)
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        temp_override = mock.patch('tempfile.tempdir', self.temp_dir)
+        temp_override.start()
+        self.addCleanup(temp_override.stop)
+
+    def test_excel_stays_in_memory_below_threshold(self):
+        with generate_order_excel(self.order) as document:
+            self.assertEqual(document.tell(), 0)
+            self.assertFalse(document._rolled)
+            self.assertEqual(load_workbook(document)['Order']['A5'].value, 'Камера')
+        self.assertEqual(os.listdir(self.temp_dir), [])
+
+    @override_settings(EXPORT_SPOOL_MAX_MEMORY=1024)
+    def test_large_excel_moves_to_anonymous_file(self):
+        with generate_order_excel(self.order) as document:
+            self.assertTrue(document._rolled)
+            self.assertEqual(document.tell(), 0)
+            self.assertEqual(load_workbook(document)['Order']['A5'].value, 'Камера')
+            # Временный файл без имени: в каталоге его не видно
+            self.assertEqual(os.listdir(self.temp_dir), [])
+
+    @override_settings(EXPORT_SPOOL_MAX_MEMORY=None)
+    def test_excel_without_spooling_is_bytes_buffer(self):
+        self.assertIsInstance(generate_order_excel(self.order), io.BytesIO)
+
+    @mock.patch('sales.utils.order_pdf_renderer.write_pdf', return_value=b'%PDF-1.7')
+    def test_pdf_wraps_rendered_bytes(self, write_pdf):
+        document = generate_order_pdf(self.order)
+        self.assertEqual(document.read(), b'%PDF-1.7')
+        context = write_pdf.call_args.args[0]
+        self.assertIn('Камера', context['products_rows'])
+        self.assertEqual((context['total_without_vat'], context['final_total']), ('20.00', '22.40'))
+        self.assertEqual(os.listdir(self.temp_dir), [])
+
+    def test_export_file_name(self):
+        self.assertEqual(export_file_name(self.order, 'pdf'), f'Заказ-{self.order.pk}.pdf')
+        self.assertEqual(export_file_name(self.order, 'excel'), f'Заказ-{self.order.pk}.xlsx')
+
+
+class OrderWorkbookTests(APITestCase):
+    def setUp(self):
+        self.order = self.create_order()
+        OrderProduct.objects.create(order=self.order, name='Камера', quantity=2, price=10, photo=png_file())
+        OrderProduct.objects.create(order=self.order, name='Кабель', quantity=1, price=5)
+
+    def test_order_sheet(self):
+        output = io.BytesIO()
+        write_order_workbook(Order.objects.prefetch_related('products').get(pk=self.order.pk), output)
+        sheet = load_workbook(output)['Order']
+
+        self.assertEqual([row[0] for row in sheet.iter_rows(min_row=5, max_row=6, values_only=True)],
+                         ['Камера', 'Кабель'])
+        self.assertEqual(sheet['E10'].value, 28)
+        # Фото вставляется из уменьшенной копии (JPEG), высота задана только строкам товаров
+        self.assertEqual([image.format for image in sheet._images], ['jpeg'])
+        self.assertEqual([sheet.row_dimensions[row].height for row in (4, 5, 6, 7)], [None, 30, 30, None])
+
+    def test_orders_workbook_with_summary(self):
+        other = self.create_order(client='ООО Другой')
+        OrderProduct.objects.create(order=other, name='Диск', quantity=1, price=100)
+        output = io.BytesIO()
+        self.assertEqual(write_orders_workbook(Order.objects.all(), output), 2)
+
+        workbook = load_workbook(output)
+        self.assertEqual(workbook.sheetnames, ['Сводка', f'Заказ-{self.order.pk}', f'Заказ-{other.pk}'])
+        summary = list(workbook['Сводка'].iter_rows(values_only=True))
+        self.assertEqual([row[0] for row in summary[1:]], [self.order.pk, other.pk, 'Итого:'])
+        self.assertEqual(summary[-1][4:], (3, 125, 140, 0, 140))
+
+
+@override_settings(EXPORT_JOB_MAX_ATTEMPTS=2, EXPORT_JOB_RETRY_DELAY=30)
+class ExportJobQueueTests(APITestCase):
+    def setUp(self):
+        self.order = self.create_order()
+
+    def test_endpoint_enqueues_job(self):
+        response = self.client.get(f'/sales/api/orders/{self.order.pk}/export_to_telegram/?file_type=pdf',
+                                   **self.auth)
+        self.assertEqual(response.status_code, 202)
+        job = ExportJob.objects.get(pk=response.json()['job_id'])
+        self.assertEqual((job.order, job.file_type, job.status, job.max_attempts),
+                         (self.order, ExportJob.PDF, ExportJob.PENDING, 2))
+
+        status = self.client.get(response.json()['job_url'], **self.auth).json()
+        self.assertEqual((status['kind'], status['status'], status['attempts']), ('telegram', 'pending', 0))
+
+        response = self.client.get(f'/sales/api/orders/{self.order.pk}/export_to_telegram/?file_type=doc',
+                                   **self.auth)
+        self.assertEqual(response.status_code, 400)
+
+    def test_claim_takes_each_due_job_once(self):
+        jobs = [ExportJob.objects.enqueue(self.order, ExportJob.EXCEL) for _ in range(3)]
+        ExportJob.objects.filter(pk=jobs[2].pk).update(run_after=timezone.now() + timedelta(minutes=1))
+
+        first = ExportJob.objects.claim('worker-1')
+        second = ExportJob.objects.claim('worker-2', limit=5)
+        self.assertEqual(([job.pk for job in first], [job.pk for job in second]), ([jobs[0].pk], [jobs[1].pk]))
+        self.assertEqual((second[0].status, second[0].worker, second[0].attempts), (ExportJob.RUNNING, 'worker-2', 1))
+        self.assertEqual(ExportJob.objects.claim('worker-3'), [])
+
+    def test_stale_running_jobs_are_requeued(self):
+        stale, fresh = [ExportJob.objects.enqueue(self.order, ExportJob.EXCEL) for _ in range(2)]
+        ExportJob.objects.claim('worker', limit=2)
+        ExportJob.objects.filter(pk=stale.pk).update(started_at=timezone.now() - timedelta(seconds=700))
+
+        self.assertEqual(ExportJob.objects.requeue_stale(600), 1)
+        stale.refresh_from_db()
+        self.assertEqual((stale.status, stale.worker, stale.attempts), (ExportJob.PENDING, '', 1))
+        self.assertEqual(ExportJob.objects.get(pk=fresh.pk).status, ExportJob.RUNNING)
+
+    @mock.patch('sales.management.commands.run_export_workers.send_order_to_telegram')
+    def test_failures_back_off_then_job_is_dead(self, send):
+        send.side_effect = ConnectionError('нет сети')
+        ExportJob.objects.enqueue(self.order, ExportJob.EXCEL)
+        job = ExportJob.objects.claim('worker')[0]
+        ExportWorkersCommand(stdout=io.StringIO()).run_job(job)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.last_error), (ExportJob.PENDING, 'ConnectionError: нет сети'))
+        self.assertGreater(job.run_after, timezone.now() + timedelta(seconds=25))
+
+        ExportJob.objects.update(run_after=timezone.now())
+        job = ExportJob.objects.claim('worker')[0]
+        ExportWorkersCommand(stdout=io.StringIO()).run_job(job)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (ExportJob.DEAD, 2))
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(ExportJob.objects.claim('worker'), [])
+
+    @mock.patch('sales.management.commands.run_export_workers.send_order_to_telegram')
+    def test_successful_job_is_done(self, send):
+        ExportJob.objects.enqueue(self.order, ExportJob.PDF)
+        job = ExportJob.objects.claim('worker')[0]
+        ExportWorkersCommand(stdout=io.StringIO()).run_job(job)
+        send.assert_called_once_with(self.order, file_type=ExportJob.PDF)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.last_error), (ExportJob.DONE, ''))
+
+
+def render_in_process(order_ids, file_type, workers):
+    # Процессы пула (spawn) подключились бы к основной базе, а не к тестовой
+    return (render_document(order_id, file_type) for order_id in order_ids)
+
+
+@mock.patch('sales.batch_export.iter_rendered', render_in_process)
+class ArchiveExportJobTests(APITestCase):
+    def setUp(self):
+        self.confirmed = self.create_order(is_confirmed=True)
+        OrderProduct.objects.create(order=self.confirmed, name='Камера', quantity=2, price=10)
+        self.other = self.create_order(client='ООО Другой')
+
+    def run_worker(self):
+        job = ExportJob.objects.claim('test')[0]
+        ExportWorkersCommand(stdout=io.StringIO()).run_job(job)
+        return job
+
+    def test_archive_is_built_by_queue_with_progress(self):
+        response = self.client.get('/sales/api/orders/export/archive/?file_type=excel&status=confirmed', **self.auth)
+        self.assertEqual(response.status_code, 202)
+        job = ExportJob.objects.get(pk=response.json()['job_id'])
+        self.assertEqual((job.kind, job.params, job.order), (ExportJob.ARCHIVE, {'status': 'confirmed'}, None))
+
+        self.run_worker()
+        status = self.client.get(response.json()['job_url'], **self.auth).json()
+        self.assertEqual((status['status'], status['progress_done'], status['progress_total']), ('done', 1, 1))
+        self.assertTrue(status['result'].endswith(f'orders-{job.pk}.zip'))
+
+        job.refresh_from_db()
+        with job.result.open('rb') as file, zipfile.ZipFile(file) as archive:
+            self.assertEqual(archive.namelist(), [f'Заказ-{self.confirmed.pk}.xlsx', SUMMARY_NAME])
+            summary = load_workbook(io.BytesIO(archive.read(SUMMARY_NAME)))['Сводка']
+            self.assertEqual([row[0] for row in summary.iter_rows(min_row=2, values_only=True)],
+                             [self.confirmed.pk, 'Итого:'])
+
+    def test_failed_documents_are_listed_in_archive(self):
+        job = ExportJob.objects.enqueue_archive({}, ExportJob.EXCEL)
+        with mock.patch('sales.utils.generate_order_excel', side_effect=[ValueError('нет шаблона'), io.BytesIO(b'x')]):
+            self.run_worker()
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.progress_done), (ExportJob.DONE, 2))
+        with job.result.open('rb') as file, zipfile.ZipFile(file) as archive:
+            self.assertEqual(archive.namelist(), [f'Заказ-{self.other.pk}.xlsx', SUMMARY_NAME, ERRORS_NAME])
+            self.assertIn(f'Заказ #{self.confirmed.pk}: ValueError', archive.read(ERRORS_NAME).decode())
+
+    def test_retry_starts_progress_over(self):
+        job = ExportJob.objects.enqueue_archive({}, ExportJob.EXCEL)
+        ExportJob.objects.filter(pk=job.pk).update(progress_done=1, progress_total=2)
+        job = ExportJob.objects.claim('test')[0]
+        self.assertEqual((job.progress_done, job.progress_total), (0, 2))
+
+    def test_invalid_filter_is_rejected_before_enqueue(self):
+        response = self.client.get('/sales/api/orders/export/archive/?date_from=вчера', **self.auth)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ExportJob.objects.exists())
+
+
+class SearchTests(APITestCase):
+    def setUp(self):
+        self.order = self.create_order(client='ООО Рога и копыта')
+        self.router = OrderProduct.objects.create(order=self.order, name='Роутер TP-Link', quantity=1, price=10)
+        self.switch = OrderProduct.objects.create(order=self.order, name='Коммутатор D-Link', quantity=1, price=20)
+        OrderProduct.objects.create(order=self.order, name='Терминал оплаты', quantity=1, price=30)
+        self.password = Password.objects.create(organization_name='Рогатка', nvr_password='1', camera_password='2')
+
+    def search(self, q, **params):
+        response = self.client.get('/sales/api/search/', {'q': q, **params}, **self.auth)
+        self.assertEqual(response.status_code, 200)
+        return [(item['entity'], item['text'], item['exact']) for item in response.json()['results']]
+
+    def test_exact_substring_of_every_word(self):
+        self.assertEqual(self.search('link роут'), [('product', 'Роутер TP-Link', True)])
+        self.assertEqual(sorted(self.search('рога')), [('order', 'ООО Рога и копыта', True),
+                                                       ('password', 'Рогатка', True)])
+        self.assertEqual(self.search('рога', type='password'), [('password', 'Рогатка', True)])
+
+    def test_single_typo_requires_most_trigrams(self):
+        # «Терминал» делит с запросом одну триграмму из четырех и в выдачу не попадает
+        self.assertEqual(self.search('раутер'), [('product', 'Роутер TP-Link', False)])
+        self.assertEqual(self.search('коммуатор'), [('product', 'Коммутатор D-Link', False)])
+
+    def test_shared_trigrams_when_nothing_else_matches(self):
+        self.assertEqual(self.search('камутатар'), [('product', 'Коммутатор D-Link', False)])
+        self.assertEqual(self.search('холодильник'), [])
+
+    def test_typo_match_leaves_out_one_character(self):
+        self.assertEqual(search.typo_match('рог'), '"рог"')
+        self.assertEqual(search.typo_match('роут'), '("оут") OR ("роу")')
+        # Опечатка в середине короткого слова оставила бы одну триграмму из четырех
+        self.assertEqual(search.typo_match('раутер'), '("аутер") OR ("утер") OR ("раут") OR ("рауте")')
+
+    def test_fallback_search_without_fts(self):
+        # LIKE в SQLite не сравнивает кириллицу без учета регистра, в базах без FTS5 это делает icontains
+        with mock.patch('sales.search.is_available', return_value=False):
+            self.assertEqual(search.search('Рога'), [
+                {'entity': 'order', 'object_id': self.order.pk, 'order_id': self.order.pk,
+                 'text': 'ООО Рога и копыта', 'exact': True},
+                {'entity': 'password', 'object_id': self.password.pk, 'order_id': None, 'text': 'Рогатка',
+                 'exact': True},
+            ])
+            self.assertEqual([item['object_id'] for item in search.search('link', entities=['product'])],
+                             [self.router.pk, self.switch.pk])
+            self.assertEqual(len(search.search('link', limit=1)), 1)
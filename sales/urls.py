@@ -1,22 +1,46 @@
 from django.urls import path
 from .views import (OrderListCreateAPIView, OrderDetailAPIView, OrderProductsAPIView, OrderConfirmAPIView,
-                    OrderRejectAPIView, export_order_to_telegram, ConfirmedOrdersView, PasswordAPIView)
+                    OrderRejectAPIView, export_order_to_telegram, ConfirmedOrdersView, PasswordAPIView,
+                    OrderProductsBulkAPIView, CacheStatsAPIView, OrderExportAPIView, SyncAPIView,
+                    SearchAPIView, ExportJobAPIView, OrderArchiveExportAPIView)
+from .async_views import (AsyncOrderListCreateView, AsyncOrderDetailView, AsyncOrderProductsView,
+                          AsyncOrderConfirmView, AsyncOrderRejectView, AsyncPasswordView,
+                          async_export_order_to_telegram)
 
 app_name = 'sales'
 
 urlpatterns = [
     path('api/orders/', OrderListCreateAPIView.as_view(), name='order-list-create'),
+    path('api/orders/export/', OrderExportAPIView.as_view(), name='order-export'),
+    path('api/orders/export/archive/', OrderArchiveExportAPIView.as_view(), name='order-export-archive'),
     path('api/orders/<int:pk>/', OrderDetailAPIView.as_view(), name='order-detail'),
     path('api/orders/<int:order_id>/products/', OrderProductsAPIView.as_view(), name='order-products'),
     path('api/orders/<int:order_id>/products/<int:product_id>/', OrderProductsAPIView.as_view(),
          name='order-product-detail'),
+    path('api/orders/<int:order_id>/products/bulk/', OrderProductsBulkAPIView.as_view(), name='order-products-bulk'),
 
     # Маршруты для подтверждения и отклонения заказов
     path('api/orders/<int:pk>/confirm/', OrderConfirmAPIView.as_view(), name='order-confirm'),
     path('api/orders/<int:pk>/reject/', OrderRejectAPIView.as_view(), name='order-reject'),
     path('api/orders/<int:order_id>/export_to_telegram/', export_order_to_telegram, name='export_to_telegram'),
+    path('api/export-jobs/<int:pk>/', ExportJobAPIView.as_view(), name='export-job'),
     path('api/confirmed-orders/', ConfirmedOrdersView.as_view(), name='confirmed-orders'),
+    path('api/sync/', SyncAPIView.as_view(), name='sync'),
+    path('api/search/', SearchAPIView.as_view(), name='search'),
+    path('api/cache-stats/', CacheStatsAPIView.as_view(), name='cache-stats'),
     path('api/passwords/', PasswordAPIView.as_view()),
     path('api/passwords/<int:pk>/', PasswordAPIView.as_view()),
 
+    # Асинхронные варианты API (для запуска под ASGI), работают параллельно с синхронными
+    path('api/async/orders/', AsyncOrderListCreateView.as_view(), name='async-order-list-create'),
+    path('api/async/orders/<int:pk>/', AsyncOrderDetailView.as_view(), name='async-order-detail'),
+    path('api/async/orders/<int:order_id>/products/', AsyncOrderProductsView.as_view(), name='async-order-products'),
+    path('api/async/orders/<int:order_id>/products/<int:product_id>/', AsyncOrderProductsView.as_view(),
+         name='async-order-product-detail'),
+    path('api/async/orders/<int:pk>/confirm/', AsyncOrderConfirmView.as_view(), name='async-order-confirm'),
+    path('api/async/orders/<int:pk>/reject/', AsyncOrderRejectView.as_view(), name='async-order-reject'),
+    path('api/async/orders/<int:order_id>/export_to_telegram/', async_export_order_to_telegram,
+         name='async-export-to-telegram'),
+    path('api/async/passwords/', AsyncPasswordView.as_view()),
+    path('api/async/passwords/<int:pk>/', AsyncPasswordView.as_view()),
 ]
@@ -1,15 +1,23 @@
-from openpyxl.styles import Font, Alignment
-from openpyxl.drawing.image import Image
-from openpyxl import Workbook
-from PIL import Image as PILImage
+import io
 import os
+import tempfile
 import base64
-import requests
+import logging
 import mimetypes
-from weasyprint import HTML
+from django.conf import settings
+from RHick.db import retry_on_lock
+from telegrambot.utils.client import TelegramAPIError, get_client
+from .cache import converted_image_cache, rendered_document_cache
+from .documents import document_key
+from .excel import write_order_workbook
+from .models import TelegramDocument
+from .rendering import PDFRenderer
+from .renditions import rendition_path
 
 mimetypes.add_type('image/webp', '.webp')
 
+logger = logging.getLogger(__name__)
+
 TELEGRAM_BOT_TOKEN = '7775474735:AAHcPmCc7VpC_bxzgDWQvQs_lTpjCAV0C8Q'
 TELEGRAM_CHAT_ID = '-1002411014709'
 
@@ -17,28 +25,26 @@ TEMPLATE_PATH = os.path.join(os.path.dirname(__file__), 'templates', 'sales', 'o
 LOGO_PATH = os.path.join(os.path.dirname(__file__), 'static', 'images', 'Logo.png')
 
 
+# Минимальный размер копии фото (px): в PDF фото 46x46, с запасом для печати с высоким разрешением
+PDF_PHOTO_SIZE = 300
+
+# Шаблон, стили и логотип PDF загружаются один раз на процесс
+order_pdf_renderer = PDFRenderer(TEMPLATE_PATH, LOGO_PATH)
+
+
 def get_logo_base64():
-    try:
-        with open(LOGO_PATH, 'rb') as f:
-            encoded = base64.b64encode(f.read()).decode('utf-8')
-        return f"data:image/png;base64,{encoded}"
-    except Exception as e:
-        print(f"Ошибка при загрузке логотипа: {e}")
-        return None
+    return order_pdf_renderer.logo.get()
 
 
 def convert_webp_to_png(photo_path):
-    png_path = photo_path.replace('.webp', '.png')
-    with PILImage.open(photo_path) as img:
-        img.save(png_path, 'PNG')
-    return png_path
+    return converted_image_cache.convert(photo_path, 'PNG')
 
 
-def get_image_base64(photo_field):
+def get_image_base64(photo_field, size=PDF_PHOTO_SIZE):
     if not photo_field:
         return None
     try:
-        path = photo_field.path
+        path = rendition_path(photo_field, size)
         if path.lower().endswith('.webp'):
             path = convert_webp_to_png(path)
         if not os.path.exists(path):
@@ -54,95 +60,31 @@ def get_image_base64(photo_field):
         return None
 
 
+def export_buffer():
+    """
+    Буфер для выгружаемого документа. Документы больше EXPORT_SPOOL_MAX_MEMORY байт
+    переносятся во временный файл без имени (если порог задан), меньшие остаются в памяти.
+    """
+    if settings.EXPORT_SPOOL_MAX_MEMORY:
+        return tempfile.SpooledTemporaryFile(max_size=settings.EXPORT_SPOOL_MAX_MEMORY)
+    return io.BytesIO()
+
+
+def export_file_name(order, file_type):
+    return f"Заказ-{order.id}.{'pdf' if file_type == 'pdf' else 'xlsx'}"
+
+
 def generate_order_excel(order):
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Order"
-
-    headers = [
-        "Название клиента:", order.client,
-        "Использованный НДС:", f"{order.vat}%",
-        "Прочие расходы (%):", f"{order.additional_expenses}%"
-    ]
-
-    for col in range(0, len(headers), 2):
-        cell = ws.cell(row=1 + col // 2, column=1, value=headers[col])
-        cell.font = Font(bold=True)
-        cell.alignment = Alignment(horizontal='left', vertical='center')
-        cell = ws.cell(row=1 + col // 2, column=2, value=headers[col + 1])
-        cell.alignment = Alignment(horizontal='center', vertical='center')
-
-    table_headers = ["Название товара", "Фото", "Количество", "Цена за единицу", "Общая стоимость"]
-    for col_num, header in enumerate(table_headers, 1):
-        cell = ws.cell(row=4, column=col_num, value=header)
-        cell.font = Font(bold=True)
-        cell.alignment = Alignment(horizontal='center', vertical='center')
-
-    row_num = 5
-    for product in order.products.all():
-        ws.cell(row=row_num, column=1, value=product.name).alignment = Alignment(horizontal='center', vertical='center')
-
-        if product.photo:
-            photo_path = product.photo.path
-            try:
-                if photo_path.lower().endswith('.webp'):
-                    photo_path = convert_webp_to_png(photo_path)
-                img = Image(photo_path)
-                img.width = 30
-                img.height = 30
-                img.anchor = f'B{row_num}'
-                ws.add_image(img)
-            except Exception as e:
-                print(f"Ошибка обработки изображения: {e}")
-                ws.cell(row=row_num, column=2, value="Изображение недоступно")
-
-        ws.cell(row=row_num, column=3, value=product.quantity).alignment = Alignment(horizontal='center',
-                                                                                     vertical='center')
-        ws.cell(row=row_num, column=4, value=product.price).alignment = Alignment(horizontal='center',
-                                                                                  vertical='center')
-        ws.cell(row=row_num, column=5, value=product.quantity * product.price).alignment = Alignment(
-            horizontal='center', vertical='center')
-        ws.row_dimensions[row_num].height = 30
-        row_num += 1
-
-    total_price = order.get_total_price()
-    total_price_with_vat = order.get_total_price_with_vat()
-    additional_expenses_amount = order.get_additional_expenses_amount()
-    total_sum = total_price_with_vat + additional_expenses_amount
-
-    ws.cell(row=row_num, column=4, value="Итого без НДС:").font = Font(bold=True)
-    ws.cell(row=row_num, column=4).alignment = Alignment(horizontal='center', vertical='center')
-    ws.cell(row=row_num, column=5, value=total_price).font = Font(bold=True)
-    ws.cell(row=row_num, column=5).alignment = Alignment(horizontal='center', vertical='center')
-
-    ws.cell(row=row_num + 1, column=4, value="Итого с НДС:").font = Font(bold=True)
-    ws.cell(row=row_num + 1, column=4).alignment = Alignment(horizontal='center', vertical='center')
-    ws.cell(row=row_num + 1, column=5, value=total_price_with_vat).font = Font(bold=True)
-    ws.cell(row=row_num + 1, column=5).alignment = Alignment(horizontal='center', vertical='center')
-
-    ws.cell(row=row_num + 2, column=4, value="Прочие расходы:").font = Font(bold=True)
-    ws.cell(row=row_num + 2, column=4).alignment = Alignment(horizontal='center', vertical='center')
-    ws.cell(row=row_num + 2, column=5, value=additional_expenses_amount).font = Font(bold=True)
-    ws.cell(row=row_num + 2, column=5).alignment = Alignment(horizontal='center', vertical='center')
-
-    ws.cell(row=row_num + 3, column=4, value="Общий итог:").font = Font(bold=True)
-    ws.cell(row=row_num + 3, column=4).alignment = Alignment(horizontal='center', vertical='center')
-    ws.cell(row=row_num + 3, column=5, value=total_sum).font = Font(bold=True)
-    ws.cell(row=row_num + 3, column=5).alignment = Alignment(horizontal='center', vertical='center')
-
-    ws.column_dimensions['A'].width = 30
-    ws.column_dimensions['B'].width = 30
-    ws.column_dimensions['C'].width = 20
-    ws.column_dimensions['D'].width = 20
-    ws.column_dimensions['E'].width = 20
-
-    file_name = f"Заказ-{order.id}.xlsx"
-    file_path = os.path.join("/tmp", file_name)
-    wb.save(file_path)
-    return file_path
+    """
+    Книга Excel заказа в буфере, позиция — в начале.
+    """
+    buffer = export_buffer()
+    write_order_workbook(order, buffer)
+    buffer.seek(0)
+    return buffer
 
 
-def generate_order_pdf(order):
+def render_order_pdf(order):
     products_rows = ''
     for i, product in enumerate(order.products.all(), 1):
         photo_base64 = get_image_base64(product.photo) if product.photo else None
@@ -168,12 +110,12 @@ def generate_order_pdf(order):
             <td class="td-total">{total:.2f}</td>
         </tr>'''
 
-    total_without_vat = order.get_total_price()
-    total_with_vat = order.get_total_price_with_vat()
-    additional_expenses_amount = order.get_additional_expenses_amount()
-    grand_total = total_with_vat + additional_expenses_amount
-    advance = order.advance or 0
-    final_total = grand_total - advance
+    totals = order.get_totals()
+    total_without_vat = totals['subtotal']
+    total_with_vat = totals['total_with_vat']
+    additional_expenses_amount = totals['expenses_amount']
+    grand_total = totals['grand_total']
+    final_total = totals['amount_due']
 
     if order.is_confirmed:
         status_class, status_text = 'status-confirmed', 'Подтвержден'
@@ -185,9 +127,6 @@ def generate_order_pdf(order):
     created_at = order.created_at.strftime('%d.%m.%Y %H:%M') if hasattr(order.created_at, 'strftime') else str(
         order.created_at)
 
-    with open(TEMPLATE_PATH, 'r', encoding='utf-8') as f:
-        template = f.read()
-
     if order.advance:
         advance_row = (
             f'<div class="totals-row">'
@@ -211,43 +150,79 @@ def generate_order_pdf(order):
         else '<span>RHIK</span>'
     )
 
-    html = (template
-            .replace('{{ order_id }}', str(order.id))
-            .replace('{{ created_at }}', created_at)
-            .replace('{{ client }}', str(order.client))
-            .replace('{{ vat }}', str(order.vat if order.vat else 0))
-            .replace('{{ additional_expenses_pct }}',
-                     str(order.additional_expenses if order.additional_expenses else 0))
-            .replace('{{ status_class }}', status_class)
-            .replace('{{ status_text }}', status_text)
-            .replace('{{ products_rows }}', products_rows)
-            .replace('{{ total_without_vat }}', f'{total_without_vat:.2f}')
-            .replace('{{ total_with_vat }}', f'{total_with_vat:.2f}')
-            .replace('{{ additional_expenses_amount }}', f'{additional_expenses_amount:.2f}')
-            .replace('{{ advance_row }}', advance_row)
-            .replace('{{ final_label }}', final_label)
-            .replace('{{ final_total }}', f'{final_total:.2f}')
-            .replace('{{ logo_img }}', logo_html)
-            )
+    return order_pdf_renderer.write_pdf({
+        'order_id': order.id,
+        'created_at': created_at,
+        'client': order.client,
+        'vat': order.vat if order.vat else 0,
+        'additional_expenses_pct': order.additional_expenses if order.additional_expenses else 0,
+        'status_class': status_class,
+        'status_text': status_text,
+        'products_rows': products_rows,
+        'total_without_vat': f'{total_without_vat:.2f}',
+        'total_with_vat': f'{total_with_vat:.2f}',
+        'additional_expenses_amount': f'{additional_expenses_amount:.2f}',
+        'advance_row': advance_row,
+        'final_label': final_label,
+        'final_total': f'{final_total:.2f}',
+        'logo_img': logo_html,
+    })
 
-    pdf_bytes = HTML(string=html, base_url=os.getcwd()).write_pdf()
 
-    pdf_file_path = os.path.join("/tmp", f"Заказ-{order.id}.pdf")
-    with open(pdf_file_path, 'wb') as f:
-        f.write(pdf_bytes)
+def generate_order_pdf(order):
+    """
+    PDF заказа в буфере. WeasyPrint возвращает документ целиком в памяти, BytesIO использует эти байты без копии.
+    """
+    return io.BytesIO(render_order_pdf(order))
 
-    return pdf_file_path
 
+def order_document_key(order, file_type):
+    return document_key(order, file_type, order_pdf_renderer.version() if file_type == 'pdf' else '')
 
-def send_order_to_telegram(order, file_type='excel'):
+
+def open_order_document(order, file_type, key=None):
+    """
+    Документ заказа, открытый на чтение: буфер в памяти или, если включен RENDERED_DOCUMENTS_CACHE,
+    файл дискового кэша (рендерится только при промахе).
+    """
+    if not settings.RENDERED_DOCUMENTS_CACHE:
+        return generate_order_pdf(order) if file_type == 'pdf' else generate_order_excel(order)
+
+    key = key or order_document_key(order, file_type)
     if file_type == 'pdf':
-        file_path = generate_order_pdf(order)
-    else:
-        file_path = generate_order_excel(order)
+        return rendered_document_cache.open(key, 'pdf', lambda f: f.write(render_order_pdf(order)))
+    return rendered_document_cache.open(key, 'xlsx', lambda f: write_order_workbook(order, f))
 
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendDocument"
-    with open(file_path, 'rb') as file:
-        response = requests.post(url, data={'chat_id': TELEGRAM_CHAT_ID}, files={'document': file})
 
-    os.remove(file_path)
-    return response.status_code == 200
+def send_order_to_telegram(order, file_type='excel'):
+    """
+    Отправляет документ заказа в чат. Если этот же документ уже загружался ботом, он отправляется
+    по file_id без рендера и загрузки файла. Ошибки Bot API не перехватываются (TelegramAPIError
+    с retry_after при флуд-контроле): повтор планирует очередь ExportJob.
+    """
+    client = get_client(TELEGRAM_BOT_TOKEN)
+    key = order_document_key(order, file_type)
+    file_id = TelegramDocument.objects.file_id(TELEGRAM_BOT_TOKEN, key)
+    if file_id:
+        try:
+            client.send_cached_document(TELEGRAM_CHAT_ID, file_id)
+            return True
+        except TelegramAPIError as e:
+            if e.error_code != 400:
+                raise
+            # Telegram больше не принимает file_id: файл загружается заново
+            retry_on_lock(TelegramDocument.objects.forget)(TELEGRAM_BOT_TOKEN, key)
+
+    with open_order_document(order, file_type, key) as document:
+        message = client.send_document(TELEGRAM_CHAT_ID, export_file_name(order, file_type), document)
+    retry_on_lock(TelegramDocument.objects.remember)(TELEGRAM_BOT_TOKEN, key, message['document']['file_id'])
+    return True
+
+
+def send_telegram_message(text):
+    try:
+        get_client(TELEGRAM_BOT_TOKEN).send_message(TELEGRAM_CHAT_ID, text)
+    except TelegramAPIError as e:
+        logger.error(f"Не удалось отправить сообщение в Telegram: {e}")
+        return False
+    return True
@@ -1,26 +1,51 @@
 from rest_framework import status
-from rest_framework.permissions import AllowAny
-from .models import Order, OrderProduct, Password
-from .serializers import OrderSerializer, OrderProductSerializer, OrderDetailSerializer, PasswordSerializer
+from rest_framework.permissions import AllowAny, IsAdminUser
+from .models import ChangeLog, ExportJob, Order, OrderProduct, Password
+from .serializers import (OrderSerializer, OrderProductSerializer, OrderDetailSerializer, PasswordSerializer,
+                          OrderProductBulkSerializer, ExportJobSerializer)
+from .signals import deferred_totals_refresh
+from . import search
+from .conditional import get_order_version, order_condition, set_order_validators
+from .cache import converted_image_cache, order_detail_cache, rendered_document_cache
+from .streaming import EXPORT_FILE_TYPES, iter_export
+from .excel import XLSX_CONTENT_TYPE, write_orders_workbook
+from .batch_export import BATCH_FILE_TYPES
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from django.http import JsonResponse
-from .utils import send_order_to_telegram
+from django.http import FileResponse, JsonResponse, StreamingHttpResponse
+from .filters import ORDER_FILTER_PARAMS, filter_created_between, filter_orders, parse_date_param
+from .pagination import OrderKeysetPagination
 from django.views.decorators.csrf import csrf_exempt
+from django.utils.decorators import method_decorator
+import base64
+import binascii
 import logging
 import os
-from django.utils.dateparse import parse_date
-from datetime import datetime, time
+import tempfile
+from django.conf import settings
+from RHick.db import retry_on_lock
+from rest_framework.exceptions import ValidationError
+from decimal import Decimal
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
 
 logger = logging.getLogger(__name__)
 
 
 class OrderListCreateAPIView(APIView):
+    pagination_class = OrderKeysetPagination
+
     def get(self, request):
-        orders = Order.objects.all()
-        serializer = OrderSerializer(orders, many=True)
-        return Response(serializer.data)
+        orders = filter_orders(Order.objects.all(), request.query_params)
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(orders, request, view=self)
+        serializer = OrderSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
     def post(self, request):
         serializer = OrderSerializer(data=request.data)
@@ -30,22 +55,79 @@ class OrderListCreateAPIView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class OrderExportAPIView(APIView):
+    """
+    Потоковая выгрузка заказов с товарами в NDJSON или CSV для бухгалтерии,
+    а также книга Excel со сводным листом и листом на каждый заказ (file_type=xlsx).
+    """
+    chunk_size = 2000
+
+    def get(self, request):
+        file_type = request.query_params.get('file_type', 'ndjson')
+        if file_type not in EXPORT_FILE_TYPES and file_type != 'xlsx':
+            return Response({"file_type": f"Допустимые значения: {', '.join(EXPORT_FILE_TYPES)}, xlsx."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        orders = filter_orders(Order.objects.all(), request.query_params)
+        if file_type == 'xlsx':
+            # Книга xlsx — zip-архив, его нельзя отдавать по мере формирования: сначала пишется во временный файл
+            output = tempfile.TemporaryFile()
+            write_orders_workbook(orders, output)
+            output.seek(0)
+            return FileResponse(output, as_attachment=True, filename='orders.xlsx', content_type=XLSX_CONTENT_TYPE)
+
+        response = StreamingHttpResponse(iter_export(orders, file_type, self.chunk_size),
+                                         content_type=EXPORT_FILE_TYPES[file_type])
+        response['Content-Disposition'] = f'attachment; filename="orders.{file_type}"'
+        return response
+
+
+class OrderArchiveExportAPIView(APIView):
+    """
+    ZIP-архив с PDF или Excel каждого заказа по фильтру (status, date_from, date_to, client) и сводной книгой.
+    Архив собирается в фоне (run_export_workers), ответ 202 содержит id задачи; ход сборки и ссылка
+    на готовый архив — в статусе задачи.
+    """
+
+    def get(self, request):
+        file_type = request.query_params.get('file_type', 'pdf')
+        if file_type not in BATCH_FILE_TYPES:
+            return Response({"file_type": f"Допустимые значения: {', '.join(BATCH_FILE_TYPES)}."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        params = {key: request.query_params[key] for key in ORDER_FILTER_PARAMS if request.query_params.get(key)}
+        # Ошибки фильтра возвращаются сразу, а не после постановки в очередь
+        filter_orders(Order.objects.all(), params)
+        job = retry_on_lock(ExportJob.objects.enqueue_archive)(params, file_type)
+        return Response({
+            'job_id': job.pk,
+            'job_url': request.build_absolute_uri(reverse('sales:export-job', args=[job.pk])),
+        }, status=status.HTTP_202_ACCEPTED)
+
+
 class OrderDetailAPIView(APIView):
     permission_classes = [AllowAny]
 
+    @method_decorator(order_condition)
     def get(self, request, pk):
-        order = get_object_or_404(Order, pk=pk)
-        serializer = OrderDetailSerializer(order)
-        return Response(serializer.data)
-
+        version = get_order_version(request, pk)
+        payload = order_detail_cache.get(pk, version['revision']) if version else None
+        if payload is None:
+            order = get_object_or_404(Order.objects.prefetch_related('products'), pk=pk)
+            payload = OrderDetailSerializer(order).data
+            order_detail_cache.set(pk, order.revision, payload)
+        return Response(payload)
+
+    @method_decorator(order_condition)
     def put(self, request, pk):
         order = get_object_or_404(Order, pk=pk)
         serializer = OrderSerializer(order, data=request.data)
         if serializer.is_valid():
             serializer.save()
-            return Response(serializer.data)
+            return set_order_validators(Response(serializer.data), pk)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @method_decorator(order_condition)
     def delete(self, request, pk):
         order = get_object_or_404(Order, pk=pk)
         order.delete()
@@ -57,6 +139,7 @@ class OrderProductsAPIView(APIView):
     API для работы с продуктами заказа
     """
 
+    @method_decorator(order_condition)
     def get(self, request, order_id):
         """
         Получить список продуктов для указанного заказа и общую сумму заказа.
@@ -68,11 +151,10 @@ class OrderProductsAPIView(APIView):
             return Response({"detail": "Продукты для этого заказа не найдены."}, status=status.HTTP_404_NOT_FOUND)
 
         serializer = OrderProductSerializer(products, many=True)
-        total_order_price = sum([product.quantity * product.price for product in products])
 
         return Response({
             "products": serializer.data,
-            "total_order_price": total_order_price
+            "total_order_price": order.subtotal
         }, status=status.HTTP_200_OK)
 
     def post(self, request, order_id):
@@ -97,6 +179,7 @@ class OrderProductsAPIView(APIView):
             logger.error(f"Ошибки сериализатора: {serializer.errors}")
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @method_decorator(order_condition)
     def put(self, request, order_id, product_id):
         """
         Редактировать продукт в указанном заказе.
@@ -113,11 +196,12 @@ class OrderProductsAPIView(APIView):
 
         if serializer.is_valid():
             serializer.save()
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return set_order_validators(Response(serializer.data, status=status.HTTP_200_OK), order_id)
         else:
-            print(f"Ошибки сериализатора: {serializer.errors}")
+            logger.error(f"Ошибки сериализатора: {serializer.errors}")
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @method_decorator(order_condition)
     def delete(self, request, order_id, product_id):
         """
         Удалить продукт из указанного заказа и его фото.
@@ -137,13 +221,76 @@ class OrderProductsAPIView(APIView):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+class OrderProductsBulkAPIView(APIView):
+    """
+    Пакетное добавление, изменение и удаление продуктов заказа одним запросом.
+    """
+
+    def post(self, request, order_id):
+        """
+        Принимает {"upsert": [...], "delete": [id, ...]}: продукты без id создаются, с id — обновляются.
+        Все изменения применяются в одной транзакции.
+        """
+        order = get_object_or_404(Order, id=order_id)
+        serializer = OrderProductBulkSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        upserts = serializer.validated_data['upsert']
+        delete_ids = serializer.validated_data['delete']
+        update_ids = [item['id'] for item in upserts if 'id' in item]
+
+        with transaction.atomic(), deferred_totals_refresh() as refreshed_orders:
+            existing = OrderProduct.objects.filter(order=order).in_bulk(update_ids + delete_ids)
+            unknown_ids = sorted(set(update_ids + delete_ids) - set(existing))
+            if unknown_ids:
+                return Response({"detail": f"Продукты не найдены в этом заказе: {unknown_ids}"},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+            now = timezone.now()
+            to_create = []
+            to_update = []
+            for item in upserts:
+                product_id = item.pop('id', None)
+                if product_id is None:
+                    to_create.append(OrderProduct(order=order, **item))
+                    continue
+                product = existing[product_id]
+                for field, value in item.items():
+                    setattr(product, field, value)
+                product.updated_at = now
+                to_update.append(product)
+
+            OrderProduct.objects.bulk_create(to_create)
+            OrderProduct.objects.bulk_update(to_update, ['name', 'quantity', 'price', 'updated_at'])
+            ChangeLog.objects.record(ChangeLog.PRODUCT, [product.pk for product in to_create + to_update])
+            for product in to_create + to_update:
+                search.index_product(product)
+
+            photos = [existing[pk].photo.name for pk in delete_ids if existing[pk].photo]
+            OrderProduct.objects.filter(id__in=delete_ids).delete()
+            transaction.on_commit(lambda: [default_storage.delete(name) for name in photos])
+
+            # bulk_create/bulk_update не отправляют сигналы, поэтому заказ добавляется в пересчет явно
+            refreshed_orders.add(order.pk)
+
+        order.refresh_from_db()
+        products = OrderProduct.objects.filter(order=order)
+        return Response({
+            "products": OrderProductSerializer(products, many=True).data,
+            "total_order_price": order.subtotal,
+            "products_count": order.products_count,
+            "grand_total": order.grand_total,
+        }, status=status.HTTP_200_OK)
+
+
 class OrderConfirmAPIView(APIView):
     def patch(self, request, pk):
         order = get_object_or_404(Order, pk=pk)
         if order.is_rejected:
             return Response({"error": "Нельзя подтвердить отклоненный заказ"}, status=status.HTTP_400_BAD_REQUEST)
         order.is_confirmed = True
-        order.save()
+        retry_on_lock(order.save)()
         return Response({"status": "Заказ подтвержден"}, status=status.HTTP_200_OK)
 
 
@@ -153,7 +300,7 @@ class OrderRejectAPIView(APIView):
         if order.is_confirmed:
             return Response({"error": "Нельзя отклонить подтвержденный заказ"}, status=status.HTTP_400_BAD_REQUEST)
         order.is_rejected = True
-        order.save()
+        retry_on_lock(order.save)()
         return Response({"status": "Заказ отклонен"}, status=status.HTTP_200_OK)
 
 
@@ -161,54 +308,192 @@ class OrderRejectAPIView(APIView):
 def export_order_to_telegram(request, order_id):
     """
     Эндпоинт для экспорта заказа в Telegram в формате Excel или PDF.
+    Файл формируется и отправляется в фоне (run_export_workers), ответ 202 содержит id задачи.
     """
     try:
         # Получаем заказ по ID
         order = Order.objects.get(id=order_id)
+    except Order.DoesNotExist:
+        return JsonResponse({'status': 'error', 'message': 'Заказ не найден.'}, status=404)
 
-        # Получаем тип файла из параметров GET, по умолчанию 'excel'
-        file_type = request.GET.get('file_type', 'excel')
+    # Получаем тип файла из параметров GET, по умолчанию 'excel'
+    file_type = request.GET.get('file_type', ExportJob.EXCEL)
+    if file_type not in dict(ExportJob.FILE_TYPE_CHOICES):
+        return JsonResponse({'status': 'error', 'message': 'Допустимые форматы: excel, pdf.'}, status=400)
 
-        # Отправляем заказ в Telegram
-        success = send_order_to_telegram(order, file_type=file_type)
+    job = retry_on_lock(ExportJob.objects.enqueue)(order, file_type)
+    return export_job_accepted(request, job)
 
-        if success:
-            return JsonResponse({'status': 'success', 'message': 'Заказ успешно отправлен в Telegram.'})
-        else:
-            return JsonResponse({'status': 'error', 'message': 'Не удалось отправить заказ в Telegram.'}, status=500)
 
-    except Order.DoesNotExist:
-        return JsonResponse({'status': 'error', 'message': 'Заказ не найден.'}, status=404)
+def export_job_accepted(request, job):
+    return JsonResponse({
+        'status': 'success',
+        'message': 'Заказ поставлен в очередь на отправку в Telegram.',
+        'job_id': job.pk,
+        'job_url': request.build_absolute_uri(reverse('sales:export-job', args=[job.pk])),
+    }, status=202)
+
+
+class ExportJobAPIView(APIView):
+    """
+    Статус фоновой задачи экспорта: для архива — ход сборки (progress_done/progress_total) и ссылка на файл.
+    """
+
+    def get(self, request, pk):
+        job = get_object_or_404(ExportJob, pk=pk)
+        return Response(ExportJobSerializer(job, context={'request': request}).data)
 
 
 class ConfirmedOrdersView(APIView):
+    """
+    Отчет по подтвержденным заказам за период: итоги и разбивка по дням/неделям/месяцам
+    считаются одним агрегирующим запросом, а сами заказы отдаются постранично.
+    """
+    pagination_class = OrderKeysetPagination
+    periods = {'day': TruncDay, 'week': TruncWeek, 'month': TruncMonth}
+
     def get(self, request, *args, **kwargs):
-        start_date = request.query_params.get('start_date')
-        end_date = request.query_params.get('end_date')
-        confirmed_orders = Order.objects.filter(is_confirmed=True)
-
-        if start_date:
-            start_date = parse_date(start_date)
-            if start_date:
-                start_datetime = datetime.combine(start_date, time.min)
-                confirmed_orders = confirmed_orders.filter(created_at__gte=start_datetime)
-
-        if end_date:
-            end_date = parse_date(end_date)
-            if end_date:
-                end_datetime = datetime.combine(end_date, time.max)
-                confirmed_orders = confirmed_orders.filter(created_at__lte=end_datetime)
-
-        # Serialize the data
-        serializer = OrderSerializer(confirmed_orders, many=True)
-        total_sum = sum(order['total_price_with_vat'] for order in serializer.data)
+        period = request.query_params.get('period', 'month')
+        if period not in self.periods:
+            return Response({"period": f"Допустимые значения: {', '.join(self.periods)}."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        confirmed_orders = filter_created_between(
+            Order.objects.filter(is_confirmed=True),
+            parse_date_param(request.query_params, 'start_date'),
+            parse_date_param(request.query_params, 'end_date'),
+        )
+
+        summary = (confirmed_orders
+                   .order_by()
+                   .annotate(period=self.periods[period]('created_at'))
+                   .values('period')
+                   .annotate(orders_count=Count('id'), total_without_vat=Sum('subtotal'), total_sum=Sum('grand_total'))
+                   .order_by('period'))
+        periods = [
+            {
+                "period": row['period'].date(),
+                "orders_count": row['orders_count'],
+                "total_without_vat": row['total_without_vat'],
+                "total_sum": row['total_sum'],
+            }
+            for row in summary
+        ]
+
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(confirmed_orders, request, view=self)
+        serializer = OrderSerializer(page, many=True)
 
         return Response({
             "orders": serializer.data,
-            "total_sum": total_sum
+            "next": paginator.get_next_link(),
+            "orders_count": sum(row['orders_count'] for row in periods),
+            "total_without_vat": sum((row['total_without_vat'] for row in periods), Decimal(0)),
+            "total_sum": sum((row['total_sum'] for row in periods), Decimal(0)),
+            "periods": periods,
         }, status=status.HTTP_200_OK)
 
 
+class SyncAPIView(APIView):
+    """
+    Дельта-синхронизация для мобильного приложения: заказы, продукты и пароли, измененные после курсора,
+    и id удаленных объектов. Без курсора возвращается полный снимок данных.
+    """
+    serializers = {
+        ChangeLog.ORDER: (Order.objects.all, OrderSerializer, 'orders'),
+        ChangeLog.PRODUCT: (OrderProduct.objects.all, OrderProductSerializer, 'products'),
+        ChangeLog.PASSWORD: (Password.objects.all, PasswordSerializer, 'passwords'),
+    }
+
+    @staticmethod
+    def encode_cursor(change_id):
+        return base64.urlsafe_b64encode(f'v1:{change_id}'.encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor):
+        try:
+            version, change_id = base64.urlsafe_b64decode(cursor.encode()).decode().split(':')
+            if version != 'v1':
+                raise ValueError
+            return int(change_id)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise ValidationError({"since": "Неверный курсор синхронизации."})
+
+    def get(self, request):
+        since = request.query_params.get('since')
+        if not since:
+            return self.snapshot()
+
+        since = self.decode_cursor(since)
+        limit = settings.SYNC_MAX_CHANGES
+        changes = list(ChangeLog.objects.filter(id__gt=since).order_by('id')
+                       .values_list('id', 'entity', 'object_id', 'action')[:limit + 1])
+        has_more = len(changes) > limit
+        changes = changes[:limit]
+
+        # Для каждого объекта важно только последнее действие в пределах выборки
+        latest = {}
+        for change_id, entity, object_id, action in changes:
+            latest[(entity, object_id)] = action
+
+        data = {"cursor": self.encode_cursor(changes[-1][0] if changes else since), "has_more": has_more}
+        for entity, (get_queryset, serializer_class, key) in self.serializers.items():
+            upserted = [object_id for (e, object_id), action in latest.items()
+                        if e == entity and action == ChangeLog.UPSERT]
+            objects = get_queryset().filter(pk__in=upserted) if upserted else []
+            data[key] = serializer_class(objects, many=True).data
+            data[f'deleted_{key}'] = [object_id for (e, object_id), action in latest.items()
+                                      if e == entity and action == ChangeLog.DELETE]
+        return Response(data, status=status.HTTP_200_OK)
+
+    def snapshot(self):
+        # Курсор берется до чтения данных: изменения, сделанные во время снимка, придут при следующей синхронизации
+        last_change_id = ChangeLog.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        data = {"cursor": self.encode_cursor(last_change_id), "has_more": False}
+        for get_queryset, serializer_class, key in self.serializers.values():
+            data[key] = serializer_class(get_queryset(), many=True).data
+            data[f'deleted_{key}'] = []
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class SearchAPIView(APIView):
+    """
+    Поиск по клиентам заказов, названиям продуктов и организациям (с учетом опечаток).
+    Параметры: q — строка поиска, limit — не больше SEARCH_MAX_RESULTS, type — order, product или password.
+    """
+
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        if len(query) < search.MIN_TERM_LENGTH:
+            raise ValidationError({"q": f"Строка поиска должна быть не короче {search.MIN_TERM_LENGTH} символов."})
+
+        try:
+            limit = min(int(request.query_params.get('limit', 20)), settings.SEARCH_MAX_RESULTS)
+        except ValueError:
+            raise ValidationError({"limit": "Ожидается целое число."})
+        if limit < 1:
+            raise ValidationError({"limit": "Ожидается положительное число."})
+
+        entities = request.query_params.getlist('type') or None
+        if entities and not set(entities) <= set(search.ENTITY_CODES):
+            raise ValidationError({"type": f"Допустимые значения: {', '.join(search.ENTITY_CODES)}."})
+
+        return Response({"results": search.search(query, limit=limit, entities=entities)}, status=status.HTTP_200_OK)
+
+
+class CacheStatsAPIView(APIView):
+    """
+    Счетчики кэша деталей заказа в текущем процессе и дисковых кэшей конвертированных фото
+    и готовых документов (для администраторов).
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response({"order_detail": order_detail_cache.stats(),
+                         "converted_images": converted_image_cache.stats(),
+                         "rendered_documents": rendered_document_cache.stats()}, status=status.HTTP_200_OK)
+
+
 class PasswordAPIView(APIView):
     # Получение всех записей
     def get(self, request, pk=None):
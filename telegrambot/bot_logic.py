@@ -66,6 +66,9 @@ async def handle_command(update, context):
         await create_order_command(update, context)
     elif command == '/add_password':
         await add_password_command(update, context)
+    elif command.split(' ', 1)[0] == '/search':
+        handler = OrderHandler()
+        await handler.search(update, context)
 
 
 async def handle_text(update, context):
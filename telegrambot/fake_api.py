@@ -0,0 +1,206 @@
+"""
+Локальная имитация Telegram Bot API для проверок и замеров без обращения к api.telegram.org.
+Поддерживает методы, которые вызывает сервер (sendMessage, sendDocument, setWebhook, getWebhookInfo,
+getMe, пустой getUpdates), запоминает вызовы и умеет отвечать с задержкой, ошибкой 5xx
+и флуд-контролем (429 с retry_after).
+Чтобы клиент работал с имитацией, укажите TELEGRAM_API_BASE_URL = FakeTelegramAPI.url.
+"""
+import hashlib
+import json
+import threading
+import time
+from email import policy
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+CHAT_METHODS = {'sendMessage', 'sendDocument'}
+
+
+class FakeTelegramHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Заголовки и тело ответа пишутся отдельно: без этого на keep-alive соединении ответ ждет задержанный ACK
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.handle_call()
+
+    def do_POST(self):
+        self.handle_call()
+
+    def handle_call(self):
+        api = self.server.api
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        parts = urlsplit(self.path).path.strip('/').split('/')
+        if len(parts) != 2 or not parts[0].startswith('bot'):
+            return self.reply(404, {'ok': False, 'error_code': 404, 'description': 'Not Found'})
+
+        token, method = parts[0][3:], parts[1]
+        params, files = self.parse_body(body)
+        params.update(parse_qsl(urlsplit(self.path).query))
+        status, payload = api.dispatch(token, method, params, files)
+        self.reply(status, payload)
+
+    def parse_body(self, body):
+        content_type = self.headers.get('Content-Type', '')
+        if content_type.startswith('multipart/form-data'):
+            message = BytesParser(policy=policy.HTTP).parsebytes(
+                f'Content-Type: {content_type}\r\n\r\n'.encode() + body
+            )
+            params, files = {}, {}
+            for part in message.iter_parts():
+                name = part.get_param('name', header='content-disposition')
+                data = part.get_payload(decode=True) or b''
+                if part.get_filename() is not None:
+                    files[name] = (part.get_filename(), data)
+                else:
+                    params[name] = data.decode('utf-8')
+            return params, files
+        if content_type.startswith('application/json'):
+            return json.loads(body or b'{}'), {}
+        return dict(parse_qsl(body.decode('utf-8'))), {}
+
+    def reply(self, status, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        try:
+            self.end_headers()
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            # Клиент не дождался ответа (таймаут чтения) и закрыл соединение
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        if self.server.api.verbose:
+            super().log_message(format, *args)
+
+
+class FakeTelegramAPI:
+    """
+    Сервер имитации в фоновом потоке. latency — задержка ответа в секундах, flood_every/error_every —
+    каждый N-й запрос получает 429 (с retry_after) или 500. Вызовы сохраняются в calls.
+
+        with FakeTelegramAPI() as api:
+            settings.TELEGRAM_API_BASE_URL = api.url
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, flood_every=0, retry_after=1, error_every=0,
+                 verbose=False):
+        self.latency = latency
+        self.flood_every = flood_every
+        self.retry_after = retry_after
+        self.error_every = error_every
+        self.verbose = verbose
+        self.calls = []
+        self.webhook_url = ''
+        self.uploads = 0
+        # file_id загруженных файлов по токену: чужой или неизвестный file_id получает 400, как в Telegram
+        self._file_ids = set()
+        self._requests = 0
+        self._message_id = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), FakeTelegramHandler)
+        self.server.daemon_threads = True
+        self.server.api = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def serve_forever(self):
+        self.server.serve_forever()
+
+    def dispatch(self, token, method, params, files):
+        with self._lock:
+            self._requests += 1
+            number = self._requests
+            self.calls.append({'method': method, 'params': params,
+                               'files': {name: (file_name, len(data)) for name, (file_name, data) in files.items()}})
+        # Вызов учтен до задержки: запрос, ответ на который клиент не дождался, тоже дошел до сервера
+        if self.latency:
+            time.sleep(self.latency)
+        if self.flood_every and number % self.flood_every == 0:
+            return 429, {'ok': False, 'error_code': 429,
+                         'description': f'Too Many Requests: retry after {self.retry_after}',
+                         'parameters': {'retry_after': self.retry_after}}
+        if self.error_every and number % self.error_every == 0:
+            return 500, {'ok': False, 'error_code': 500, 'description': 'Internal Server Error'}
+
+        handler = getattr(self, f'method_{method}', None)
+        if handler is None:
+            return 404, {'ok': False, 'error_code': 404, 'description': 'Not Found: method not found'}
+        if method in CHAT_METHODS and not params.get('chat_id'):
+            return 400, {'ok': False, 'error_code': 400, 'description': 'Bad Request: chat_id is empty'}
+        result = handler(token, params, files)
+        if isinstance(result, tuple):
+            return result
+        return 200, {'ok': True, 'result': result}
+
+    def message(self, params):
+        with self._lock:
+            self._message_id += 1
+            message_id = self._message_id
+        chat_id = str(params['chat_id'])
+        return {'message_id': message_id, 'date': int(time.time()),
+                'chat': {'id': int(chat_id) if chat_id.lstrip('-').isdigit() else chat_id, 'type': 'supergroup'}}
+
+    def method_getMe(self, token, params, files):
+        return {'id': int(token.split(':')[0]) if token.split(':')[0].isdigit() else 1,
+                'is_bot': True, 'first_name': 'Fake bot', 'username': 'fake_bot'}
+
+    def method_sendMessage(self, token, params, files):
+        return {**self.message(params), 'text': params.get('text', '')}
+
+    def method_sendDocument(self, token, params, files):
+        if 'document' in files:
+            file_name, data = files['document']
+            digest = hashlib.sha256(data).hexdigest()
+            document = {'file_id': f'fake-{digest[:32]}', 'file_unique_id': digest[:16],
+                        'file_name': file_name, 'file_size': len(data)}
+            with self._lock:
+                self.uploads += 1
+                self._file_ids.add((token, document['file_id']))
+        else:
+            # Повторная отправка по file_id
+            file_id = params.get('document', '')
+            if (token, file_id) not in self._file_ids:
+                return 400, {'ok': False, 'error_code': 400,
+                             'description': 'Bad Request: wrong file identifier/HTTP URL specified'}
+            document = {'file_id': file_id, 'file_unique_id': file_id[5:21]}
+        return {**self.message(params), 'document': document}
+
+    def method_getUpdates(self, token, params, files):
+        # Длинный опрос без входящих сообщений: ответ после timeout (не больше 10 с)
+        time.sleep(min(float(params.get('timeout') or 0), 10))
+        return []
+
+    def method_setWebhook(self, token, params, files):
+        self.webhook_url = params.get('url', '')
+        return True
+
+    def method_deleteWebhook(self, token, params, files):
+        self.webhook_url = ''
+        return True
+
+    def method_getWebhookInfo(self, token, params, files):
+        return {'url': self.webhook_url, 'has_custom_certificate': False, 'pending_update_count': 0}
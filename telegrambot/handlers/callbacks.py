@@ -1,5 +1,8 @@
 from telegram import InlineKeyboardMarkup, InlineKeyboardButton
+from telegram.error import BadRequest
 from asgiref.sync import sync_to_async
+from RHick.db import retry_on_lock
+from sales.models import TelegramDocument
 from telegrambot.utils.pdf_generator import PDFGenerator
 from .orders import OrderHandler
 from .products import ProductHandler
@@ -102,13 +105,7 @@ class CallbackHandler:
             order_id = int(query.data.split("_")[1])
             order = await self.order_handler.get_order_by_id(order_id)
             if order:
-                pdf_buffer = await sync_to_async(PDFGenerator.generate_order_pdf)(order)
-                await context.bot.send_document(
-                    chat_id=update.effective_chat.id,
-                    document=pdf_buffer,
-                    filename=f"order_{order_id}.pdf",
-                    caption=f"📄 PDF заказа #{order_id}"
-                )
+                await self.send_order_pdf(update, context, order)
 
         elif query.data.startswith("manage_products_"):
             order_id = int(query.data.split("_")[2])
@@ -124,3 +121,31 @@ class CallbackHandler:
 
         elif query.data == "back_to_orders":
             await self.order_handler.show_orders(update, context)
+
+    async def send_order_pdf(self, update, context, order):
+        """
+        PDF заказа. Неизмененный заказ отправляется по file_id прошлой загрузки этим ботом,
+        без рендера и выгрузки файла; иначе PDF рендерится в память (или берется из кэша документов).
+        """
+        token = context.bot.token
+        caption = f"📄 PDF заказа #{order.id}"
+        key = await sync_to_async(PDFGenerator.document_key)(order)
+        file_id = await sync_to_async(TelegramDocument.objects.file_id)(token, key)
+        if file_id:
+            try:
+                await context.bot.send_document(chat_id=update.effective_chat.id, document=file_id, caption=caption)
+                return
+            except BadRequest:
+                # Telegram больше не принимает file_id: файл загружается заново
+                await sync_to_async(retry_on_lock(TelegramDocument.objects.forget))(token, key)
+
+        # Отдельный поток: ожидание рендера в пуле процессов не занимает общий поток sync_to_async
+        pdf_file = await sync_to_async(PDFGenerator.open_pdf, thread_sensitive=False)(order, key)
+        with pdf_file:
+            message = await context.bot.send_document(
+                chat_id=update.effective_chat.id,
+                document=pdf_file,
+                filename=f"order_{order.id}.pdf",
+                caption=caption
+            )
+        await sync_to_async(retry_on_lock(TelegramDocument.objects.remember))(token, key, message.document.file_id)
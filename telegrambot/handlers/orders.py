@@ -1,5 +1,8 @@
 from telegram import InlineKeyboardMarkup, InlineKeyboardButton
+from telegram.helpers import escape_markdown
 from asgiref.sync import sync_to_async
+from RHick.db import retry_on_lock
+from sales import search
 from sales.models import Order, Password, OrderProduct
 from .auth import AuthHandler
 
@@ -7,7 +10,7 @@ from .auth import AuthHandler
 class OrderHandler(AuthHandler):
     @sync_to_async
     def get_orders(self):
-        return list(Order.objects.select_related().prefetch_related('products').order_by('-created_at')[:10])
+        return list(Order.objects.order_by('-created_at')[:10])
 
     @sync_to_async
     def get_order_by_id(self, order_id):
@@ -17,6 +20,7 @@ class OrderHandler(AuthHandler):
             return None
 
     @sync_to_async
+    @retry_on_lock
     def create_order_sync(self, client, vat, expenses, advance=None):
         return Order.objects.create(
             client=client,
@@ -26,9 +30,19 @@ class OrderHandler(AuthHandler):
         )
 
     @sync_to_async
+    @retry_on_lock
     def update_order_sync(self, order_id, **kwargs):
-        Order.objects.filter(id=order_id).update(**kwargs)
-        return Order.objects.get(id=order_id)
+        # Через save(), а не queryset.update(): save() ставит confirmed_at и дату окончания гарантии,
+        # пересчитывает итоги, а сигналы обновляют кэш, журнал изменений и индекс поиска
+        order = Order.objects.get(id=order_id)
+        for field, value in kwargs.items():
+            setattr(order, field, value)
+        order.save()
+        return order
+
+    @sync_to_async
+    def search_sync(self, query):
+        return search.search(query, limit=10)
 
     @sync_to_async
     def get_statistics(self):
@@ -65,8 +79,8 @@ class OrderHandler(AuthHandler):
         for order in orders:
             status_emoji = "✅" if order.is_confirmed else "❌" if order.is_rejected else "⏳"
             status_text = "Подтвержден" if order.is_confirmed else "Отклонен" if order.is_rejected else "В ожидании"
-            total = order.get_total_price()
-            products_count = order.products.count()
+            total = order.subtotal
+            products_count = order.products_count
 
             message += f"🆔 **Заказ #{order.id}**\n"
             message += f"👤 Клиент: {order.client}\n"
@@ -87,6 +101,39 @@ class OrderHandler(AuthHandler):
         else:
             await update.callback_query.edit_message_text(message, parse_mode='Markdown', reply_markup=reply_markup)
 
+    async def search(self, update, context):
+        if not await self.is_authorized_user(update):
+            return
+
+        query = update.message.text.partition(' ')[2].strip()
+        if len(query) < search.MIN_TERM_LENGTH:
+            await update.message.reply_text(
+                f"🔎 Использование: /search <текст>\n💡 Не короче {search.MIN_TERM_LENGTH} символов, например: /search hikvision"
+            )
+            return
+
+        results = await self.search_sync(query)
+        if not results:
+            await update.message.reply_text("🔎 Ничего не найдено")
+            return
+
+        icons = {'order': '👤', 'product': '📦', 'password': '🔑'}
+        # Запрос и найденные названия — произвольный текст: без экранирования «_», «*» или «`» ломают разметку
+        message = f"🔎 **Результаты поиска:** {escape_markdown(query)}\n\n"
+        keyboard = []
+        order_ids = []
+        for result in results:
+            approximate = '' if result['exact'] else ' (похоже)'
+            message += f"{icons[result['entity']]} {escape_markdown(result['text'])}{approximate}\n"
+            if result['order_id'] and result['order_id'] not in order_ids:
+                order_ids.append(result['order_id'])
+
+        for order_id in order_ids:
+            keyboard.append([InlineKeyboardButton(f"🔍 Заказ #{order_id}", callback_data=f"order_{order_id}")])
+
+        await update.message.reply_text(message, parse_mode='Markdown',
+                                        reply_markup=InlineKeyboardMarkup(keyboard) if keyboard else None)
+
     async def show_order_detail(self, update, context, order_id):
         order = await self.get_order_by_id(order_id)
         if not order:
@@ -116,10 +163,11 @@ class OrderHandler(AuthHandler):
         else:
             message += "📦 **Товаров пока нет**\n\n"
 
-        total_without_vat = order.get_total_price()
-        total_with_vat = order.get_total_price_with_vat()
-        additional_expenses = order.get_additional_expenses_amount()
-        final_total = total_with_vat + additional_expenses
+        totals = order.get_totals()
+        total_without_vat = totals['subtotal']
+        total_with_vat = totals['total_with_vat']
+        additional_expenses = totals['expenses_amount']
+        final_total = totals['grand_total']
 
         message += f"💰 **Итого:**\n"
         message += f"💵 Без НДС: ${total_without_vat:.2f}\n"
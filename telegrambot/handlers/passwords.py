@@ -1,4 +1,5 @@
 from asgiref.sync import sync_to_async
+from RHick.db import retry_on_lock
 from sales.models import Password
 from .auth import AuthHandler
 
@@ -9,6 +10,7 @@ class PasswordHandler(AuthHandler):
         return list(Password.objects.all().order_by('-created_at'))
 
     @sync_to_async
+    @retry_on_lock
     def create_password_sync(self, org_name, nvr_pass, camera_pass):
         return Password.objects.create(
             organization_name=org_name,
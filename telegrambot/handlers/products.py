@@ -1,25 +1,31 @@
 from telegram import InlineKeyboardMarkup, InlineKeyboardButton
 from asgiref.sync import sync_to_async
 from django.core.files.base import ContentFile
+from django.db import transaction
+from RHick.db import retry_on_lock
 from sales.models import OrderProduct
 from .auth import AuthHandler
 
 
 class ProductHandler(AuthHandler):
     @sync_to_async
+    @retry_on_lock
     def create_product_sync(self, order_id, name, quantity, price, photo_data=None):
-        product = OrderProduct.objects.create(
-            order_id=order_id,
-            name=name,
-            quantity=quantity,
-            price=price
-        )
-        if photo_data:
-            photo_file = ContentFile(photo_data, name=f'product_{product.id}.jpg')
-            product.photo.save(f'product_{product.id}.jpg', photo_file)
+        # Товар и фото пишутся одной транзакцией, чтобы повтор при блокировке не создал дубликат
+        with transaction.atomic():
+            product = OrderProduct.objects.create(
+                order_id=order_id,
+                name=name,
+                quantity=quantity,
+                price=price
+            )
+            if photo_data:
+                photo_file = ContentFile(photo_data, name=f'product_{product.id}.jpg')
+                product.photo.save(f'product_{product.id}.jpg', photo_file)
         return product
 
     @sync_to_async
+    @retry_on_lock
     def delete_product_sync(self, product_id):
         OrderProduct.objects.filter(id=product_id).delete()
 
@@ -0,0 +1,92 @@
+import io
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from sales.benchmarking import percentile
+from telegrambot.fake_api import FakeTelegramAPI
+from telegrambot.utils.client import TelegramAPIError, TelegramClient
+
+TOKEN = '123456:fake-token'
+CHAT_ID = '-100123'
+
+
+class Command(BaseCommand):
+    help = ('Сравнить отправку документов отдельными requests.post и общим клиентом Bot API '
+            '(пул соединений, повторы) на локальной имитации Telegram')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=300, help='Количество отправок на каждый способ')
+        parser.add_argument('--concurrency', type=int, default=4, help='Одновременных отправок')
+        parser.add_argument('--size', type=int, default=50, help='Размер документа в КБ')
+        parser.add_argument('--latency', type=float, default=0.0, help='Задержка ответа имитации в секундах')
+        parser.add_argument('--flood-every', type=int, default=0, help='Каждый N-й запрос получает 429')
+        parser.add_argument('--error-every', type=int, default=0, help='Каждый N-й запрос получает 500')
+        parser.add_argument('--output', type=str, help='Сохранить результаты в JSON-файл')
+
+    def handle(self, *args, **options):
+        document = b'%PDF-' + b'x' * (options['size'] * 1024)
+        with FakeTelegramAPI(latency=options['latency'], flood_every=options['flood_every'], retry_after=1,
+                             error_every=options['error_every']) as api, \
+                override_settings(TELEGRAM_API_BASE_URL=api.url, TELEGRAM_API_RETRY_DELAY=0.05,
+                                  TELEGRAM_API_POOL_SIZE=options['concurrency']):
+            client = TelegramClient(TOKEN)
+
+            def bare(index):
+                response = requests.post(api.url + f'/bot{TOKEN}/sendDocument', data={'chat_id': CHAT_ID},
+                                         files={'document': (f'Заказ-{index}.pdf', io.BytesIO(document))})
+                return response.status_code == 200
+
+            def pooled(index):
+                try:
+                    client.send_document(CHAT_ID, f'Заказ-{index}.pdf', io.BytesIO(document))
+                except TelegramAPIError:
+                    return False
+                return True
+
+            results = [self.run_case('requests.post', bare, options),
+                       self.run_case('client', pooled, options)]
+            client.close()
+
+        for result in results:
+            self.stdout.write(
+                f"{result['case']:>13}: {result['rps']:.1f} док/с, p50 {result['p50_ms']:.1f} ms, "
+                f"p95 {result['p95_ms']:.1f} ms, p99 {result['p99_ms']:.1f} ms, ошибок {result['errors']}"
+            )
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump({'requests': options['requests'], 'concurrency': options['concurrency'],
+                           'size_kb': options['size'], 'results': results}, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Результаты сохранены: {options['output']}"))
+
+    def run_case(self, case, send, options):
+        latencies = []
+        errors = 0
+
+        def one(index):
+            nonlocal errors
+            started = time.perf_counter()
+            ok = send(index)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if not ok:
+                errors += 1
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            list(executor.map(one, range(options['requests'])))
+        elapsed = time.perf_counter() - started
+
+        return {
+            'case': case,
+            'rps': options['requests'] / elapsed,
+            'mean_ms': statistics.mean(latencies),
+            'p50_ms': percentile(latencies, 50),
+            'p95_ms': percentile(latencies, 95),
+            'p99_ms': percentile(latencies, 99),
+            'errors': errors,
+        }
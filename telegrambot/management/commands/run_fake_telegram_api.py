@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from telegrambot.fake_api import FakeTelegramAPI
+
+
+class Command(BaseCommand):
+    help = ('Запустить локальную имитацию Telegram Bot API. Для работы с ней укажите '
+            'TELEGRAM_API_BASE_URL = http://<host>:<port>')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', type=str, default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8081)
+        parser.add_argument('--latency', type=float, default=0.0, help='Задержка ответа в секундах')
+        parser.add_argument('--flood-every', type=int, default=0, help='Каждый N-й запрос получает 429')
+        parser.add_argument('--retry-after', type=int, default=1, help='retry_after в ответах 429 (секунды)')
+        parser.add_argument('--error-every', type=int, default=0, help='Каждый N-й запрос получает 500')
+
+    def handle(self, *args, **options):
+        api = FakeTelegramAPI(options['host'], options['port'], latency=options['latency'],
+                              flood_every=options['flood_every'], retry_after=options['retry_after'],
+                              error_every=options['error_every'], verbose=True)
+        self.stdout.write(self.style.SUCCESS(f'Имитация Bot API: {api.url}'))
+        try:
+            api.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            api.server.server_close()
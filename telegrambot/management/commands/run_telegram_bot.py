@@ -6,6 +6,7 @@ from telegrambot.handlers.orders import OrderHandler
 from telegrambot.handlers.products import ProductHandler
 from telegrambot.handlers.passwords import PasswordHandler
 from telegrambot.handlers.callbacks import CallbackHandler
+from sales.render_pool import pdf_render_pool
 import logging
 
 logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
@@ -22,17 +23,22 @@ class Command(BaseCommand):
         self.callback_handler = CallbackHandler()
 
     def handle(self, *args, **options):
-        application = Application.builder().token(settings.TELEGRAM_BOT_TOKEN).build()
+        application = (Application.builder().token(settings.TELEGRAM_BOT_TOKEN)
+                       .base_url(f'{settings.TELEGRAM_API_BASE_URL}/bot').build())
 
         application.add_handler(CommandHandler("start", self.start))
         application.add_handler(CommandHandler("orders", self.order_handler.show_orders))
         application.add_handler(CommandHandler("passwords", self.password_handler.show_passwords))
         application.add_handler(CommandHandler("create_order", self.create_order))
         application.add_handler(CommandHandler("add_password", self.add_password))
+        application.add_handler(CommandHandler("search", self.order_handler.search))
         application.add_handler(CallbackQueryHandler(self.callback_handler.handle_callback))
         application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_message))
         application.add_handler(MessageHandler(filters.PHOTO, self.product_handler.handle_photo))
 
+        # Процессы рендера PDF запускаются до первого запроса
+        pdf_render_pool.warm()
+
         self.stdout.write(self.style.SUCCESS('🤖 Telegram бот запущен!'))
         application.run_polling()
 
@@ -1,6 +1,5 @@
 from django.core.management.base import BaseCommand
-from django.conf import settings
-import requests
+from telegrambot.utils.client import TelegramAPIError, get_client
 
 
 class Command(BaseCommand):
@@ -12,16 +11,14 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
         webhook_url = options.get('url') or f"https://rhik.pythonanywhere.com/telegram/webhook/"
 
-        response = requests.post(
-            f"https://api.telegram.org/bot{settings.TELEGRAM_BOT_TOKEN}/setWebhook",
-            data={'url': webhook_url}
-        )
-
-        if response.json().get('ok'):
-            self.stdout.write(
-                self.style.SUCCESS(f'✅ Webhook установлен: {webhook_url}')
-            )
-        else:
+        try:
+            get_client().set_webhook(webhook_url)
+        except TelegramAPIError as e:
             self.stdout.write(
-                self.style.ERROR(f'❌ Ошибка: {response.text}')
+                self.style.ERROR(f'❌ Ошибка: {e}')
             )
+            return
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ Webhook установлен: {webhook_url}')
+        )
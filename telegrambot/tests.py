@@ -1,3 +1,168 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from sales.cache import rendered_document_cache
+from sales.management.commands.run_export_workers import Command as ExportWorkersCommand
+from sales.models import ExportJob, Order, OrderProduct, TelegramDocument
+from sales.utils import TELEGRAM_BOT_TOKEN, send_order_to_telegram
+from telegrambot.fake_api import FakeTelegramAPI
+from telegrambot.handlers.orders import OrderHandler
+from telegrambot.utils.client import TelegramAPIError, TelegramClient
+
+TOKEN = '123456:test-token'
+CHAT_ID = '-100123'
+
+
+class FakeAPITestCase(TestCase):
+    """
+    Запускает имитацию Bot API (telegrambot.fake_api) и направляет на нее клиента.
+    """
+    fake_api_options = {}
+
+    def setUp(self):
+        self.api = FakeTelegramAPI(**self.fake_api_options).start()
+        self.addCleanup(self.api.stop)
+        self.settings_override = override_settings(TELEGRAM_API_BASE_URL=self.api.url, TELEGRAM_API_RETRY_DELAY=0.01,
+                                                   TELEGRAM_API_RETRIES=3)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.client_api = TelegramClient(TOKEN)
+        self.addCleanup(self.client_api.close)
+
+    def methods(self):
+        return [call['method'] for call in self.api.calls]
+
+
+class FloodControlTests(FakeAPITestCase):
+    fake_api_options = {'flood_every': 2, 'retry_after': 1}
+
+    def test_waits_retry_after_and_retries(self):
+        self.client_api.send_message(CHAT_ID, 'первое')
+        started = timezone.now()
+        self.client_api.send_message(CHAT_ID, 'второе')
+        self.assertGreaterEqual((timezone.now() - started).total_seconds(), 1)
+        self.assertEqual(self.methods(), ['sendMessage'] * 3)
+
+    @override_settings(TELEGRAM_API_MAX_RETRY_AFTER=0)
+    def test_long_retry_after_is_raised(self):
+        self.client_api.send_message(CHAT_ID, 'первое')
+        with self.assertRaises(TelegramAPIError) as raised:
+            self.client_api.send_message(CHAT_ID, 'второе')
+        self.assertEqual(raised.exception.error_code, 429)
+        self.assertEqual(raised.exception.retry_after, 1)
+        self.assertEqual(len(self.api.calls), 2)
+
+
+class ServerErrorTests(FakeAPITestCase):
+    fake_api_options = {'error_every': 2}
+
+    def test_retries_after_5xx(self):
+        self.client_api.send_message(CHAT_ID, 'первое')
+        self.client_api.send_message(CHAT_ID, 'второе')
+        self.assertEqual(self.methods(), ['sendMessage'] * 3)
+
+    @override_settings(TELEGRAM_API_RETRIES=0)
+    def test_gives_up_after_retries(self):
+        self.client_api.send_message(CHAT_ID, 'первое')
+        with self.assertRaises(TelegramAPIError) as raised:
+            self.client_api.send_message(CHAT_ID, 'второе')
+        self.assertEqual(raised.exception.error_code, 500)
+
+
+class ReadTimeoutTests(FakeAPITestCase):
+    fake_api_options = {'latency': 0.5}
+
+    @override_settings(TELEGRAM_API_TIMEOUT=(1, 0.1))
+    def test_send_is_not_repeated_after_read_timeout(self):
+        with self.assertRaises(TelegramAPIError):
+            self.client_api.send_message(CHAT_ID, 'текст')
+        self.assertEqual(len(self.api.calls), 1)
+
+    @override_settings(TELEGRAM_API_TIMEOUT=(1, 0.1), TELEGRAM_API_RETRIES=2)
+    def test_idempotent_method_is_repeated(self):
+        with self.assertRaises(TelegramAPIError):
+            self.client_api.get_webhook_info()
+        self.assertEqual(len(self.api.calls), 3)
+
+
+class OrderDocumentTests(FakeAPITestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_override = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.media_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        self.order = Order.objects.create(client='ООО Тест', vat=12, additional_expenses=0)
+        OrderProduct.objects.create(order=self.order, name='Камера', quantity=2, price=10)
+        shutil.rmtree(rendered_document_cache.directory, ignore_errors=True)
+
+    def load_order(self):
+        return Order.objects.prefetch_related('products').get(pk=self.order.pk)
+
+    def test_unchanged_order_is_sent_by_file_id(self):
+        send_order_to_telegram(self.load_order())
+        send_order_to_telegram(self.load_order())
+        self.assertEqual(self.api.uploads, 1)
+        self.assertEqual(self.api.calls[1]['params']['document'], TelegramDocument.objects.get().file_id)
+
+    def test_bad_file_id_is_uploaded_again(self):
+        send_order_to_telegram(self.load_order())
+        TelegramDocument.objects.update(file_id='fake-unknown')
+
+        send_order_to_telegram(self.load_order())
+        self.assertEqual(self.api.uploads, 2)
+        self.assertEqual(self.methods(), ['sendDocument'] * 3)
+        self.assertNotEqual(TelegramDocument.objects.get().file_id, 'fake-unknown')
+        self.assertEqual(TelegramDocument.objects.get().bot_id, TELEGRAM_BOT_TOKEN.split(':')[0])
+
+    def test_document_is_uploaded_from_memory(self):
+        send_order_to_telegram(self.load_order())
+        self.assertEqual(self.api.uploads, 1)
+        self.assertEqual(rendered_document_cache.entries(), [])
+
+    @override_settings(RENDERED_DOCUMENTS_CACHE=True)
+    def test_disk_cache_is_opt_in(self):
+        send_order_to_telegram(self.load_order())
+        self.assertEqual(len(rendered_document_cache.entries()), 1)
+
+    @override_settings(TELEGRAM_API_MAX_RETRY_AFTER=0)
+    def test_flood_control_postpones_export_job(self):
+        self.api.flood_every = 1
+        self.api.retry_after = 600
+        job = ExportJob.objects.enqueue(self.order, ExportJob.EXCEL)
+        job = ExportJob.objects.claim('test')[0]
+
+        ExportWorkersCommand().run_job(job)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ExportJob.PENDING)
+        self.assertGreaterEqual(job.run_after, timezone.now() + timedelta(seconds=590))
+
+
+class SearchMessageTests(TestCase):
+    async def test_query_and_results_are_escaped(self):
+        handler = OrderHandler()
+        update = mock.Mock()
+        update.message.text = '/search rog_a'
+        update.message.reply_text = mock.AsyncMock()
+        results = [{'entity': 'order', 'text': 'ООО *Рога_и_копыта*', 'exact': True, 'order_id': 1}]
+        with mock.patch.object(OrderHandler, 'is_authorized_user', mock.AsyncMock(return_value=True)), \
+                mock.patch.object(OrderHandler, 'search_sync', mock.AsyncMock(return_value=results)):
+            await handler.search(update, None)
+
+        message = update.message.reply_text.call_args.args[0]
+        self.assertIn('rog\\_a', message)
+        self.assertIn('ООО \\*Рога\\_и\\_копыта\\*', message)
@@ -0,0 +1,146 @@
+"""
+Клиент Telegram Bot API для отправки с сервера (выгрузки заказов, сводки, настройка webhook).
+Один requests.Session на токен держит соединения открытыми (keep-alive), поэтому отправки
+не платят за TCP и TLS каждый раз. Сетевые ошибки и ответы 5xx повторяются с нарастающей
+паузой, на 429 клиент ждет retry_after, который вернул Telegram. Отправки (sendMessage,
+sendDocument) после таймаута ответа не повторяются: Telegram мог уже принять запрос,
+и повтор продублировал бы сообщение в чате.
+"""
+import logging
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Методы, повтор которых безопасен при любой сетевой ошибке
+IDEMPOTENT_METHODS = {'getMe', 'getWebhookInfo', 'setWebhook', 'deleteWebhook', 'getUpdates'}
+
+
+class TelegramAPIError(Exception):
+    """
+    Ошибка Bot API: ответ с ok=false или сеть недоступна после всех попыток.
+    """
+
+    def __init__(self, description, error_code=None, retry_after=None):
+        super().__init__(description)
+        self.description = description
+        self.error_code = error_code
+        self.retry_after = retry_after
+
+
+class TelegramClient:
+    """
+    Клиент одного бота. Безопасен для использования из нескольких потоков: пул соединений
+    рассчитан на TELEGRAM_API_POOL_SIZE одновременных запросов.
+    """
+
+    def __init__(self, token, base_url=None):
+        self.token = token
+        self.base_url = (base_url or settings.TELEGRAM_API_BASE_URL).rstrip('/')
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.TELEGRAM_API_POOL_SIZE)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def url(self, method):
+        return f'{self.base_url}/bot{self.token}/{method}'
+
+    def call(self, method, data=None, files=None):
+        """
+        Вызов метода Bot API, возвращает поле result. Файлы в files перематываются
+        в начало перед каждой попыткой.
+        """
+        retries = settings.TELEGRAM_API_RETRIES
+        delay = settings.TELEGRAM_API_RETRY_DELAY
+        for attempt in range(retries + 1):
+            for file in (files or {}).values():
+                file[1].seek(0)
+            try:
+                response = self.session.post(self.url(method), data=data, files=files,
+                                             timeout=settings.TELEGRAM_API_TIMEOUT)
+            except requests.RequestException as e:
+                # Токен входит в URL запроса и попадает в текст ошибки
+                reason = f"{type(e).__name__}: {str(e).replace(self.token, '<token>')}"
+                # ConnectionError (в том числе ConnectTimeout) — запрос не дошел до Telegram
+                resend_safe = method in IDEMPOTENT_METHODS or isinstance(e, requests.ConnectionError)
+                if attempt == retries or not resend_safe:
+                    raise TelegramAPIError(f'{method}: {reason}')
+                logger.warning(f'Telegram {method}: {reason}, повтор через {delay} с')
+                time.sleep(delay)
+                delay *= 2
+                continue
+
+            payload = self.parse(response)
+            if payload.get('ok'):
+                return payload.get('result')
+
+            error = TelegramAPIError(f"{method}: {payload.get('description') or response.reason}",
+                                     error_code=payload.get('error_code', response.status_code),
+                                     retry_after=(payload.get('parameters') or {}).get('retry_after'))
+            if attempt == retries:
+                raise error
+            if response.status_code == 429:
+                # Флуд-контроль: раньше retry_after повтор все равно получит 429
+                wait = error.retry_after or delay
+                if wait > settings.TELEGRAM_API_MAX_RETRY_AFTER:
+                    raise error
+            elif response.status_code >= 500:
+                wait = delay
+            else:
+                raise error
+            logger.warning(f'Telegram {method}: {error}, повтор через {wait} с')
+            time.sleep(wait)
+            delay *= 2
+
+    @staticmethod
+    def parse(response):
+        try:
+            payload = response.json()
+        except ValueError:
+            payload = None
+        if not isinstance(payload, dict):
+            payload = {'ok': False, 'error_code': response.status_code, 'description': response.text[:200]}
+        return payload
+
+    def send_message(self, chat_id, text, **params):
+        return self.call('sendMessage', data={'chat_id': chat_id, 'text': text, **params})
+
+    def send_document(self, chat_id, file_name, document, **params):
+        return self.call('sendDocument', data={'chat_id': chat_id, **params},
+                         files={'document': (file_name, document)})
+
+    def send_cached_document(self, chat_id, file_id, **params):
+        """
+        Повторная отправка уже загруженного этим ботом файла по его file_id.
+        """
+        return self.call('sendDocument', data={'chat_id': chat_id, 'document': file_id, **params})
+
+    def set_webhook(self, url):
+        return self.call('setWebhook', data={'url': url})
+
+    def get_webhook_info(self):
+        return self.call('getWebhookInfo')
+
+    def close(self):
+        self.session.close()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(token=None):
+    """
+    Общий клиент для токена (по умолчанию TELEGRAM_BOT_TOKEN) на процесс.
+    """
+    token = token or settings.TELEGRAM_BOT_TOKEN
+    base_url = settings.TELEGRAM_API_BASE_URL
+    with _clients_lock:
+        client = _clients.get((token, base_url))
+        if client is None:
+            client = _clients[(token, base_url)] = TelegramClient(token, base_url)
+        return client
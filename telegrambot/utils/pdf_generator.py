@@ -1,9 +1,33 @@
-from django.template.loader import render_to_string
-from weasyprint import HTML, CSS
+from django.conf import settings
+from django.template.loader import get_template, render_to_string
 from io import BytesIO
 import base64
 import os
 
+from sales.cache import rendered_document_cache
+from sales.documents import document_key
+from sales.render_pool import pdf_render_pool
+from sales.rendering import FileAsset
+from sales.renditions import rendition_path
+from sales.utils import PDF_PHOTO_SIZE
+
+TEMPLATE_NAME = 'telegram/order_pdf.html'
+PAGE_CSS = '@page { size: A4; margin: 8mm; }'
+pdf_render_pool.register_styles([PAGE_CSS])
+
+_template_file = None
+
+
+def template_version():
+    """
+    Версия оформления PDF бота: хэш содержимого шаблона (перечитывается при изменении файла) и стиль страницы.
+    """
+    global _template_file
+    if _template_file is None:
+        _template_file = FileAsset(get_template(TEMPLATE_NAME).origin.name, lambda path: None)
+    _template_file.get()
+    return f'{_template_file.digest}:{PAGE_CSS}'
+
 
 class PDFGenerator:
     @staticmethod
@@ -12,7 +36,7 @@ class PDFGenerator:
             return None
 
         try:
-            image_path = image_field.path
+            image_path = rendition_path(image_field, PDF_PHOTO_SIZE)
             if os.path.exists(image_path):
                 with open(image_path, 'rb') as image_file:
                     image_data = image_file.read()
@@ -51,23 +75,36 @@ class PDFGenerator:
             }
             products_with_total.append(product_data)
 
+        totals = order.get_totals()
         context = {
             'order': order,
             'products': products_with_total,
-            'total_without_vat': order.get_total_price(),
-            'total_with_vat': order.get_total_price_with_vat(),
-            'additional_expenses': order.get_additional_expenses_amount(),
-            'final_total': order.get_total_price_with_vat() + order.get_additional_expenses_amount(),
+            'total_without_vat': totals['subtotal'],
+            'total_with_vat': totals['total_with_vat'],
+            'additional_expenses': totals['expenses_amount'],
+            'final_total': totals['grand_total'],
         }
 
-        html_string = render_to_string('telegram/order_pdf.html', context)
+        html_string = render_to_string(TEMPLATE_NAME, context)
 
         # base_url нужен в 53.4 для корректной подгрузки css и статики
-        pdf_bytes = HTML(
-            string=html_string,
-            base_url=os.getcwd()
-        ).write_pdf(
-            stylesheets=[CSS(string='@page { size: A4; margin: 8mm; }')]
-        )
+        pdf_bytes = pdf_render_pool.render_pdf(html_string, base_url=os.getcwd(), styles=[PAGE_CSS])
 
         return BytesIO(pdf_bytes)
+
+    @staticmethod
+    def document_key(order):
+        return document_key(order, 'telegram_pdf', template_version())
+
+    @staticmethod
+    def open_pdf(order, key=None):
+        """
+        PDF заказа, открытый на чтение: буфер в памяти или, если включен RENDERED_DOCUMENTS_CACHE,
+        файл дискового кэша (рендерится только при промахе).
+        """
+        if not settings.RENDERED_DOCUMENTS_CACHE:
+            return PDFGenerator.generate_order_pdf(order)
+
+        key = key or PDFGenerator.document_key(order)
+        return rendered_document_cache.open(key, 'pdf',
+                                            lambda f: f.write(PDFGenerator.generate_order_pdf(order).getvalue()))